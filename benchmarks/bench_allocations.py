@@ -0,0 +1,102 @@
+import time
+import random
+import argparse
+from rackattack.common import globallock
+from rackattack.virtual.alloc import allocation
+from rackattack.virtual.alloc import allocations
+
+
+_LIMBO_AFTER_DEATH_DURATION = allocation.Allocation._LIMBO_AFTER_DEATH_DURATION
+
+
+class _FakeAllocation:
+    def __init__(self, index, deathCallback, **kwargs):
+        self._index = index
+        self._deathCallback = deathCallback
+        self._death = None
+
+    def index(self):
+        return self._index
+
+    def die(self, when):
+        self._death = when
+        self._deathCallback(self)
+
+    def deadForAWhile(self):
+        return self._death is not None and self._death < time.time() - _LIMBO_AFTER_DEATH_DURATION
+
+
+class _ListAllocations:
+    "The former implementation: a list, rebuilt on every command"
+    def __init__(self):
+        self._allocations = []
+        self._index = 1
+
+    def create(self, requirements):
+        self._cleanup()
+        alloc = _FakeAllocation(index=self._index, deathCallback=lambda alloc: None)
+        self._allocations.append(alloc)
+        self._index += 1
+        return alloc
+
+    def byIndex(self, index):
+        self._cleanup()
+        for alloc in self._allocations:
+            if alloc.index() == index:
+                return alloc
+        raise IndexError("No such allocation")
+
+    def _cleanup(self):
+        self._allocations = [a for a in self._allocations if not a.deadForAWhile()]
+
+
+def _createIndexedAllocations():
+    return allocations.Allocations(dnsmasq=None, broadcaster=None, buildImageThread=None, imageStore=None,
+                                   allVMs=dict(), heartbeatMonitor=None, vmIndices=None,
+                                   vmCreationPool=None, warmPool=None)
+
+
+def _drive(tested, nrHistorical, nrCommands):
+    randomGenerator = random.Random(0)
+    # The global lock is taken directly, the benchmark deliberately holds it for the whole run
+    with globallock._lock:
+        allocs = [tested.create(requirements=dict()) for _ in xrange(nrHistorical)]
+        # A tenth of the allocations died long ago and are due for eviction, half of the rest are in limbo
+        for alloc in allocs[:nrHistorical / 10]:
+            alloc.die(when=time.time() - 2 * _LIMBO_AFTER_DEATH_DURATION)
+        for alloc in allocs[nrHistorical / 10:]:
+            if randomGenerator.random() < 0.5:
+                alloc.die(when=time.time())
+        before = time.time()
+        for _ in xrange(nrCommands):
+            try:
+                tested.byIndex(randomGenerator.randint(1, nrHistorical))
+            except IndexError:
+                pass
+        byIndexTook = time.time() - before
+        before = time.time()
+        for _ in xrange(nrCommands):
+            tested.create(requirements=dict())
+        return byIndexTook, time.time() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=10000)
+    parser.add_argument("--historical", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--skipList", action="store_true")
+    args = parser.parse_args()
+    allocations.allocation.Allocation = _FakeAllocation
+    implementations = [("indexed", _createIndexedAllocations)]
+    if not args.skipList:
+        implementations.append(("list", _ListAllocations))
+    for nrHistorical in args.historical:
+        for name, factory in implementations:
+            byIndexTook, createTook = _drive(factory(), nrHistorical, args.commands)
+            print "%-8s %6d historical allocations: byIndex %.2fus, create %.2fus per command" % (
+                name, nrHistorical, byIndexTook / args.commands * 1000000,
+                createTook / args.commands * 1000000)
+
+
+if __name__ == "__main__":
+    main()
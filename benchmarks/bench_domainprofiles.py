@@ -0,0 +1,57 @@
+import os
+import time
+import argparse
+from rackattack import api
+from rackattack.virtual.kvm import domainprofiles
+
+
+def _requirement(imageLabel, profile):
+    requirement = api.Requirement(imageLabel=imageLabel, imageHint="bench")
+    requirement.hardwareConstraints = dict(requirement.hardwareConstraints, domainProfile=profile)
+    return requirement
+
+
+def _bootToCheckIn(client, imageLabel, profile, nrNodes, timeout):
+    from tests import testlib
+    before = time.time()
+    allocation = client.allocate(
+        requirements=dict(("node%d" % i, _requirement(imageLabel, profile)) for i in xrange(nrNodes)),
+        allocationInfo=api.AllocationInfo(user="benchmark", purpose="benchmark", nice=0))
+    try:
+        allocation.wait(timeout=timeout)
+        done = time.time()
+        for node in allocation.nodes().values():
+            testlib.waitForTCPServer((node.rootSSHCredentials()['hostname'], 22), timeout=timeout)
+        return done - before, time.time() - before
+    finally:
+        allocation.free()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Boot to check-in time of each domain profile, measured against the provider in "
+        "RACKATTACK_PROVIDER. A node checks in once its SSH server accepts connections")
+    parser.add_argument("--imageLabel")
+    parser.add_argument("--nodes", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--timeout", type=int, default=5 * 60)
+    parser.add_argument("--profiles", nargs="+", default=domainprofiles.names())
+    args = parser.parse_args()
+    if 'RACKATTACK_PROVIDER' not in os.environ or args.imageLabel is None:
+        print "Set RACKATTACK_PROVIDER and pass --imageLabel to compare domain profiles, skipping"
+        return
+    from rackattack import clientfactory
+    client = clientfactory.factory()
+    try:
+        for profile in args.profiles:
+            results = [_bootToCheckIn(client, args.imageLabel, profile, args.nodes, args.timeout)
+                       for _ in xrange(args.rounds)]
+            print "%-8s allocation done in %.1fs, checked in after %.1fs (average of %d rounds)" % (
+                profile, sum(done for done, checkedIn in results) / len(results),
+                sum(checkedIn for done, checkedIn in results) / len(results), len(results))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import time
+import argparse
+import xmltodict
+from rackattack.virtual.kvm import manifest
+
+
+def _create(index):
+    return manifest.Manifest.create(
+        name="rackattack-vm%d" % index, memoryMB=1024, vcpus=1,
+        disk1Image="/var/lib/rackattack-virtual/diskimages/rackattack-vm%d_disk1.qcow2" % index,
+        disk2Image="/var/lib/rackattack-virtual/diskimages/rackattack-vm%d_disk2.qcow2" % index,
+        primaryMACAddress="52:54:00:00:00:%02x" % index, secondaryMACAddress="52:54:00:00:01:%02x" % index,
+        networkName="rackattacknet", serialOutputFilename="/var/lib/rackattack-virtual/seriallogs/x.txt",
+        bootFromNetwork=False)
+
+
+def _rendered(count):
+    before = time.time()
+    for i in xrange(count):
+        _create(i % 100).xml()
+    return time.time() - before
+
+
+def _roundTripped(count):
+    "The previous implementation: parse the rendered template, and serialize it back for libvirt"
+    before = time.time()
+    for i in xrange(count):
+        xmltodict.unparse(xmltodict.parse(_create(i % 100).xml()))
+    return time.time() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifests", type=int, default=1000)
+    args = parser.parse_args()
+    try:
+        manifest.Manifest._findEmulatorPath()
+    except:
+        print "No QEMU-KVM emulator is installed, rendering manifests with a made up emulator path"
+        manifest._emulatorPath = "/usr/bin/qemu-kvm"
+    for name, measure in [("rendered", _rendered), ("round-tripped", _roundTripped)]:
+        took = measure(args.manifests)
+        print "%-13s %d manifests in %.3fs (%.0f manifests per second)" % (
+            name, args.manifests, took, args.manifests / took)
+
+
+if __name__ == "__main__":
+    main()
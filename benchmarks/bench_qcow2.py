@@ -0,0 +1,48 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import imagecommands
+
+
+def _qemuImgExists():
+    return any(os.access(os.path.join(directory, 'qemu-img'), os.X_OK)
+               for directory in os.environ.get('PATH', '').split(os.pathsep))
+
+
+def _drive(tempDir, nrImages, sizeGB):
+    backing = os.path.join(tempDir, "backing.qcow2")
+    imagecommands.create(image=backing, sizeGB=sizeGB)
+    before = time.time()
+    for i in xrange(nrImages):
+        imagecommands.create(image=os.path.join(tempDir, "disk2_%d.qcow2" % i), sizeGB=sizeGB)
+        imagecommands.deriveCopyOnWrite(
+            original=backing, newImage=os.path.join(tempDir, "disk1_%d.qcow2" % i))
+    return time.time() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vms", type=int, default=100)
+    parser.add_argument("--sizeGB", type=int, default=16)
+    args = parser.parse_args()
+    implementations = [("native", True)]
+    if _qemuImgExists():
+        implementations.append(("qemu-img", False))
+    else:
+        print "qemu-img is not installed, measuring only the native implementation"
+    for name, native in implementations:
+        config.NATIVE_QCOW2 = native
+        tempDir = tempfile.mkdtemp()
+        try:
+            took = _drive(tempDir, args.vms, args.sizeGB)
+        finally:
+            shutil.rmtree(tempDir, ignore_errors=True)
+        print "%-9s %d VMs (an empty disk and an overlay each) in %.3fs (%.2fms per VM)" % (
+            name, args.vms, took, took * 1000 / args.vms)
+
+
+if __name__ == "__main__":
+    main()
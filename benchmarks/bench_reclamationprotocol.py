@@ -0,0 +1,75 @@
+import os
+import time
+import base64
+import random
+import argparse
+from rackattack.common import reclamationprotocol
+from rackattack.common.tests.fakepipes import FakePipe
+
+
+def _formerEncodeMany(requests):
+    return "".join(base64.encodestring(",".join([actionType] + args)) + "," for actionType, args in requests)
+
+
+def _formerDecode(chunk):
+    "The former reader: assumes each read ends on a request boundary"
+    decoded = []
+    for encoded in chunk.strip(" ,").split(","):
+        try:
+            request = base64.decodestring(encoded).split(",")
+        except:
+            continue
+        if request[0]:
+            decoded.append((request[0], request[1:]))
+    return decoded
+
+
+class _FormerDecoder:
+    def feed(self, chunk):
+        return _formerDecode(chunk)
+
+
+def _requests(nrRequests):
+    return [("soft", ["rack01-server%d" % i, "10.0.%d.%d" % (i / 256, i % 256), "root", "strato",
+                      "00:1e:67:%02x:%02x:%02x" % (i / 65536, i / 256 % 256, i % 256), "default", "False",
+                      "86400"]) for i in xrange(nrRequests)]
+
+
+def _throughPipe(encoded, decoder, maximumReadSize, generator):
+    pipe = FakePipe()
+    pipe.open(os.O_RDONLY)
+    pipe.open(os.O_WRONLY)
+    pipe.write(encoded)
+    decoded = []
+    while pipe.content:
+        decoded.extend(decoder.feed(pipe.read(generator.randint(1, maximumReadSize))))
+    return decoded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--maximumReadSize", type=int, default=4096)
+    args = parser.parse_args()
+    requests = _requests(args.requests)
+    for name, encodeMany, decoderFactory in [
+            ("former", _formerEncodeMany, _FormerDecoder),
+            ("framed", reclamationprotocol.encodeMany, reclamationprotocol.Decoder)]:
+        before = time.time()
+        encoded = encodeMany(requests)
+        encodeTook = time.time() - before
+        before = time.time()
+        decoder = decoderFactory()
+        wholeReadIntact = decoder.feed(encoded) == requests
+        decodeTook = time.time() - before
+        decoded = _throughPipe(encoded, decoderFactory(), args.maximumReadSize, random.Random(0))
+        nrIntact = len(set(map(repr, decoded)) & set(map(repr, requests)))
+        print "%s: %.1f bytes per request, encoded in %.1fus, decoded in %.1fus per request (%s). " \
+            "Reading in chunks of up to %d bytes: %d of %d requests intact, %d corrupt" % (
+                name, float(len(encoded)) / len(requests), encodeTook * 1e6 / len(requests),
+                decodeTook * 1e6 / len(requests), "intact" if wholeReadIntact else "corrupt",
+                args.maximumReadSize, nrIntact, len(requests), len(decoded) - nrIntact)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from rackattack.common import softreclaim
+from rackattack.common import reclamationexecutor
+
+
+class _SimulatedConnection:
+    "A host at the other side of a link of a given bandwidth, with a given latency per SSH command"
+    def __init__(self, files, bandwidth, latency):
+        self._files = files
+        self._bandwidth = bandwidth
+        self._latency = latency
+        self.ftp = self
+        self.run = self
+
+    def connect(self):
+        time.sleep(self._latency)
+
+    def close(self):
+        pass
+
+    def getContents(self, path):
+        time.sleep(self._latency)
+        return "100.0 200.0"
+
+    def putFile(self, path, localPath):
+        with open(localPath, "rb") as f:
+            self.putContents(path, f.read())
+
+    def putContents(self, path, contents):
+        time.sleep(self._latency + float(len(contents)) / self._bandwidth)
+        self._files[path] = hashlib.md5(contents).hexdigest()
+
+    def script(self, script):
+        time.sleep(self._latency)
+        if script.startswith("md5sum"):
+            paths = script.split()[1:]
+            if any(path not in self._files for path in paths):
+                raise Exception("No such file")
+            return "".join("%s  %s\n" % (self._files[path], path) for path in paths)
+        return ""
+
+    def backgroundScript(self, script):
+        time.sleep(self._latency)
+
+
+class _FormerSoftReclaim(softreclaim.SoftReclaim):
+    "The former implementation: read both files from disk and upload them on every reclamation"
+    def _uploadInauguratorFiles(self):
+        self._connection.ftp.putFile(softreclaim.InauguratorFiles.KERNEL_PATH, self._kernelFilename)
+        self._connection.ftp.putFile(softreclaim.InauguratorFiles.INITRD_PATH, self._initrdFilename)
+
+
+def _reclaimAll(cls, hosts, executor, inauguratorFiles, kernel, initrd):
+    done = threading.Semaphore(0)
+    before = time.time()
+    for hostID in hosts:
+        instance = cls(
+            hostID=hostID, hostname=hostID, username="root", password="password", macAddress="mac",
+            targetDevice="default", isInauguratorActive="False", maxUptime="1000",
+            inauguratorCommandLine=lambda *args, **kwargs: "", softReclamationFailedMsgFifoWriteFd=None,
+            inauguratorFiles=inauguratorFiles, recordPhase=executor.recordPhase)
+        instance._kernelFilename = kernel
+        instance._initrdFilename = initrd
+
+        def job(instance=instance):
+            try:
+                instance.run()
+            finally:
+                done.release()
+        executor.submit(key=hostID, priority=1, callback=job)
+    for _ in hosts:
+        done.acquire()
+    return time.time() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--kernelMB", type=int, default=4)
+    parser.add_argument("--initrdMB", type=int, default=16)
+    parser.add_argument("--bandwidthMBps", type=int, default=200)
+    parser.add_argument("--latencyMs", type=int, default=5)
+    args = parser.parse_args()
+    tempDir = tempfile.mkdtemp()
+    try:
+        kernel = os.path.join(tempDir, "vmlinuz")
+        initrd = os.path.join(tempDir, "initrd")
+        with open(kernel, "wb") as f:
+            f.write(os.urandom(args.kernelMB * 1024 * 1024))
+        with open(initrd, "wb") as f:
+            f.write(os.urandom(args.initrdMB * 1024 * 1024))
+        inauguratorFiles = softreclaim.InauguratorFiles(kernelFilename=kernel, initrdFilename=initrd)
+        hosts = ["host%d" % i for i in xrange(args.hosts)]
+        for name, cls, rounds in [("former", _FormerSoftReclaim, 2), ("cached", softreclaim.SoftReclaim, 2)]:
+            hostFiles = dict((hostID, dict()) for hostID in hosts)
+            softreclaim.connection.Connection = lambda hostname, **kwargs: _SimulatedConnection(
+                hostFiles[hostname], bandwidth=args.bandwidthMBps * 1024 * 1024,
+                latency=args.latencyMs / 1000.0)
+            executor = reclamationexecutor.ReclamationExecutor(nrWorkers=args.workers, name=name)
+            for roundIndex in xrange(rounds):
+                took = _reclaimAll(cls, hosts, executor, inauguratorFiles, kernel, initrd)
+                print "%-6s round %d: %d hosts reclaimed in %.2fs (%.1f hosts per second)" % (
+                    name, roundIndex + 1, len(hosts), took, len(hosts) / took)
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import time
+import random
+import argparse
+import threading
+from rackattack.common import timer
+from rackattack.common import globallock
+
+
+class _Tag:
+    pass
+
+
+class _SortedListTimers:
+    "The former implementation: a list kept sorted on every insertion, linear cancellation"
+    def __init__(self):
+        self._timers = []
+
+    def scheduleIn(self, timeout, callback, tag):
+        self._timers.append(timer._Timer(when=time.time() + timeout, callback=callback, tag=tag))
+        self._timers.sort(key=lambda x: x.when)
+
+    def cancelAllByTag(self, tag):
+        self._timers = [t for t in self._timers if t.tag is not tag]
+
+    def _runOne(self):
+        if self._timers and self._timers[0].when <= time.time():
+            self._timers.pop(0).callback()
+
+
+def _createTimersThread():
+    origStart = threading.Thread.start
+    threading.Thread.start = lambda self: None
+    try:
+        return timer.TimersThread()
+    finally:
+        threading.Thread.start = origStart
+
+
+def _nothing():
+    pass
+
+
+def _drive(timers, nrOperations, nrTags):
+    tags = [_Tag() for _ in xrange(nrTags)]
+    randomGenerator = random.Random(0)
+    callback = _nothing
+    before = time.time()
+    # The global lock is taken directly, the benchmark deliberately holds it for the whole run
+    with globallock._lock:
+        for tag in tags:
+            timers.scheduleIn(timeout=15, callback=callback, tag=tag)
+        for i in xrange(nrOperations):
+            tag = tags[randomGenerator.randint(0, nrTags - 1)]
+            timers.cancelAllByTag(tag=tag)
+            timers.scheduleIn(timeout=randomGenerator.uniform(0, 15), callback=callback, tag=tag)
+            if i % 100 == 0:
+                timers._runOne()
+    return time.time() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--tags", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--skipSortedList", action="store_true")
+    args = parser.parse_args()
+    implementations = [("heap", _createTimersThread)]
+    if not args.skipSortedList:
+        implementations.append(("sorted list", _SortedListTimers))
+    for nrTags in args.tags:
+        for name, factory in implementations:
+            took = _drive(factory(), args.operations, nrTags)
+            print "%-12s %6d tags: %d cancel+schedule operations in %.3fs (%.0f ops/s)" % (
+                name, nrTags, args.operations, took, args.operations / took)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,36 @@
 import threading
 import logging
+import time
 import simplejson
 from rackattack.tcp import suicide
 from rackattack.tcp import debug
 from rackattack import api
 from rackattack.common import globallock
 from rackattack.common import dynamicconfig
+from rackattack.common import statistics
+from rackattack.common import timer
 import Queue
 
 
-class BaseIPCServer(threading.Thread):
+class BaseIPCServer:
+    # Commands that are executed right away on the receiving thread, without being queued and without
+    # the global lock. Their handlers must do their own synchronization.
+    LOCK_FREE_COMMANDS = set()
+    # Commands that only read state. These are executed under the shared global lock, so several of them
+    # can run concurrently, while the rest of the commands are executed under the exclusive global lock.
+    READ_ONLY_COMMANDS = set(['admin__printStateMachineConfiguration', 'admin__printStatistics'])
+    _NR_WORKERS = 4
+
     def __init__(self):
         self._queue = Queue.Queue()
-        threading.Thread.__init__(self)
-        self.daemon = True
-        threading.Thread.start(self)
+        self._statisticsLock = threading.Lock()
+        self._maximumQueueDepth = 0
+        self._waitLatency = dict()
+        self._serviceLatency = dict()
+        for _ in xrange(self._NR_WORKERS):
+            worker = threading.Thread(target=self.run)
+            worker.daemon = True
+            worker.start()
 
     def cmd_handshake(self, versionInfo, peer):
         if versionInfo['RACKATTACK_VERSION'] != api.VERSION:
@@ -28,6 +44,12 @@ class BaseIPCServer(threading.Thread):
     def cmd_admin__printStateMachineConfiguration(self, peer):
         dynamicconfig.printConfiguration()
 
+    def cmd_admin__printStatistics(self, peer):
+        result = self._statistics()
+        logging.info("Statistics:\n%(statistics)s", dict(
+            statistics=simplejson.dumps(result, indent=4, sort_keys=True)))
+        return result
+
     def run(self):
         try:
             while True:
@@ -47,23 +69,59 @@ class BaseIPCServer(threading.Thread):
                 with debug.logNetwork("Handling handshake"):
                     response = self.cmd_handshake(peer=peer, ** incoming['arguments'])
                     respondCallback(simplejson.dumps(response))
+            elif incoming['cmd'] in self.LOCK_FREE_COMMANDS:
+                handler = getattr(self, "cmd_" + incoming['cmd'])
+                response = handler(peer=peer, ** incoming['arguments'])
+                respondCallback(simplejson.dumps(response))
             else:
                 transaction = debug.Transaction("Handling: %s" % incoming['cmd'])
-                self._queue.put((incoming, peer, respondCallback, transaction))
+                self._queue.put((incoming, peer, respondCallback, transaction, time.time()))
+                self._updateMaximumQueueDepth()
         except Exception, e:
             logging.exception('Handling')
             response = dict(exceptionString=str(e), exceptionType=e.__class__.__name__)
             respondCallback(simplejson.dumps(response))
 
     def _work(self):
-        incoming, peer, respondCallback, transaction = self._queue.get()
+        incoming, peer, respondCallback, transaction, enqueued = self._queue.get()
+        dequeued = time.time()
         transaction.reportState('dequeued (%d left in queue)' % self._queue.qsize())
         try:
             handler = getattr(self, "cmd_" + incoming['cmd'])
-            with globallock.lock():
+            if incoming['cmd'] in self.READ_ONLY_COMMANDS:
+                lock = globallock.sharedLock()
+            else:
+                lock = globallock.lock()
+            with lock:
                 response = handler(peer=peer, ** incoming['arguments'])
         except Exception, e:
             logging.exception('Handling')
             response = dict(exceptionString=str(e), exceptionType=e.__class__.__name__)
         transaction.finished()
         respondCallback(simplejson.dumps(response))
+        self._recordLatency(incoming['cmd'], wait=dequeued - enqueued, service=time.time() - dequeued)
+
+    def _updateMaximumQueueDepth(self):
+        depth = self._queue.qsize()
+        with self._statisticsLock:
+            self._maximumQueueDepth = max(self._maximumQueueDepth, depth)
+
+    def _recordLatency(self, cmd, wait, service):
+        with self._statisticsLock:
+            if cmd not in self._waitLatency:
+                self._waitLatency[cmd] = statistics.Latency()
+                self._serviceLatency[cmd] = statistics.Latency()
+        self._waitLatency[cmd].record(wait)
+        self._serviceLatency[cmd].record(service)
+
+    def _statistics(self):
+        with self._statisticsLock:
+            commands = dict((cmd, dict(wait=self._waitLatency[cmd].report(),
+                                       service=self._serviceLatency[cmd].report()))
+                            for cmd in self._waitLatency)
+            ipc = dict(queueDepth=self._queue.qsize(), maximumQueueDepth=self._maximumQueueDepth,
+                       commands=commands)
+        result = dict(ipc=ipc)
+        if timer.TimersThread.it is not None:
+            result['timers'] = timer.TimersThread.it.stats()
+        return result
@@ -7,11 +7,18 @@ import time
 import signal
 import os
 import re
+import collections
+from rackattack.tcp import suicide
 
 
 class DNSMasq(threading.Thread):
     HOSTS_FILENAME = os.path.join("/tmp", "dnsmasq.hosts")
     LEASES_FILE = os.path.join("/var", "lib", "dnsmasq", "dnsmasq.leases")
+    # Changes to the hosts table only mark it dirty. The reloader thread waits for a burst of changes to
+    # settle for RELOAD_DEBOUNCE seconds (but no longer than RELOAD_MAXIMUM_DELAY), then rewrites the
+    # hosts file and sends dnsmasq a single SIGHUP.
+    RELOAD_DEBOUNCE = 0.1
+    RELOAD_MAXIMUM_DELAY = 1
 
     @classmethod
     def eraseLeasesFile(self):
@@ -58,7 +65,11 @@ class DNSMasq(threading.Thread):
             nameserver=None, interface=None):
         self._tftpboot = tftpboot
         self._serverIP = serverIP
-        self._nodesMACIPPairs = []
+        self._macToIP = collections.OrderedDict()
+        self._ipToMAC = dict()
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._changed = threading.Event()
         self._netmask = netmask
         self._firstIP = firstIP
         self._lastIP = lastIP
@@ -67,7 +78,7 @@ class DNSMasq(threading.Thread):
         self._interface = interface
         self._logFile = tempfile.NamedTemporaryFile(suffix=".dnsmasq.log")
         self._configFile = self._configurationFile()
-        self._writeHostsFile()
+        self._writeHostsFile(self._hostsFileContents())
         self._stopped = False
         self._popen = None
         atexit.register(self._exit)
@@ -75,31 +86,80 @@ class DNSMasq(threading.Thread):
         self.daemon = True
         self._asyncExecute()
         threading.Thread.start(self)
-
-    def _reload(self):
-        self._writeHostsFile()
-        os.kill(self._popen.pid, signal.SIGHUP)
+        reloader = threading.Thread(target=self._reloadLoop, name="dnsmasqReloader")
+        reloader.daemon = True
+        reloader.start()
 
     def add(self, mac, ip):
-        assert mac not in [x[0] for x in self._nodesMACIPPairs]
-        assert ip not in [x[1] for x in self._nodesMACIPPairs]
-        self._nodesMACIPPairs.append((mac, ip))
-        self._reload()
+        with self._lock:
+            self._add(mac, ip)
+        self._changed.set()
+
+    def addMany(self, pairs):
+        with self._lock:
+            for mac, ip in pairs:
+                self._add(mac, ip)
+        self._changed.set()
 
     def addIfNotAlready(self, mac, ip):
-        if (mac, ip) in self._nodesMACIPPairs:
-            return
-        self.add(mac, ip)
+        with self._lock:
+            if self._macToIP.get(mac) == ip:
+                return
+            self._add(mac, ip)
+        self._changed.set()
 
     def remove(self, mac):
-        self._nodesMACIPPairs = [(entryMac, entryIp)
-                                 for (entryMac, entryIp) in self._nodesMACIPPairs if entryMac != mac]
-        self._reload()
-
-    def _writeHostsFile(self):
-        with open(self.HOSTS_FILENAME, "w") as f:
-            hosts = ['%s,%s,infinite' % (mac.lower(), ip) for mac, ip in self._nodesMACIPPairs]
-            f.write("\n".join(hosts))
+        with self._lock:
+            ip = self._macToIP.pop(mac, None)
+            if ip is None:
+                return
+            del self._ipToMAC[ip]
+        self._changed.set()
+
+    def flush(self):
+        "Returns False if dnsmasq could not be signalled to reload, in which case the reload is retried"
+        with self._flushLock:
+            self._changed.clear()
+            with self._lock:
+                contents = self._hostsFileContents()
+            self._writeHostsFile(contents)
+            try:
+                os.kill(self._popen.pid, signal.SIGHUP)
+            except OSError as e:
+                logging.error("Unable to signal dnsmasq to reload its hosts file: %(error)s", dict(error=e))
+                self._changed.set()
+                return False
+            return True
+
+    def _add(self, mac, ip):
+        assert mac not in self._macToIP
+        assert ip not in self._ipToMAC
+        self._macToIP[mac] = ip
+        self._ipToMAC[ip] = mac
+
+    def _reloadLoop(self):
+        try:
+            while True:
+                self._changed.wait()
+                self._changed.clear()
+                deadline = time.time() + self.RELOAD_MAXIMUM_DELAY
+                while time.time() < deadline and self._changed.wait(self.RELOAD_DEBOUNCE):
+                    self._changed.clear()
+                if not self.flush():
+                    time.sleep(self.RELOAD_MAXIMUM_DELAY)
+        except:
+            logging.exception("DNSMasq reloader thread died")
+            suicide.killSelf()
+            raise
+
+    def _hostsFileContents(self):
+        return "\n".join(['%s,%s,infinite' % (mac.lower(), ip) for mac, ip in self._macToIP.iteritems()])
+
+    def _writeHostsFile(self, contents):
+        temporary = self.HOSTS_FILENAME + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(contents)
+        os.rename(temporary, self.HOSTS_FILENAME)
 
     def _configurationFile(self):
         conf = tempfile.NamedTemporaryFile(suffix=".dnsmasq.conf")
@@ -5,17 +5,48 @@ import traceback
 import logging
 
 
+# _lock is held either by a single exclusive holder (lock()), or collectively by all shared holders
+# (sharedLock(), for read only access), taken by the first of them and released by the last. Exclusive
+# holders keep the turnstile while waiting for _lock, so new shared holders queue up behind a waiting
+# exclusive holder instead of starving it.
 _lock = threading.Lock()
+_turnstile = threading.Lock()
+_sharedHoldersLock = threading.Lock()
+_nrSharedHolders = 0
 
 
 def prettyStack():
     return "\n".join([line.strip() for line in traceback.format_stack()])
 
 
+def _acquireExclusive():
+    with _turnstile:
+        _lock.acquire()
+
+
+def _acquireShared():
+    global _nrSharedHolders
+    with _turnstile:
+        pass
+    with _sharedHoldersLock:
+        _nrSharedHolders += 1
+        if _nrSharedHolders == 1:
+            _lock.acquire()
+
+
+def _releaseShared():
+    global _nrSharedHolders
+    with _sharedHoldersLock:
+        _nrSharedHolders -= 1
+        if _nrSharedHolders == 0:
+            _lock.release()
+
+
 @contextlib.contextmanager
-def lock():
+def _held(acquire, release):
     before = time.time()
-    with _lock:
+    acquire()
+    try:
         acquired = time.time()
         took = acquired - before
         if took > 0.1:
@@ -29,6 +60,16 @@ def lock():
             logging.error(
                 "Holding the global lock took more than 0.1s: %(took)ss. Stack:\n%(stack)s", dict(
                     took=took, stack=prettyStack()))
+    finally:
+        release()
+
+
+def lock():
+    return _held(_acquireExclusive, _lock.release)
+
+
+def sharedLock():
+    return _held(_acquireShared, _releaseShared)
 
 
 def assertLocked():
@@ -0,0 +1,73 @@
+import time
+import logging
+import threading
+from rackattack.tcp import suicide
+from rackattack.common import globallock
+
+
+class _Monitored:
+    def __init__(self, lastSeen, timeout, timeoutCallback):
+        self.lastSeen = lastSeen
+        self.timeout = timeout
+        self.timeoutCallback = timeoutCallback
+
+
+class HeartbeatMonitor(threading.Thread):
+    # Heartbeats only record a timestamp under a private lock, and never wait for the global lock.
+    # Timeouts are evaluated in bulk by this thread, which takes the global lock only when some of the
+    # monitored ids have actually expired.
+    _CHECK_INTERVAL = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._monitored = dict()
+        threading.Thread.__init__(self)
+        self.daemon = True
+        threading.Thread.start(self)
+
+    def register(self, id, timeout, timeoutCallback):
+        with self._lock:
+            assert id not in self._monitored
+            self._monitored[id] = _Monitored(
+                lastSeen=time.time(), timeout=timeout, timeoutCallback=timeoutCallback)
+
+    def unregister(self, id):
+        with self._lock:
+            self._monitored.pop(id, None)
+
+    def beat(self, ids):
+        now = time.time()
+        with self._lock:
+            for id in ids:
+                monitored = self._monitored.get(id)
+                if monitored is None:
+                    logging.debug("Heartbeat for an unmonitored id: %(id)s", dict(id=id))
+                    continue
+                monitored.lastSeen = now
+
+    def run(self):
+        try:
+            while True:
+                time.sleep(self._CHECK_INTERVAL)
+                self._checkTimeouts()
+        except:
+            logging.exception("Heartbeat monitor thread died")
+            suicide.killSelf()
+            raise
+
+    def _checkTimeouts(self):
+        now = time.time()
+        with self._lock:
+            expired = [(id, monitored) for id, monitored in self._monitored.iteritems()
+                       if now - monitored.lastSeen > monitored.timeout]
+            for id, _ in expired:
+                del self._monitored[id]
+        if not expired:
+            return
+        with globallock.lock():
+            for id, monitored in expired:
+                logging.info("Heartbeat timeout for %(id)s", dict(id=id))
+                try:
+                    monitored.timeoutCallback()
+                except:
+                    logging.exception("Heartbeat timeout callback of %(id)s raised", dict(id=id))
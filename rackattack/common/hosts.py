@@ -1,18 +1,26 @@
 class Hosts:
     def __init__(self):
         self._stateMachines = []
+        self._byID = dict()
 
     def add(self, stateMachine):
         self._stateMachines.append(stateMachine)
+        self._byID.setdefault(stateMachine.hostImplementation().id(), stateMachine)
 
     def byID(self, id):
-        for stateMachine in self._stateMachines:
-            if stateMachine.hostImplementation().id() == id:
-                return stateMachine
-        raise Exception("Host with ID '%s' was not found" % id)
+        if id not in self._byID:
+            raise Exception("Host with ID '%s' was not found" % id)
+        return self._byID[id]
 
     def destroy(self, stateMachine):
         self._stateMachines.remove(stateMachine)
+        id = stateMachine.hostImplementation().id()
+        if self._byID.get(id) is stateMachine:
+            del self._byID[id]
+            for other in self._stateMachines:
+                if other.hostImplementation().id() == id:
+                    self._byID[id] = other
+                    break
 
     def all(self):
         return self._stateMachines
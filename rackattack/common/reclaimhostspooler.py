@@ -2,14 +2,14 @@ import os
 import threading
 import logging
 import Queue
-import base64
 import select
 from rackattack.tcp import suicide
-from rackattack.common import globallock, createfifos
+from rackattack.common import globallock, createfifos, reclamationprotocol
 
 
 class ReclaimHostSpooler(threading.Thread):
     _READ_BUF_SIZE = 1024 ** 2
+    _MAX_FAILURES_PER_LOCK_HOLD = 64
 
     def __init__(self, hosts, requestFifoPath, softReclaimFailedMsgFifoPath):
         threading.Thread.__init__(self)
@@ -24,6 +24,10 @@ class ReclaimHostSpooler(threading.Thread):
                                          cold=self._handleColdReclamationRequest)
         self._notifyThreadReadFd = None
         self._notifyThreadWriteFd = None
+        self._wakeupLock = threading.Lock()
+        self._isWakeupPending = False
+        self._pendingRequests = []
+        self._softReclaimFailedBuffer = ""
         self._isReady = threading.Event()
         self.start()
         logging.info("Reclaim-Host-Spooler is waiting for fifos to be set up...")
@@ -81,17 +85,31 @@ class ReclaimHostSpooler(threading.Thread):
         requestArgs["host"] = host
         cmd = dict(_type=requestType, kwargs=requestArgs)
         self._queue.put(cmd)
+        with self._wakeupLock:
+            if self._isWakeupPending:
+                return
+            self._isWakeupPending = True
         os.write(self._notifyThreadWriteFd, "1")
 
     def _handleReclamationRequest(self):
-        notificationBytes = os.read(self._notifyThreadReadFd, self._READ_BUF_SIZE)
-        nrCommands = len(notificationBytes)
-        for _ in xrange(nrCommands):
-            cmd = self._queue.get(block=True)
+        # A burst of requests wakes the spooler up once, after which the whole queue is drained. The wakeup
+        # is acknowledged after draining the pipe, so that the pipe holds a byte whenever a wakeup is
+        # pending, and before draining the queue, so a request queued meanwhile causes another wakeup
+        # rather than being left behind.
+        os.read(self._notifyThreadReadFd, self._READ_BUF_SIZE)
+        with self._wakeupLock:
+            self._isWakeupPending = False
+        while True:
+            try:
+                cmd = self._queue.get_nowait()
+            except Queue.Empty:
+                break
             cmdType = cmd["_type"]
-            kwargs = cmd["kwargs"]
+            if cmdType != "soft":
+                self._flushRequests()
             action = self._reclamationHandlers[cmdType]
-            action(**kwargs)
+            action(**cmd["kwargs"])
+        self._flushRequests()
 
     def _handleSoftReclamationRequest(self, host, isInauguratorActive, maxUptime):
         credentials = host.rootSSHCredentials()
@@ -109,29 +127,41 @@ class ReclaimHostSpooler(threading.Thread):
         self._sendRequest("soft", args)
 
     def _sendRequest(self, _type, args):
-        args = [_type] + args
-        encodedRequest = base64.encodestring(",".join(args))
-        encodedRequest += ","
-        os.write(self._reclamationRequestFd, encodedRequest)
+        self._pendingRequests.append((_type, args))
+
+    def _flushRequests(self):
+        if not self._pendingRequests:
+            return
+        encoded = reclamationprotocol.encodeMany(self._pendingRequests)
+        self._pendingRequests = []
+        while encoded:
+            nrWritten = os.write(self._reclamationRequestFd, encoded)
+            encoded = encoded[nrWritten:]
 
     def _handleColdReclamationRequest(self, host, hardReset):
         raise NotImplementedError
 
     def _handleSoftReclamationFailedMsg(self):
-        hostsIDs = os.read(self._softReclaimFailedFd, self._READ_BUF_SIZE)
-        hostsIDs = hostsIDs.split(",")
-        for hostID in hostsIDs:
-            if not hostID:
-                continue
+        # Each host ID is terminated by a comma; the last one read may be the beginning of an ID that the
+        # next read completes.
+        self._softReclaimFailedBuffer += os.read(self._softReclaimFailedFd, self._READ_BUF_SIZE)
+        hostsIDs = self._softReclaimFailedBuffer.split(",")
+        self._softReclaimFailedBuffer = hostsIDs.pop()
+        hostsIDs = [hostID for hostID in hostsIDs if hostID]
+        for start in xrange(0, len(hostsIDs), self._MAX_FAILURES_PER_LOCK_HOLD):
             with globallock.lock():
-                try:
-                    host = self._hosts.byID(hostID)
-                except:
-                    logging.warn("A soft reclamation failure  notification was received for a non-existent "
-                                 "host %(hostID)s", dict(hostID=hostID))
-                    continue
-                try:
-                    host.softReclaimFailed()
-                except Exception as e:
-                    logging.error("Error handling soft reclamation failure for host %(host)s: %(message)s",
-                                  dict(host=hostID, message=e.message))
+                for hostID in hostsIDs[start:start + self._MAX_FAILURES_PER_LOCK_HOLD]:
+                    self._handleSoftReclamationFailure(hostID)
+
+    def _handleSoftReclamationFailure(self, hostID):
+        try:
+            host = self._hosts.byID(hostID)
+        except:
+            logging.warn("A soft reclamation failure  notification was received for a non-existent "
+                         "host %(hostID)s", dict(hostID=hostID))
+            return
+        try:
+            host.softReclaimFailed()
+        except Exception as e:
+            logging.error("Error handling soft reclamation failure for host %(host)s: %(message)s",
+                          dict(host=hostID, message=e.message))
@@ -0,0 +1,110 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+from rackattack.common import statistics
+
+
+logger = logging.getLogger("reclamation")
+
+
+class _Job:
+    def __init__(self, key, priority, callback):
+        self.key = key
+        self.priority = priority
+        self.callback = callback
+        self.enqueued = time.time()
+
+
+class ReclamationExecutor:
+    # Runs reclamation jobs on a fixed number of workers, lowest priority value first. Jobs are keyed by
+    # host: a job submitted while another one for the same host is still queued replaces it, keeping the
+    # more urgent priority of the two. A job submitted while one for the same host is running is held
+    # back (again, only the latest one) and queued once the running job finishes.
+    def __init__(self, nrWorkers, name):
+        self._condition = threading.Condition()
+        self._heap = []
+        self._queued = dict()
+        self._running = set()
+        self._heldBack = dict()
+        self._sequence = itertools.count()
+        self._nrCoalesced = 0
+        self._latency = dict()
+        for workerIndex in xrange(nrWorkers):
+            worker = threading.Thread(target=self._work, name="%s-%d" % (name, workerIndex))
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, key, priority, callback):
+        job = _Job(key=key, priority=priority, callback=callback)
+        with self._condition:
+            if key in self._running:
+                if key in self._heldBack:
+                    self._nrCoalesced += 1
+                    job.priority = min(priority, self._heldBack[key].priority)
+                self._heldBack[key] = job
+                return
+            self._enqueue(job)
+
+    def recordPhase(self, phase, seconds):
+        with self._condition:
+            if phase not in self._latency:
+                self._latency[phase] = statistics.Latency()
+        self._latency[phase].record(seconds)
+
+    def stats(self):
+        with self._condition:
+            return dict(inFlight=len(self._running), queued=len(self._queued),
+                        heldBack=len(self._heldBack), coalesced=self._nrCoalesced,
+                        phases=dict((phase, latency.report())
+                                    for phase, latency in self._latency.iteritems()))
+
+    def _enqueue(self, job):
+        previous = self._queued.get(job.key)
+        if previous is not None:
+            self._nrCoalesced += 1
+            job.enqueued = previous.enqueued
+            if previous.priority <= job.priority:
+                job.priority = previous.priority
+                previous.callback = job.callback
+                return
+            previous.callback = None
+        self._queued[job.key] = job
+        heapq.heappush(self._heap, (job.priority, next(self._sequence), job))
+        self._condition.notify()
+
+    def _next(self):
+        with self._condition:
+            while True:
+                while not self._heap:
+                    self._condition.wait()
+                job = heapq.heappop(self._heap)[2]
+                if job.callback is not None:
+                    break
+            del self._queued[job.key]
+            self._running.add(job.key)
+        return job
+
+    def _finished(self, job):
+        with self._condition:
+            self._running.remove(job.key)
+            heldBack = self._heldBack.pop(job.key, None)
+            if heldBack is not None:
+                self._enqueue(heldBack)
+
+    def _work(self):
+        while True:
+            self._runOne()
+
+    def _runOne(self):
+        job = self._next()
+        started = time.time()
+        self.recordPhase("queued", started - job.enqueued)
+        try:
+            job.callback()
+        except:
+            logger.exception("Reclamation job of %(key)s raised", dict(key=job.key))
+        finally:
+            self.recordPhase("total", time.time() - started)
+            self._finished(job)
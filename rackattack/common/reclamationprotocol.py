@@ -0,0 +1,104 @@
+import struct
+import logging
+
+
+logger = logging.getLogger("reclamation")
+
+VERSION = 1
+MAXIMUM_RECORD_SIZE = 64 * 1024
+MAXIMUM_FIELD_SIZE = 0xFFFF
+# Each record is a version byte and the payload length, followed by the payload: the number of fields, the
+# length of each field and then the fields themselves. The first field is the request type.
+_HEADER = struct.Struct("!BI")
+_FIELD_COUNT = struct.Struct("!B")
+_fieldLengths = dict()
+
+
+class InvalidRecord(Exception):
+    pass
+
+
+def _fieldLengthsStruct(nrFields):
+    if nrFields not in _fieldLengths:
+        _fieldLengths[nrFields] = struct.Struct("!%dH" % (nrFields,))
+    return _fieldLengths[nrFields]
+
+
+def encode(actionType, args):
+    fields = [actionType] + list(args)
+    if len(fields) > 255:
+        raise InvalidRecord("Request of %d fields has too many fields" % (len(fields),))
+    for field in fields:
+        if len(field) > MAXIMUM_FIELD_SIZE:
+            raise InvalidRecord("Field of %d bytes is too large" % (len(field),))
+    payload = _FIELD_COUNT.pack(len(fields)) + \
+        _fieldLengthsStruct(len(fields)).pack(*[len(field) for field in fields]) + "".join(fields)
+    if len(payload) > MAXIMUM_RECORD_SIZE:
+        raise InvalidRecord("Request of %d bytes is too large" % (len(payload),))
+    return _HEADER.pack(VERSION, len(payload)) + payload
+
+
+def encodeMany(requests):
+    return "".join(encode(actionType, args) for actionType, args in requests)
+
+
+def _decodePayload(payload):
+    if not payload:
+        raise InvalidRecord("Empty record")
+    nrFields, = _FIELD_COUNT.unpack_from(payload)
+    lengthsStruct = _fieldLengthsStruct(nrFields)
+    offset = _FIELD_COUNT.size + lengthsStruct.size
+    if nrFields == 0 or offset > len(payload):
+        raise InvalidRecord("Truncated field lengths")
+    fields = []
+    for length in lengthsStruct.unpack_from(payload, _FIELD_COUNT.size):
+        fields.append(payload[offset:offset + length])
+        offset += length
+    if offset != len(payload):
+        raise InvalidRecord("Field lengths do not match the record length")
+    return fields[0], fields[1:]
+
+
+class Decoder:
+    # Reassembles records from the chunks read from the pipe, which may end in the middle of a record. A
+    # record header of an unknown version or length means the stream is out of sync, in which case
+    # everything buffered is dropped.
+    def __init__(self):
+        self._buffer = ""
+        self._nrInvalid = 0
+
+    def feed(self, data):
+        self._buffer += data
+        requests = []
+        offset = 0
+        while len(self._buffer) - offset >= _HEADER.size:
+            version, length = _HEADER.unpack_from(self._buffer, offset)
+            if version != VERSION or length > MAXIMUM_RECORD_SIZE:
+                logger.error("Invalid record header (version %(version)s, length %(length)s), dropping "
+                             "%(nrBytes)s buffered bytes", dict(version=version, length=length,
+                                                                nrBytes=len(self._buffer) - offset))
+                self._nrInvalid += 1
+                self._buffer = ""
+                return requests
+            end = offset + _HEADER.size + length
+            if end > len(self._buffer):
+                break
+            try:
+                requests.append(_decodePayload(self._buffer[offset + _HEADER.size:end]))
+            except InvalidRecord as e:
+                logger.error("Dropping invalid record: %(message)s", dict(message=e.message))
+                self._nrInvalid += 1
+            offset = end
+        self._buffer = self._buffer[offset:]
+        return requests
+
+    def reset(self):
+        if self._buffer:
+            logger.warn("Dropping %(nrBytes)s bytes of a partial record", dict(nrBytes=len(self._buffer)))
+        self._buffer = ""
+
+    def pending(self):
+        return len(self._buffer)
+
+    def nrInvalid(self):
+        return self._nrInvalid
@@ -1,9 +1,8 @@
 import os
-import base64
 import logging
 import threading
 import functools
-from rackattack.common import tftpboot, softreclaim, createfifos
+from rackattack.common import tftpboot, softreclaim, createfifos, reclamationexecutor, reclamationprotocol
 
 
 logger = logging.getLogger("reclamation")
@@ -12,13 +11,15 @@ logger = logging.getLogger("reclamation")
 class ThreadsMonitor:
     def __init__(self):
         self._threads = set()
+        self._pruneAt = 1
 
     def add(self, _thread):
         self._threads.add(_thread)
         del _thread
-        self._threads = set([_thread for _thread in self._threads if _thread.isAlive()])
-        nrThreads = len(self._threads)
-        logger.info("Currently running %(nrThreads)s threads.", dict(nrThreads=nrThreads))
+        if len(self._threads) >= self._pruneAt:
+            self._threads = set([_thread for _thread in self._threads if _thread.isAlive()])
+            self._pruneAt = 2 * len(self._threads) + 1
+        logger.info("Currently running at most %(nrThreads)s threads.", dict(nrThreads=len(self._threads)))
 
 
 class InauguratorCommandLine:
@@ -51,13 +52,11 @@ class InauguratorCommandLine:
         return result
 
 
-class InvalidRequest(Exception):
-    pass
-
-
 class ReclamationServer:
-    # A large buffer size is needed to avoid the need for reassembly of chunks read from the pipe.
-    _BUF_SIZE = 1024 ** 2
+    _BUF_SIZE = 64 * 1024
+    # Inaugurator reboots are a single message, so they go ahead of SSH connections and kexecs
+    _PRIORITY_INAUGURATOR_REBOOT = 0
+    _PRIORITY_KEXEC = 1
 
     def __init__(self,
                  netmask,
@@ -68,7 +67,8 @@ class ReclamationServer:
                  rootPassword,
                  withLocalObjectStore,
                  reclamationRequestFifoPath,
-                 softReclamationFailedMsgFifoPath):
+                 softReclamationFailedMsgFifoPath,
+                 nrSoftReclamationWorkers=10):
         self._inauguratorCommandLine = InauguratorCommandLine(netmask,
                                                               osmosisServerIP,
                                                               inauguratorServerIP,
@@ -79,23 +79,30 @@ class ReclamationServer:
         self._reclamationRequestFifoPath = reclamationRequestFifoPath
         self._softReclamationFailedMsgFifoPath = softReclamationFailedMsgFifoPath
         self._monitor = ThreadsMonitor()
+        self._executor = reclamationexecutor.ReclamationExecutor(
+            nrWorkers=nrSoftReclamationWorkers, name="softReclamation")
         self._requestsReadFd = None
+        self._decoder = reclamationprotocol.Decoder()
         self._softReclamationFailedMsgFifoWriteFd = None
-        self._inauguratorKernel = None
-        self._inauguratorInitRD = None
+        self._inauguratorFiles = None
         self._actionTypes = dict()
 
     def _setup(self):
         self._validateFifosExist()
         self._openFifos()
-        self._inauguratorKernel = tftpboot.INAUGURATOR_KERNEL
-        self._inauguratorInitRD = tftpboot.INAUGURATOR_INITRD
+        self._inauguratorFiles = softreclaim.InauguratorFiles(
+            kernelFilename=tftpboot.INAUGURATOR_KERNEL, initrdFilename=tftpboot.INAUGURATOR_INITRD)
         self._actionTypes["soft"] = functools.partial(
             softreclaim.SoftReclaim,
             inauguratorCommandLine=self._inauguratorCommandLine,
             softReclamationFailedMsgFifoWriteFd=self._softReclamationFailedMsgFifoWriteFd,
-            inauguratorKernel=self._inauguratorKernel,
-            inauguratorInitRD=self._inauguratorInitRD)
+            inauguratorFiles=self._inauguratorFiles,
+            recordPhase=self._executor.recordPhase)
+
+    def stats(self):
+        stats = self._executor.stats()
+        stats['invalidRecords'] = self._decoder.nrInvalid()
+        return stats
 
     def registerAction(self, _type, callback):
         assert _type not in self._actionTypes
@@ -110,35 +117,6 @@ class ReclamationServer:
                 self._executeRequest(actionType, args)
         self._cleanup()
 
-    def _decodeRequest(self, request):
-        try:
-            request = base64.decodestring(request)
-            if not request:
-                raise ValueError(request)
-        except:
-            logger.error("Could not decode request's base64: %(request)s", dict(request=request))
-            raise InvalidRequest(request)
-        request = request.split(",")
-        try:
-            actionType = request[0]
-            args = request[1:]
-        except KeyError:
-            logger.warn("Invalid fields in request %(request)s", dict(request=str(request)))
-            raise InvalidRequest(request)
-        if actionType not in self._actionTypes:
-            logger.warn("Invalid request type: %(actionType)s. Ignoring.", dict(actionType=actionType))
-            raise InvalidRequest(request)
-        return actionType, args
-
-    def _decodeRequests(self, encodedRequests):
-        encodedRequests = encodedRequests.split(",")
-        for encodedRequest in encodedRequests:
-            try:
-                decodedRequest = self._decodeRequest(encodedRequest)
-            except InvalidRequest:
-                continue
-            yield decodedRequest
-
     def _validateFifosExist(self):
         logger.info("Validating fifos exist.")
         fifos = (self._reclamationRequestFifoPath, self._softReclamationFailedMsgFifoPath)
@@ -162,20 +140,24 @@ class ReclamationServer:
 
     def _handleEmptyStringFromPipe(self):
         os.close(self._requestsReadFd)
+        self._decoder.reset()
         logger.info("Reopening requests queue...")
         self._openRequestsFifo()
 
     def _readRequestsFromPipe(self):
-        encoded = ""
-        while not encoded:
-            encoded = os.read(self._requestsReadFd, self._BUF_SIZE)
-            if not encoded:
+        requests = []
+        while not requests:
+            chunk = os.read(self._requestsReadFd, self._BUF_SIZE)
+            if not chunk:
                 self._handleEmptyStringFromPipe()
                 continue
-            encoded = encoded.strip(" ,")
-            decoded = self._decodeRequests(encoded)
-        for actionType, args in decoded:
-            yield actionType, args
+            for actionType, args in self._decoder.feed(chunk):
+                if actionType not in self._actionTypes:
+                    logger.warn("Invalid request type: %(actionType)s. Ignoring.",
+                                dict(actionType=actionType))
+                    continue
+                requests.append((actionType, args))
+        return requests
 
     def _cleanup(self):
         os.close(self._softReclamationFailedMsgFifoWriteFd)
@@ -187,7 +169,12 @@ class ReclamationServer:
                     dict(command=actionType, args=args))
         try:
             callback = action(*args)
-            if isinstance(callback, threading.Thread):
+            if isinstance(callback, softreclaim.SoftReclaim):
+                self._executor.submit(
+                    key=callback.hostID(), callback=callback.run,
+                    priority=self._PRIORITY_INAUGURATOR_REBOOT if callback.isInauguratorActive() else
+                    self._PRIORITY_KEXEC)
+            elif isinstance(callback, threading.Thread):
                 self._monitor.add(callback)
         except Exception as e:
             logger.error("An error has occurred while executing request: %(message)s",
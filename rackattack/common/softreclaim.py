@@ -1,8 +1,8 @@
 import os
 import time
+import hashlib
 import socket
 import logging
-import threading
 from rackattack.ssh import connection
 
 
@@ -13,7 +13,23 @@ class UptimeTooLong(Exception):
     pass
 
 
-class SoftReclaim(threading.Thread):
+class InauguratorFiles:
+    "The inaugurator kernel and initrd, read once and shared by all soft reclamations"
+    KERNEL_PATH = "/tmp/vmlinuz"
+    INITRD_PATH = "/tmp/initrd"
+
+    def __init__(self, kernelFilename, initrdFilename):
+        self.kernel = self._read(kernelFilename)
+        self.initrd = self._read(initrdFilename)
+        self.checksums = {self.KERNEL_PATH: hashlib.md5(self.kernel).hexdigest(),
+                          self.INITRD_PATH: hashlib.md5(self.initrd).hexdigest()}
+
+    def _read(self, filename):
+        with open(filename, "rb") as f:
+            return f.read()
+
+
+class SoftReclaim:
     _KEXEC_CMD = "kexec"
 
     def __init__(self,
@@ -27,13 +43,11 @@ class SoftReclaim(threading.Thread):
                  maxUptime,
                  inauguratorCommandLine,
                  softReclamationFailedMsgFifoWriteFd,
-                 inauguratorKernel,
-                 inauguratorInitRD):
-        threading.Thread.__init__(self)
+                 inauguratorFiles,
+                 recordPhase):
         self._inauguratorCommandLine = inauguratorCommandLine
         self._softReclamationFailedMsgFifoWriteFd = softReclamationFailedMsgFifoWriteFd
-        self._inauguratorKernel = inauguratorKernel
-        self._inauguratorInitRD = inauguratorInitRD
+        self._inauguratorFiles = inauguratorFiles
         self._hostID = hostID
         self._hostname = hostname
         self._username = username
@@ -45,15 +59,27 @@ class SoftReclaim(threading.Thread):
         self._isInauguratorActive = isInauguratorActive == "True"
         self._maxUptime = maxUptime
         self._connection = None
-        self.daemon = True
-        threading.Thread.start(self)
+        self._recordPhase = recordPhase
+
+    def hostID(self):
+        return self._hostID
+
+    def isInauguratorActive(self):
+        return self._isInauguratorActive
 
     def run(self):
         if self._isInauguratorActive:
-            self._softReclaimInaugurator()
+            self._timed("inauguratorReboot", self._softReclaimInaugurator)
         else:
             self._softReclaimBySSH()
 
+    def _timed(self, phase, callback):
+        before = time.time()
+        try:
+            return callback()
+        finally:
+            self._recordPhase(phase, time.time() - before)
+
     def _softReclaimInaugurator(self):
         logger.info("Attempting to reclaim inaugurator in %(hostID)s...", dict(hostID=self._hostID))
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -82,14 +108,14 @@ class SoftReclaim(threading.Thread):
                                                  username=self._username,
                                                  password=self._password)
         try:
-            self._connection.connect()
+            self._timed("sshConnect", self._connection.connect)
         except:
             logger.info("Unable to connect by ssh to '%(id)s'.", dict(id=self._hostID))
             self._sendSoftReclaimFailedMsg()
             return
         try:
-            self._validateUptime()
-            self._reclaimByKexec()
+            self._timed("validateUptime", self._validateUptime)
+            self._timed("kexec", self._reclaimByKexec)
         except UptimeTooLong as e:
             logger.error("System '%(id)s' is up for too long: %(uptime)s. Will not kexec.",
                          dict(id=self._hostID, uptime=e.args[0]))
@@ -122,9 +148,28 @@ class SoftReclaim(threading.Thread):
         uptime = float(uptimeSecondsPart)
         return uptime
 
+    def _hasInauguratorFiles(self):
+        checksums = dict()
+        try:
+            output = self._connection.run.script("md5sum %s %s" % (
+                InauguratorFiles.KERNEL_PATH, InauguratorFiles.INITRD_PATH))
+            for line in output.strip().split("\n"):
+                checksum, path = line.split(None, 1)
+                checksums[path] = checksum
+        except:
+            return False
+        return checksums == self._inauguratorFiles.checksums
+
+    def _uploadInauguratorFiles(self):
+        if self._timed("checksumProbe", self._hasInauguratorFiles):
+            logger.info("Host %(hostID)s already has the inaugurator, not uploading it", dict(
+                hostID=self._hostID))
+            return
+        self._connection.ftp.putContents(InauguratorFiles.KERNEL_PATH, self._inauguratorFiles.kernel)
+        self._connection.ftp.putContents(InauguratorFiles.INITRD_PATH, self._inauguratorFiles.initrd)
+
     def _reclaimByKexec(self):
-        self._connection.ftp.putFile("/tmp/vmlinuz", self._inauguratorKernel)
-        self._connection.ftp.putFile("/tmp/initrd", self._inauguratorInitRD)
+        self._timed("upload", self._uploadInauguratorFiles)
         self._connection.run.script(
             "%s --load /tmp/vmlinuz --initrd=/tmp/initrd --append='%s'" %
             (self._KEXEC_CMD,
@@ -0,0 +1,31 @@
+import threading
+
+
+class Latency:
+    _BUCKETS_UPPER_BOUNDS = (0.001, 0.01, 0.1, 1, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._histogram = [0] * (len(self._BUCKETS_UPPER_BOUNDS) + 1)
+
+    def record(self, seconds):
+        bucket = 0
+        while bucket < len(self._BUCKETS_UPPER_BOUNDS) and seconds > self._BUCKETS_UPPER_BOUNDS[bucket]:
+            bucket += 1
+        with self._lock:
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+            self._histogram[bucket] += 1
+
+    def report(self):
+        with self._lock:
+            average = self._total / self._count if self._count else 0.0
+            histogram = dict(("<=%ss" % bound, count)
+                             for bound, count in zip(self._BUCKETS_UPPER_BOUNDS, self._histogram))
+            histogram[">%ss" % self._BUCKETS_UPPER_BOUNDS[-1]] = self._histogram[-1]
+            return dict(count=self._count, averageSeconds=average, maxSeconds=self._max,
+                        histogram=histogram)
@@ -20,6 +20,7 @@ class Test(unittest.TestCase):
         subprocess.Popen = mock.MagicMock(spec=subprocess.Popen)
         self.tftpBootMock = mock.Mock(tftpboot.TFTPBoot)
         DNSMasq.run = lambda x: None
+        DNSMasq._reloadLoop = lambda x: None
         self.tested = DNSMasq(self.tftpBootMock, '10.0.0.1', '255.255.255.0', '10.0.0.2', '10.0.0.10',
                               gateway='10.0.0.20', nameserver='8.8.8.8', interface='eth0')
         self.tested._popen = subprocess.Popen()
@@ -30,10 +31,12 @@ class Test(unittest.TestCase):
 
     def test_addHost(self, *args):
         self.tested.add('11:22:33:44:55:66', '10.0.0.3')
+        self.tested.flush()
         os.kill.assert_called_once_with(12345, signal.SIGHUP)
         os.kill.reset_mock()
         self.assertEquals(self.getHostsFileContents(), '11:22:33:44:55:66,10.0.0.3,infinite')
         self.tested.add('11:22:33:44:55:67', '10.0.0.4')
+        self.tested.flush()
         os.kill.assert_called_once_with(12345, signal.SIGHUP)
         self.assertEquals(self.getHostsFileContents(),
                           '11:22:33:44:55:66,10.0.0.3,infinite\n11:22:33:44:55:67,10.0.0.4,infinite')
@@ -41,37 +44,81 @@ class Test(unittest.TestCase):
     def test_addRemove(self, *args):
         self.tested.add('11:22:33:44:55:66', '10.0.0.3')
         self.tested.add('11:22:33:44:55:67', '10.0.0.4')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(),
                           '11:22:33:44:55:66,10.0.0.3,infinite\n11:22:33:44:55:67,10.0.0.4,infinite')
         os.kill.reset_mock()
         self.tested.remove('11:22:33:44:55:66')
+        self.tested.flush()
         os.kill.assert_called_once_with(12345, signal.SIGHUP)
         self.assertEquals(self.getHostsFileContents(), '11:22:33:44:55:67,10.0.0.4,infinite')
 
     def test_addIfNotAlready(self, *args):
         self.tested.addIfNotAlready('11:22:33:44:55:66', '10.0.0.3')
         self.tested.addIfNotAlready('11:22:33:44:55:66', '10.0.0.3')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(),
                           '11:22:33:44:55:66,10.0.0.3,infinite')
         self.tested.remove('11:22:33:44:55:66')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(), '')
         self.tested.addIfNotAlready('11:22:33:44:55:66', '10.0.0.3')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(),
                           '11:22:33:44:55:66,10.0.0.3,infinite')
 
     def test_addRemoveTwice(self, *args):
         self.tested.add('11:22:33:44:55:66', '10.0.0.3')
         self.tested.add('11:22:33:44:55:67', '10.0.0.4')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(),
                           '11:22:33:44:55:66,10.0.0.3,infinite\n11:22:33:44:55:67,10.0.0.4,infinite')
         self.tested.remove('11:22:33:44:55:66')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(), '11:22:33:44:55:67,10.0.0.4,infinite')
         self.tested.remove('11:22:33:44:55:66')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(), '11:22:33:44:55:67,10.0.0.4,infinite')
         self.tested.add('11:22:33:44:55:66', '10.0.0.3')
+        self.tested.flush()
         self.assertEquals(self.getHostsFileContents(),
                           '11:22:33:44:55:67,10.0.0.4,infinite\n11:22:33:44:55:66,10.0.0.3,infinite')
 
+    def test_burstOfChangesIsOneReload(self, *args):
+        self.tested.add('11:22:33:44:55:66', '10.0.0.3')
+        self.tested.addIfNotAlready('11:22:33:44:55:67', '10.0.0.4')
+        self.tested.remove('11:22:33:44:55:66')
+        self.assertEquals(os.kill.call_count, 0)
+        self.tested.flush()
+        os.kill.assert_called_once_with(12345, signal.SIGHUP)
+        self.assertEquals(self.getHostsFileContents(), '11:22:33:44:55:67,10.0.0.4,infinite')
+
+    def test_addMany(self, *args):
+        self.tested.addMany([('11:22:33:44:55:66', '10.0.0.3'), ('11:22:33:44:55:67', '10.0.0.4')])
+        self.tested.flush()
+        os.kill.assert_called_once_with(12345, signal.SIGHUP)
+        self.assertEquals(self.getHostsFileContents(),
+                          '11:22:33:44:55:66,10.0.0.3,infinite\n11:22:33:44:55:67,10.0.0.4,infinite')
+
+    def test_duplicateIPIsRefused(self, *args):
+        self.tested.add('11:22:33:44:55:66', '10.0.0.3')
+        self.assertRaises(AssertionError, self.tested.add, '11:22:33:44:55:67', '10.0.0.3')
+
+    def test_hostsFileReplacedAtomically(self, *args):
+        self.tested.add('11:22:33:44:55:66', '10.0.0.3')
+        self.tested.flush()
+        self.assertFalse(self.fakeFilesystem.Exists(DNSMasq.HOSTS_FILENAME + ".tmp"))
+
+    def test_failureToSignalDNSMasqIsRetried(self, *args):
+        self.tested.add('11:22:33:44:55:66', '10.0.0.3')
+        os.kill.side_effect = OSError(3, "No such process")
+        self.assertFalse(self.tested.flush())
+        self.assertTrue(self.tested._changed.is_set())
+        os.kill.side_effect = None
+        self.assertTrue(self.tested.flush())
+        self.assertFalse(self.tested._changed.is_set())
+        self.assertEquals(os.kill.call_count, 2)
+
     def test_eraseLeasesFile(self, *args):
         self.assertTrue(self.fakeFilesystem.Exists(DNSMasq.LEASES_FILE))
         self.tested.eraseLeasesFile()
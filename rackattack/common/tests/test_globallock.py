@@ -0,0 +1,75 @@
+import time
+import unittest
+import threading
+from rackattack.common import globallock
+
+
+class Test(unittest.TestCase):
+    def _inThread(self, lock, events):
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with lock():
+                events.append(globallock.assertLocked())
+                acquired.set()
+                release.wait()
+        thread = threading.Thread(target=hold)
+        thread.daemon = True
+        thread.start()
+        return thread, acquired, release
+
+    def test_SharedHoldersRunConcurrently(self):
+        events = []
+        first, firstAcquired, releaseFirst = self._inThread(globallock.sharedLock, events)
+        self.assertTrue(firstAcquired.wait(2))
+        second, secondAcquired, releaseSecond = self._inThread(globallock.sharedLock, events)
+        self.assertTrue(secondAcquired.wait(2))
+        self.assertEquals(events, [True, True])
+        releaseFirst.set()
+        releaseSecond.set()
+        first.join(2)
+        second.join(2)
+        self.assertTrue(globallock._lock.acquire(False))
+        globallock._lock.release()
+
+    def test_ExclusiveHolderWaitsForSharedHolders(self):
+        events = []
+        reader, readerAcquired, releaseReader = self._inThread(globallock.sharedLock, events)
+        self.assertTrue(readerAcquired.wait(2))
+        writer, writerAcquired, releaseWriter = self._inThread(globallock.lock, events)
+        self.assertFalse(writerAcquired.wait(0.1))
+        releaseReader.set()
+        self.assertTrue(writerAcquired.wait(2))
+        releaseWriter.set()
+        reader.join(2)
+        writer.join(2)
+
+    def test_SharedHoldersDoNotStarveWaitingExclusiveHolder(self):
+        events = []
+        reader, readerAcquired, releaseReader = self._inThread(globallock.sharedLock, events)
+        self.assertTrue(readerAcquired.wait(2))
+        writer, writerAcquired, releaseWriter = self._inThread(globallock.lock, events)
+        time.sleep(0.05)
+        lateReader, lateReaderAcquired, releaseLateReader = self._inThread(globallock.sharedLock, events)
+        self.assertFalse(lateReaderAcquired.wait(0.1))
+        releaseReader.set()
+        self.assertTrue(writerAcquired.wait(2))
+        self.assertFalse(lateReaderAcquired.wait(0.1))
+        releaseWriter.set()
+        self.assertTrue(lateReaderAcquired.wait(2))
+        releaseLateReader.set()
+        for thread in [reader, writer, lateReader]:
+            thread.join(2)
+
+    def test_LockIsReleasedOnException(self):
+        def raises():
+            with globallock.sharedLock():
+                raise ValueError("ignore me")
+        self.assertRaises(ValueError, raises)
+        with globallock.lock():
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
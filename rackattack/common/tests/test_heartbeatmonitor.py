@@ -0,0 +1,76 @@
+import mock
+import unittest
+import threading
+from rackattack.common import globallock
+from rackattack.common import heartbeatmonitor
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(threading.Thread, "start"):
+            self.tested = heartbeatmonitor.HeartbeatMonitor()
+        self.now = 1000
+        self.origTime = heartbeatmonitor.time.time
+        heartbeatmonitor.time.time = lambda: self.now
+        self.timedOut = []
+
+    def tearDown(self):
+        heartbeatmonitor.time.time = self.origTime
+
+    def register(self, id, timeout=15):
+        self.tested.register(id, timeout=timeout, timeoutCallback=lambda: self.timedOut.append(id))
+
+    def test_TimeoutWithoutHeartbeats(self):
+        self.register(1)
+        self.now += 15
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [])
+        self.now += 1
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [1])
+        self.now += 100
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [1])
+
+    def test_HeartbeatsPostponeTimeout(self):
+        self.register(1)
+        self.register(2)
+        for _ in xrange(10):
+            self.now += 10
+            self.tested.beat([1])
+            self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [2])
+
+    def test_UnregisteredIsNotTimedOut(self):
+        self.register(1)
+        self.tested.unregister(1)
+        self.now += 100
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [])
+
+    def test_HeartbeatForUnknownIDIsIgnored(self):
+        self.tested.beat([1, 2])
+        self.tested.unregister(3)
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [])
+
+    def test_TimeoutCallbacksAreCalledUnderTheGlobalLock(self):
+        def callback():
+            self.timedOut.append(globallock.assertLocked())
+        self.tested.register(1, timeout=1, timeoutCallback=callback)
+        self.now += 2
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [True])
+
+    def test_RaisingCallbackDoesNotPreventOtherTimeouts(self):
+        def raises():
+            raise Exception("ignore me")
+        self.tested.register(1, timeout=1, timeoutCallback=raises)
+        self.register(2, timeout=1)
+        self.now += 2
+        self.tested._checkTimeouts()
+        self.assertEquals(self.timedOut, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
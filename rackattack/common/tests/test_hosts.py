@@ -0,0 +1,39 @@
+import unittest
+from rackattack.common.hosts import Hosts
+from rackattack.common.tests.common import FakeHost, FakeHostStateMachine
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tested = Hosts()
+
+    def add(self, id):
+        host = FakeHost()
+        host._id = id
+        stateMachine = FakeHostStateMachine(host)
+        self.tested.add(stateMachine)
+        return stateMachine
+
+    def test_ByID(self):
+        first = self.add("first")
+        second = self.add("second")
+        self.assertIs(self.tested.byID("first"), first)
+        self.assertIs(self.tested.byID("second"), second)
+        self.assertRaises(Exception, self.tested.byID, "third")
+
+    def test_DestroyedHostIsNotFound(self):
+        first = self.add("first")
+        self.tested.destroy(first)
+        self.assertRaises(Exception, self.tested.byID, "first")
+        self.assertEquals(self.tested.all(), [])
+
+    def test_HostWithSameIDIsFoundAfterTheFirstIsDestroyed(self):
+        first = self.add("host")
+        second = self.add("host")
+        self.assertIs(self.tested.byID("host"), first)
+        self.tested.destroy(first)
+        self.assertIs(self.tested.byID("host"), second)
+
+
+if __name__ == '__main__':
+    unittest.main()
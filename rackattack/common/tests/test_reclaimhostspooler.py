@@ -1,10 +1,10 @@
 import os
 import mock
-import base64
 import logging
 import unittest
 import greenlet
 from rackattack.common import reclaimhostspooler
+from rackattack.common import reclamationprotocol
 from rackattack.common.hosts import Hosts
 from rackattack.common.tests.epolleventloop_testcase import EpollEventLoopTestCase
 from rackattack.common.tests.common import FakeHost, FakeTFTPBoot, FakeHostStateMachine
@@ -60,7 +60,7 @@ class Test(EpollEventLoopTestCase):
         self._continueWithEventLoop()
         softReclaimFailedFifoWriteFd = self._pipeMethodsMock.osOpen(self._fakeSoftReclaimFailedFifoPath,
                                                                     os.O_WRONLY)
-        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, self._host.id())
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, self._host.id() + ",")
         self._continueWithEventLoop()
         self._hostStateMachine.softReclaimFailed.assert_called_once_with()
 
@@ -69,7 +69,7 @@ class Test(EpollEventLoopTestCase):
         self._continueWithEventLoop()
         softReclaimFailedFifoWriteFd = self._pipeMethodsMock.osOpen(self._fakeSoftReclaimFailedFifoPath,
                                                                     os.O_WRONLY)
-        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, self._host.id())
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, self._host.id() + ",")
         self._continueWithEventLoop()
         self._hostStateMachine.softReclaimFailed.assert_called_once_with()
         self._hostStateMachine.softReclaimFailed.side_effect = None
@@ -79,7 +79,7 @@ class Test(EpollEventLoopTestCase):
         self._continueWithEventLoop()
         softReclaimFailedFifoWriteFd = self._pipeMethodsMock.osOpen(self._fakeSoftReclaimFailedFifoPath,
                                                                     os.O_WRONLY)
-        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, "non-existent")
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, "non-existent,")
         self._continueWithEventLoop()
         self._validateSoftReclaimFlow()
 
@@ -91,6 +91,48 @@ class Test(EpollEventLoopTestCase):
         self._continueWithEventLoop()
         self._validateSoftReclaimFlow()
 
+    def test_SoftReclaimFailedMsgSplitAcrossReads(self):
+        self._continueWithEventLoop()
+        softReclaimFailedFifoWriteFd = self._pipeMethodsMock.osOpen(self._fakeSoftReclaimFailedFifoPath,
+                                                                    os.O_WRONLY)
+        hostID = self._host.id()
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, hostID[:2])
+        self._continueWithEventLoop()
+        self.assertFalse(self._hostStateMachine.softReclaimFailed.called)
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, hostID[2:] + ",")
+        self._continueWithEventLoop()
+        self._hostStateMachine.softReclaimFailed.assert_called_once_with()
+
+    def test_SoftReclaimFailedMsgSplitAcrossAFlushOfRequests(self):
+        self._continueWithEventLoop()
+        softReclaimFailedFifoWriteFd = self._pipeMethodsMock.osOpen(self._fakeSoftReclaimFailedFifoPath,
+                                                                    os.O_WRONLY)
+        otherHost = FakeHost()
+        otherHost._id = "rackattack-vm12"
+        otherStateMachine = FakeHostStateMachine(otherHost)
+        self._hosts.add(otherStateMachine)
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, self._host.id() + ",rackattack-vm")
+        self._continueWithEventLoop()
+        self._hostStateMachine.softReclaimFailed.assert_called_once_with()
+        self._addSoftReclamationRequest(self._host)
+        self._continueWithEventLoop()
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, "12,")
+        self._continueWithEventLoop()
+        otherStateMachine.softReclaimFailed.assert_called_once_with()
+        self._hostStateMachine.softReclaimFailed.assert_called_once_with()
+
+    def test_BatchOfSoftReclaimFailedMsgsIsHandledInBoundedLockHolds(self):
+        self._continueWithEventLoop()
+        softReclaimFailedFifoWriteFd = self._pipeMethodsMock.osOpen(self._fakeSoftReclaimFailedFifoPath,
+                                                                    os.O_WRONLY)
+        nrFailures = self._tested._MAX_FAILURES_PER_LOCK_HOLD + 1
+        self._pipeMethodsMock.osWrite(softReclaimFailedFifoWriteFd, (self._host.id() + ",") * nrFailures)
+        with mock.patch.object(reclaimhostspooler.globallock, "lock",
+                               mock.Mock(wraps=reclaimhostspooler.globallock.lock)) as lock:
+            self._continueWithEventLoop()
+        self.assertEquals(lock.call_count, 2)
+        self.assertEquals(self._hostStateMachine.softReclaimFailed.call_count, nrFailures)
+
     def test_SuicideOnFailure(self):
         self._continueWithEventLoop()
         self._addColdReclamationRequest(self._host)
@@ -114,6 +156,59 @@ class Test(EpollEventLoopTestCase):
         self._continueWithEventLoop()
         self._validateExpectedRequests()
 
+    def test_BurstOfSoftReclaimRequestsIsSentInOneWrite(self):
+        self._continueWithEventLoop()
+        fifo = self._pipeMethodsMock.getFifoByFilename(self._fakeSoftReclaimRequestFifoPath)
+        fifo.write = mock.Mock(wraps=fifo.write)
+        for _ in xrange(3):
+            self._addSoftReclamationRequest(self._host)
+        notifyPipe = self._pipeMethodsMock.getPipeByWriteFd(self._tested._notifyThreadWriteFd)
+        self.assertEquals(len(notifyPipe.content), 1)
+        self._continueWithEventLoop()
+        self.assertEquals(fifo.write.call_count, 1)
+        actual = reclamationprotocol.Decoder().feed(fifo.content)
+        self.assertEquals(actual, [self._getSoftRequest(self._host)] * 3)
+
+    def test_RequestQueuedWhileAcknowledgingTheWakeupIsNotLost(self):
+        self._continueWithEventLoop()
+        fifo = self._pipeMethodsMock.getFifoByFilename(self._fakeSoftReclaimRequestFifoPath)
+        notifyPipe = self._pipeMethodsMock.getPipeByWriteFd(self._tested._notifyThreadWriteFd)
+        origRead = reclaimhostspooler.os.read
+
+        def readThenEnqueue(fd, length):
+            data = origRead(fd, length)
+            if fd == self._tested._notifyThreadReadFd:
+                reclaimhostspooler.os.read = origRead
+                self._tested.soft(self._host, maxUptime=4)
+            return data
+        self._addSoftReclamationRequest(self._host)
+        reclaimhostspooler.os.read = readThenEnqueue
+        try:
+            self._continueWithEventLoop()
+        finally:
+            reclaimhostspooler.os.read = origRead
+        self.assertTrue(self._tested._queue.empty())
+        self.assertFalse(self._tested._isWakeupPending)
+        self.assertEquals(notifyPipe.content, "")
+        actual = reclamationprotocol.Decoder().feed(fifo.content)
+        self.assertEquals(actual, [self._getSoftRequest(self._host)] * 2)
+        self._addSoftReclamationRequest(self._host)
+        self.assertEquals(len(notifyPipe.content), 1)
+
+    def test_ColdReclaimRequestKeepsItsPlaceInABurst(self):
+        self._continueWithEventLoop()
+        self._actualColdReclamationRequests = mock.Mock(wraps=self._actualColdReclamationRequests)
+        fifo = self._pipeMethodsMock.getFifoByFilename(self._fakeSoftReclaimRequestFifoPath)
+        nrRequestsWhenColdReclaimed = []
+        self._actualColdReclamationRequests.append.side_effect = lambda request: \
+            nrRequestsWhenColdReclaimed.append(len(reclamationprotocol.Decoder().feed(fifo.content)))
+        self._addSoftReclamationRequest(self._host)
+        self._addColdReclamationRequest(self._host)
+        self._addSoftReclamationRequest(self._host)
+        self._continueWithEventLoop()
+        self.assertEquals(nrRequestsWhenColdReclaimed, [1])
+        self.assertEquals(len(reclamationprotocol.Decoder().feed(fifo.content)), 2)
+
     def _addSoftReclamationRequest(self, host):
         self._expectedRequests.append(["soft", self._host])
         request = greenlet.greenlet(lambda: self._tested.soft(self._host, maxUptime=4))
@@ -133,9 +228,9 @@ class Test(EpollEventLoopTestCase):
                 expected = request[1:]
             elif requestType == "soft":
                 host = request[1]
-                expected = self._getEncodedSoftRequest(host)
+                expected = [self._getSoftRequest(host)]
                 actual = self._pipeMethodsMock.getFifoContent(self._fakeSoftReclaimRequestFifoPath)
-                actual = base64.decodestring(actual)
+                actual = reclamationprotocol.Decoder().feed(actual)
             else:
                 self.assertFalse(True)
             self.assertEquals(actual, expected)
@@ -150,17 +245,9 @@ class Test(EpollEventLoopTestCase):
             raise ValueError("Ignore me")
         self._actualColdReclamationRequests.append([host, hardReset])
 
-    def _getEncodedColdRequest(self, host):
-        requestArgs = [host.id(),
-                       host.primaryMACAddress()]
-        decodedRequest = ",".join(requestArgs)
-        encodedRequest = base64.encodestring(decodedRequest)
-        return encodedRequest
-
-    def _getEncodedSoftRequest(self, host):
+    def _getSoftRequest(self, host):
         credentials = host.rootSSHCredentials()
-        requestArgs = ["soft",
-                       host.id(),
+        requestArgs = [host.id(),
                        credentials["hostname"],
                        credentials["username"],
                        credentials["password"],
@@ -168,7 +255,7 @@ class Test(EpollEventLoopTestCase):
                        host.targetDevice(),
                        "False",
                        "4"]
-        return ",".join(requestArgs)
+        return "soft", requestArgs
 
     def _generateTestedInstance(self):
         ReclaimHostSpoolerWithColdReclamation._handleColdReclamationRequest =  \
@@ -0,0 +1,75 @@
+import unittest
+from rackattack.common import reclamationexecutor
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tested = reclamationexecutor.ReclamationExecutor(nrWorkers=0, name="test")
+        self.ran = []
+
+    def job(self, name):
+        return lambda: self.ran.append(name)
+
+    def test_MoreUrgentJobsRunFirst(self):
+        self.tested.submit(key="host1", priority=1, callback=self.job("kexec1"))
+        self.tested.submit(key="host2", priority=0, callback=self.job("reboot2"))
+        self.tested.submit(key="host3", priority=1, callback=self.job("kexec3"))
+        self.tested.submit(key="host4", priority=0, callback=self.job("reboot4"))
+        for _ in xrange(4):
+            self.tested._runOne()
+        self.assertEquals(self.ran, ["reboot2", "reboot4", "kexec1", "kexec3"])
+
+    def test_QueuedDuplicatesAreCoalesced(self):
+        self.tested.submit(key="host1", priority=1, callback=self.job("first"))
+        self.tested.submit(key="host1", priority=1, callback=self.job("second"))
+        self.tested.submit(key="host2", priority=1, callback=self.job("other"))
+        self.assertEquals(self.tested.stats()['queued'], 2)
+        self.tested._runOne()
+        self.tested._runOne()
+        self.assertEquals(self.ran, ["second", "other"])
+        self.assertEquals(self.tested.stats()['coalesced'], 1)
+
+    def test_CoalescedJobKeepsTheMoreUrgentPriority(self):
+        self.tested.submit(key="host1", priority=1, callback=self.job("kexec1"))
+        self.tested.submit(key="host2", priority=1, callback=self.job("kexec2"))
+        self.tested.submit(key="host2", priority=0, callback=self.job("reboot2"))
+        self.tested.submit(key="host2", priority=1, callback=self.job("kexec2again"))
+        self.tested._runOne()
+        self.tested._runOne()
+        self.assertEquals(self.ran, ["kexec2again", "kexec1"])
+        self.assertEquals(self.tested.stats()['queued'], 0)
+
+    def test_JobForRunningHostIsHeldBackUntilItFinishes(self):
+        def first():
+            self.tested.submit(key="host1", priority=1, callback=self.job("second"))
+            self.tested.submit(key="host1", priority=1, callback=self.job("third"))
+            self.assertEquals(self.tested.stats()['queued'], 0)
+            self.assertEquals(self.tested.stats()['heldBack'], 1)
+            self.assertEquals(self.tested.stats()['inFlight'], 1)
+            self.ran.append("first")
+        self.tested.submit(key="host1", priority=1, callback=first)
+        self.tested._runOne()
+        self.assertEquals(self.tested.stats()['queued'], 1)
+        self.tested._runOne()
+        self.assertEquals(self.ran, ["first", "third"])
+        self.assertEquals(self.tested.stats()['inFlight'], 0)
+
+    def test_RaisingJobDoesNotStopTheExecutor(self):
+        def raises():
+            raise Exception("unable to connect")
+        self.tested.submit(key="host1", priority=1, callback=raises)
+        self.tested._runOne()
+        self.tested.submit(key="host1", priority=1, callback=self.job("retry"))
+        self.tested._runOne()
+        self.assertEquals(self.ran, ["retry"])
+
+    def test_PhaseLatencies(self):
+        self.tested.submit(key="host1", priority=1, callback=lambda: self.tested.recordPhase("kexec", 0.5))
+        self.tested._runOne()
+        phases = self.tested.stats()['phases']
+        self.assertEquals(set(phases.keys()), set(["queued", "total", "kexec"]))
+        self.assertEquals(phases['kexec']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import mock
+import random
+import unittest
+import threading
+from rackattack.common import reclamationserver
+from rackattack.common import reclamationprotocol
+from rackattack.common.tests.fakepipes import FakePipe
+
+
+def _randomField(generator):
+    return "".join(chr(generator.randint(0, 255)) for _ in xrange(generator.randint(0, 40)))
+
+
+def _randomRequests(generator, nrRequests):
+    return [("soft", [_randomField(generator) for _ in xrange(8)]) for _ in xrange(nrRequests)]
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.pipe = FakePipe()
+        self.pipe.open(os.O_RDONLY)
+        self.pipe.open(os.O_WRONLY)
+
+    def readInRandomChunks(self, generator, decoder):
+        decoded = []
+        while self.pipe.content:
+            decoded.extend(decoder.feed(self.pipe.read(generator.randint(1, 64))))
+        return decoded
+
+    def test_RoundTrip(self):
+        requests = [("soft", ["host1", "host1.example", "root", "pass,word", "00:11", "default", "False",
+                              "86400"]),
+                    ("cold", [])]
+        self.assertEquals(reclamationprotocol.Decoder().feed(reclamationprotocol.encodeMany(requests)),
+                          requests)
+
+    def test_RecordsSplitAcrossReadsAreReassembled(self):
+        generator = random.Random(0)
+        for _ in xrange(50):
+            requests = _randomRequests(generator, generator.randint(1, 20))
+            self.pipe.write(reclamationprotocol.encodeMany(requests))
+            decoder = reclamationprotocol.Decoder()
+            self.assertEquals(self.readInRandomChunks(generator, decoder), requests)
+            self.assertEquals(decoder.pending(), 0)
+
+    def test_PartialRecordIsKeptUntilComplete(self):
+        encoded = reclamationprotocol.encode("soft", ["host1"])
+        decoder = reclamationprotocol.Decoder()
+        self.assertEquals(decoder.feed(encoded[:-1]), [])
+        self.assertEquals(decoder.pending(), len(encoded) - 1)
+        self.assertEquals(decoder.feed(encoded[-1:]), [("soft", ["host1"])])
+
+    def test_UnknownVersionDropsTheBuffer(self):
+        encoded = reclamationprotocol.encode("soft", ["host1"])
+        decoder = reclamationprotocol.Decoder()
+        self.assertEquals(decoder.feed(encoded + chr(reclamationprotocol.VERSION + 1) + encoded), [
+            ("soft", ["host1"])])
+        self.assertEquals(decoder.pending(), 0)
+        self.assertEquals(decoder.nrInvalid(), 1)
+        self.assertEquals(decoder.feed(encoded), [("soft", ["host1"])])
+
+    def test_MalformedPayloadIsSkipped(self):
+        header = reclamationprotocol._HEADER.pack(reclamationprotocol.VERSION, 3)
+        encoded = reclamationprotocol.encode("soft", ["host1"])
+        decoder = reclamationprotocol.Decoder()
+        self.assertEquals(decoder.feed(header + "\x01\x00\x09" + encoded), [("soft", ["host1"])])
+        self.assertEquals(decoder.nrInvalid(), 1)
+
+    def test_OversizedRequestsAreRefused(self):
+        self.assertRaises(reclamationprotocol.InvalidRecord, reclamationprotocol.encode, "soft",
+                          ["x" * 70000])
+        self.assertRaises(reclamationprotocol.InvalidRecord, reclamationprotocol.encode, "soft",
+                          ["x" * 40000, "x" * 40000])
+        self.assertRaises(reclamationprotocol.InvalidRecord, reclamationprotocol.encode, "soft",
+                          ["x"] * 255)
+
+    def test_FuzzedStreamDoesNotCrash(self):
+        generator = random.Random(1)
+        for _ in xrange(200):
+            encoded = list(reclamationprotocol.encodeMany(_randomRequests(generator, 5)))
+            for _ in xrange(generator.randint(1, 5)):
+                encoded[generator.randrange(len(encoded))] = chr(generator.randint(0, 255))
+            self.pipe.write("".join(encoded))
+            for actionType, args in self.readInRandomChunks(generator, reclamationprotocol.Decoder()):
+                self.assertIsInstance(actionType, str)
+                self.assertIsInstance(args, list)
+
+    def test_ServerReadsRequestsSplitAcrossReads(self):
+        with mock.patch.object(threading.Thread, "start"):
+            server = reclamationserver.ReclamationServer(
+                "255.255.255.0", "1.1.1.1", "1.1.1.1", 1013, "1.1.1.1", "password", False,
+                "/fakeRequestsFifo", "/fakeFailureFifo")
+        server.registerAction("cold", mock.Mock())
+        server._requestsReadFd = self.pipe.readFd
+        encoded = reclamationprotocol.encodeMany([("cold", ["host1"]), ("unknown", []), ("cold", ["host2"])])
+        chunks = [encoded[:7], encoded[7:-3], encoded[-3:]]
+        with mock.patch.object(reclamationserver.os, "read", lambda fd, size: chunks.pop(0)):
+            self.assertEquals(server._readRequestsFromPipe(), [("cold", ["host1"])])
+            self.assertEquals(server._readRequestsFromPipe(), [("cold", ["host2"])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import mock
+import hashlib
+import tempfile
+import unittest
+from rackattack.common import softreclaim
+
+
+class FakeConnection:
+    def __init__(self, files):
+        self.files = files
+        self.uploads = []
+        self.scripts = []
+        self.ftp = mock.Mock()
+        self.ftp.getContents.side_effect = lambda path: "100.0 200.0"
+        self.ftp.putContents.side_effect = self.putContents
+        self.run = mock.Mock()
+        self.run.script.side_effect = self.script
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def putContents(self, path, contents):
+        self.uploads.append(path)
+        self.files[path] = contents
+
+    def script(self, script):
+        self.scripts.append(script)
+        if script.startswith("md5sum"):
+            paths = script.split()[1:]
+            if any(path not in self.files for path in paths):
+                raise Exception("md5sum: No such file or directory")
+            return "".join("%s  %s\n" % (hashlib.md5(self.files[path]).hexdigest(), path) for path in paths)
+        return ""
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.kernel = self.temporaryFile("kernel contents")
+        self.initrd = self.temporaryFile("initrd contents")
+        self.inauguratorFiles = softreclaim.InauguratorFiles(
+            kernelFilename=self.kernel, initrdFilename=self.initrd)
+        self.hostFiles = dict()
+        self.phases = []
+        self.connection = FakeConnection(self.hostFiles)
+        self.origConnection = softreclaim.connection.Connection
+        softreclaim.connection.Connection = lambda **kwargs: self.connection
+
+    def tearDown(self):
+        softreclaim.connection.Connection = self.origConnection
+        os.unlink(self.kernel)
+        os.unlink(self.initrd)
+
+    def temporaryFile(self, contents):
+        handle, filename = tempfile.mkstemp()
+        os.write(handle, contents)
+        os.close(handle)
+        return filename
+
+    def reclaim(self):
+        softreclaim.SoftReclaim(
+            hostID="host1", hostname="10.0.0.2", username="root", password="password",
+            macAddress="11:22:33:44:55:66", targetDevice="default", isInauguratorActive="False",
+            maxUptime="1000", inauguratorCommandLine=lambda *args, **kwargs: "commandLine",
+            softReclamationFailedMsgFifoWriteFd=None, inauguratorFiles=self.inauguratorFiles,
+            recordPhase=lambda phase, seconds: self.phases.append(phase)).run()
+
+    def test_FilesReadOnce(self):
+        self.assertEquals(self.inauguratorFiles.kernel, "kernel contents")
+        self.assertEquals(self.inauguratorFiles.initrd, "initrd contents")
+
+    def test_UploadedFromMemoryWhenMissing(self):
+        self.reclaim()
+        self.assertEquals(self.connection.uploads, ["/tmp/vmlinuz", "/tmp/initrd"])
+        self.assertEquals(self.hostFiles["/tmp/vmlinuz"], "kernel contents")
+        self.assertIn("kexec -e", self.connection.run.backgroundScript.call_args[0][0])
+        self.assertEquals(self.phases, ["sshConnect", "validateUptime", "checksumProbe", "upload", "kexec"])
+
+    def test_UploadSkippedWhenHostHasIdenticalFiles(self):
+        self.hostFiles["/tmp/vmlinuz"] = "kernel contents"
+        self.hostFiles["/tmp/initrd"] = "initrd contents"
+        self.reclaim()
+        self.assertEquals(self.connection.uploads, [])
+        self.assertTrue(self.connection.run.backgroundScript.called)
+
+    def test_StaleFilesAreReplaced(self):
+        self.hostFiles["/tmp/vmlinuz"] = "kernel contents"
+        self.hostFiles["/tmp/initrd"] = "previous initrd contents"
+        self.reclaim()
+        self.assertEquals(self.connection.uploads, ["/tmp/vmlinuz", "/tmp/initrd"])
+        self.assertEquals(self.hostFiles["/tmp/initrd"], "initrd contents")
+
+
+if __name__ == '__main__':
+    unittest.main()
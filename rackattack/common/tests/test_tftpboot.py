@@ -0,0 +1,75 @@
+import unittest
+import mock
+import rackattack
+from rackattack.common import tftpboot
+from rackattack.common.tests.mockfilesystem import enableMockedFilesystem, disableMockedFilesystem
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.fakeFilesystem = enableMockedFilesystem(rackattack.common.tftpboot)
+        for filename in ["menu.c32", "chain.c32", "pxelinux.0"]:
+            self.fakeFilesystem.CreateFile("/usr/share/syslinux/" + filename, create_missing_dirs=True)
+        self.fakeFilesystem.CreateFile(tftpboot.INAUGURATOR_KERNEL, create_missing_dirs=True)
+        self.fakeFilesystem.CreateFile(tftpboot.INAUGURATOR_INITRD, create_missing_dirs=True)
+        with mock.patch("atexit.register"):
+            self.tested = tftpboot.TFTPBoot(
+                netmask="255.255.255.0", inauguratorServerIP="10.0.0.1", inauguratorServerPort=1013,
+                inauguratorGatewayIP="10.0.0.1", osmosisServerIP="10.0.0.1", rootPassword="password",
+                withLocalObjectStore=False)
+        self.origOpen = tftpboot.open
+        self.writes = []
+
+        def countingOpen(filename, mode="r"):
+            if "w" in mode:
+                self.writes.append(filename)
+            return self.origOpen(filename, mode)
+        tftpboot.open = countingOpen
+
+    def tearDown(self):
+        disableMockedFilesystem(rackattack.common.tftpboot)
+
+    def contents(self, mac):
+        return self.fakeFilesystem.GetObject(
+            tftpboot.ROOT_PATH + "/pxelinux.cfg/01-" + mac.replace(":", "-")).contents
+
+    def test_InauguratorConfiguration(self):
+        self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2",
+                                            clearDisk=True, targetDevice="/dev/vda")
+        contents = self.contents("11:22:33:44:55:66")
+        self.assertIn("--inauguratorUseNICWithMAC=11:22:33:44:55:66", contents)
+        self.assertIn("--inauguratorMyIDForServer=rackattack-vm1", contents)
+        self.assertIn("--inauguratorClearDisk", contents)
+        self.assertIn("--inauguratorTargetDeviceCandidate=/dev/vda", contents)
+
+    def test_UnchangedConfigurationIsNotRewritten(self):
+        self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2")
+        self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2")
+        self.assertEquals(len(self.writes), 1)
+        self.tested.configureForLocalBoot("11:22:33:44:55:66")
+        self.assertIn("BootFromLocalDisk", self.contents("11:22:33:44:55:66"))
+        self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2")
+        self.assertEquals(len(self.writes), 3)
+        self.assertNotIn("--inauguratorClearDisk", self.contents("11:22:33:44:55:66"))
+
+    def test_RenderedConfigurationIsCached(self):
+        with mock.patch.object(self.tested, "_configurationForInaugurator",
+                               wraps=self.tested._configurationForInaugurator) as render:
+            self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2")
+            self.tested.configureForLocalBoot("11:22:33:44:55:66")
+            self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2")
+            self.assertEquals(render.call_count, 1)
+            self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2",
+                                                clearDisk=True)
+            self.assertEquals(render.call_count, 2)
+        self.assertIn("--inauguratorClearDisk", self.contents("11:22:33:44:55:66"))
+
+    def test_WrittenAtomically(self):
+        self.tested.configureForInaugurator("rackattack-vm1", "11:22:33:44:55:66", "10.0.0.2")
+        self.assertTrue(self.writes[0].endswith(".tmp"))
+        self.assertEquals(tftpboot.os.listdir(tftpboot.ROOT_PATH + "/pxelinux.cfg"),
+                          ["01-11-22-33-44-55-66"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import mock
+import unittest
+import threading
+from rackattack.common import timer
+from rackattack.common import globallock
+
+
+class Tag:
+    pass
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(threading.Thread, "start"):
+            self.tested = timer.TimersThread()
+        self.now = 1000
+        self.origTime = timer.time.time
+        timer.time.time = lambda: self.now
+        self.fired = []
+        globallock._lock.acquire()
+
+    def tearDown(self):
+        globallock._lock.release()
+        timer.time.time = self.origTime
+
+    def callback(self, name):
+        return lambda: self.fired.append(name)
+
+    def runAllExpired(self):
+        while self.tested._runOne():
+            pass
+
+    def test_TimersFireInOrder(self):
+        tag = Tag()
+        self.tested.scheduleIn(timeout=3, callback=self.callback("c"), tag=tag)
+        self.tested.scheduleIn(timeout=1, callback=self.callback("a"), tag=tag)
+        self.tested.scheduleIn(timeout=2, callback=self.callback("b"), tag=tag)
+        self.assertEquals(self.tested._nextTimeout(), 1)
+        self.now += 2
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["a", "b"])
+        self.assertEquals(self.tested._nextTimeout(), 1)
+        self.now += 1
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["a", "b", "c"])
+        self.assertIsNone(self.tested._nextTimeout())
+        self.assertEquals(self.tested.nrTimers(), 0)
+
+    def test_TimersWithSameDeadlineFireInSchedulingOrder(self):
+        for name in ["a", "b", "c"]:
+            self.tested.scheduleAt(when=self.now, callback=self.callback(name), tag=Tag())
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["a", "b", "c"])
+
+    def test_CancelAllByTag(self):
+        tag1 = Tag()
+        tag2 = Tag()
+        self.tested.scheduleIn(timeout=1, callback=self.callback("a"), tag=tag1)
+        self.tested.scheduleIn(timeout=2, callback=self.callback("b"), tag=tag2)
+        self.tested.scheduleIn(timeout=3, callback=self.callback("c"), tag=tag1)
+        self.tested.cancelAllByTag(tag=tag1)
+        self.assertEquals(self.tested.nrTimers(), 1)
+        self.assertEquals(self.tested._nextTimeout(), 2)
+        self.now += 10
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["b"])
+        self.assertEquals(self.tested.nrTimers(), 0)
+
+    def test_CancelUnknownTag(self):
+        self.tested.cancelAllByTag(tag=Tag())
+        self.assertIsNone(self.tested._nextTimeout())
+
+    def test_RescheduleAfterFiring(self):
+        tag = Tag()
+        self.tested.scheduleIn(timeout=1, callback=self.callback("a"), tag=tag)
+        self.now += 1
+        self.runAllExpired()
+        self.tested.cancelAllByTag(tag=tag)
+        self.tested.scheduleIn(timeout=1, callback=self.callback("b"), tag=tag)
+        self.now += 1
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["a", "b"])
+
+    def test_CancelledTimersAreCompacted(self):
+        tags = [Tag() for _ in xrange(1000)]
+        for tag in tags:
+            self.tested.scheduleIn(timeout=1, callback=self.callback("cancelled"), tag=tag)
+        for tag in tags[1:]:
+            self.tested.cancelAllByTag(tag=tag)
+        self.assertLess(len(self.tested._heap), 2 * self.tested._MINIMUM_HEAP_SIZE_FOR_COMPACTION)
+        self.assertEquals(self.tested.nrTimers(), 1)
+        self.now += 1
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["cancelled"])
+
+    def test_RaisingCallbackDoesNotStopTimers(self):
+        def raises():
+            raise Exception("ignore me")
+        self.tested.scheduleIn(timeout=1, callback=raises, tag=Tag())
+        self.tested.scheduleIn(timeout=1, callback=self.callback("a"), tag=Tag())
+        self.now += 1
+        self.runAllExpired()
+        self.assertEquals(self.fired, ["a"])
+
+    def test_ExpiredTimersFireInBatchesLimitedInSize(self):
+        with mock.patch.object(threading.Thread, "start"):
+            self.tested = timer.TimersThread(maxTimersPerBatch=3)
+        for i in xrange(5):
+            self.tested.scheduleIn(timeout=i, callback=self.callback(i), tag=Tag())
+        self.tested.scheduleIn(timeout=100, callback=self.callback("later"), tag=Tag())
+        self.now += 10
+        self.tested._runExpired()
+        self.assertEquals(self.fired, [0, 1, 2])
+        self.assertEquals(self.tested._nextTimeout(), 0)
+        self.tested._runExpired()
+        self.assertEquals(self.fired, [0, 1, 2, 3, 4])
+        self.assertEquals(self.tested._nextTimeout(), 90)
+        self.tested._runExpired()
+        self.assertEquals(self.fired, [0, 1, 2, 3, 4])
+
+    def test_Stats(self):
+        self.tested.scheduleIn(timeout=1, callback=self.callback("late"), tag=Tag())
+        self.tested.scheduleIn(timeout=5, callback=self.callback("onTime"), tag=Tag())
+        self.tested.scheduleIn(timeout=100, callback=self.callback("pending"), tag=Tag())
+        self.now += 5
+        self.tested._runExpired()
+        stats = self.tested.stats()
+        self.assertEquals(stats['fired'], 2)
+        self.assertEquals(stats['late'], 1)
+        self.assertEquals(stats['pending'], 1)
+        self.assertEquals(stats['batchLatency']['count'], 1)
+
+    def test_LateThreshold(self):
+        with mock.patch.object(threading.Thread, "start"):
+            self.tested = timer.TimersThread(lateThreshold=10)
+        self.tested.scheduleIn(timeout=1, callback=self.callback("late"), tag=Tag())
+        self.now += 5
+        self.tested._runExpired()
+        self.assertEquals(self.tested.stats()['late'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,8 @@ class TFTPBoot:
             shutil.rmtree(self._root)
         os.makedirs(self._root)
         self._rootPassword = rootPassword
+        self._renderedForInaugurator = dict()
+        self._written = dict()
         atexit.register(self._cleanup)
         self._pxelinuxConfigDir = os.path.join(self._root, "pxelinux.cfg")
         self._installPXELinux()
@@ -58,20 +60,29 @@ class TFTPBoot:
         if clearDisk:
             logging.info("Configuring %(id)s host %(ipAddress)s inaugurator to clearDisk", dict(
                 id=id, ipAddress=ip))
-        self._writeConfiguration(mac, self._configurationForInaugurator(id,
-                                                                        mac,
-                                                                        ip,
-                                                                        clearDisk=clearDisk,
-                                                                        targetDevice=targetDevice))
+        key = (id, mac, ip, clearDisk, targetDevice)
+        contents = self._renderedForInaugurator.get(key)
+        if contents is None:
+            contents = self._configurationForInaugurator(
+                id, mac, ip, clearDisk=clearDisk, targetDevice=targetDevice)
+            self._renderedForInaugurator[key] = contents
+        self._writeConfiguration(mac, contents)
 
     def configureForLocalBoot(self, mac):
         self._writeConfiguration(mac, _CONFIGURATION_FOR_LOCAL_BOOT)
 
     def _writeConfiguration(self, mac, contents):
+        # Only this instance writes to the configuration directory, so the last contents written to each
+        # file are what is on disk. A file is replaced by a rename, so TFTP never serves a partial one.
         basename = '01-' + mac.replace(':', '-')
         path = os.path.join(self._pxelinuxConfigDir, basename)
-        with open(path, "w") as f:
+        if self._written.get(path) == contents:
+            return
+        temporary = os.path.join(self._pxelinuxConfigDir, "." + basename + ".tmp")
+        with open(temporary, "w") as f:
             f.write(contents)
+        os.rename(temporary, path)
+        self._written[path] = contents
 
     def _configurationForInaugurator(self, id, mac, ip, clearDisk, targetDevice=None):
         return _INAUGURATOR_TEMPLATE % dict(
@@ -1,7 +1,10 @@
 import threading
 import collections
+import heapq
+import itertools
 import time
 from rackattack.common import globallock
+from rackattack.common import statistics
 from rackattack.tcp import suicide
 import logging
 
@@ -19,13 +22,28 @@ def cancelAllByTag(**kwargs):
 
 
 _Timer = collections.namedtuple('_Timer', ['when', 'callback', 'tag'])
+_CANCELLED = None
 
 
 class TimersThread(threading.Thread):
     it = None
-
-    def __init__(self):
-        self._timers = []
+    _MINIMUM_HEAP_SIZE_FOR_COMPACTION = 64
+
+    # Expired timers are fired in batches under a single global lock acquisition. maxTimersPerBatch
+    # bounds the time the lock is held; the remaining expired timers are fired after the lock is
+    # released once. Timers fired more than lateThreshold seconds after they were due count as late.
+    def __init__(self, maxTimersPerBatch=100, lateThreshold=1):
+        self._maxTimersPerBatch = maxTimersPerBatch
+        self._lateThreshold = lateThreshold
+        # Heap entries are [when, sequence, timer]. Cancelled entries are left in the heap with their
+        # timer replaced by _CANCELLED, and are skipped when popped (or dropped on compaction).
+        self._heap = []
+        self._byTag = dict()
+        self._sequence = itertools.count()
+        self._nrCancelled = 0
+        self._nrFired = 0
+        self._nrLate = 0
+        self._batchLatency = statistics.Latency()
         self._event = threading.Event()
         TimersThread.it = self
         threading.Thread.__init__(self)
@@ -37,15 +55,32 @@ class TimersThread(threading.Thread):
 
     def scheduleAt(self, when, callback, tag):
         assert globallock.assertLocked()
-        self._timers.append(_Timer(when=when, callback=callback, tag=tag))
-        self._timers.sort(key=lambda x: x.when)
-        self._event.set()
+        entry = [when, next(self._sequence), _Timer(when=when, callback=callback, tag=tag)]
+        heapq.heappush(self._heap, entry)
+        self._byTag.setdefault(tag, []).append(entry)
+        if self._heap[0] is entry:
+            self._event.set()
 
     def cancelAllByTag(self, tag):
         assert globallock.assertLocked()
-        self._timers = [t for t in self._timers if t.tag is not tag]
+        entries = self._byTag.pop(tag, None)
+        if entries is None:
+            return
+        for entry in entries:
+            entry[-1] = _CANCELLED
+        self._nrCancelled += len(entries)
+        self._compactIfNeeded()
         self._event.set()
 
+    def nrTimers(self):
+        assert globallock.assertLocked()
+        return len(self._heap) - self._nrCancelled
+
+    def stats(self):
+        assert globallock.assertLocked()
+        return dict(pending=self.nrTimers(), fired=self._nrFired, late=self._nrLate,
+                    batchLatency=self._batchLatency.report())
+
     def run(self):
         try:
             timeout = None
@@ -53,7 +88,7 @@ class TimersThread(threading.Thread):
                 self._event.wait(timeout=timeout)
                 self._event.clear()
                 with globallock.lock():
-                    self._runOne()
+                    self._runExpired()
                     timeout = self._nextTimeout()
         except:
             logging.exception("Timers thread died")
@@ -62,21 +97,58 @@ class TimersThread(threading.Thread):
 
     def _nextTimeout(self):
         assert globallock.assertLocked()
-        if len(self._timers) == 0:
+        self._discardCancelledHead()
+        if len(self._heap) == 0:
             return None
-        timeout = self._timers[0].when - time.time()
+        timeout = self._heap[0][0] - time.time()
         if timeout < 0:
             timeout = 0
         return timeout
 
+    def _runExpired(self):
+        before = time.time()
+        nrFired = 0
+        while nrFired < self._maxTimersPerBatch and self._runOne():
+            nrFired += 1
+        if nrFired > 0:
+            self._batchLatency.record(time.time() - before)
+
     def _runOne(self):
         assert globallock.assertLocked()
-        if len(self._timers) == 0:
-            return
-        if self._timers[0].when > time.time():
-            return
-        timer = self._timers.pop(0)
+        self._discardCancelledHead()
+        if len(self._heap) == 0:
+            return False
+        now = time.time()
+        if self._heap[0][0] > now:
+            return False
+        entry = heapq.heappop(self._heap)
+        timer = entry[-1]
+        self._forgetTagged(entry, timer.tag)
+        self._nrFired += 1
+        if now - timer.when > self._lateThreshold:
+            self._nrLate += 1
         try:
             timer.callback()
         except:
             logging.exception("Timer '%(callback)s' raised", dict(callback=timer.callback))
+        return True
+
+    def _forgetTagged(self, entry, tag):
+        entries = self._byTag[tag]
+        entries.remove(entry)
+        if not entries:
+            del self._byTag[tag]
+
+    def _discardCancelledHead(self):
+        while self._heap and self._heap[0][-1] is _CANCELLED:
+            heapq.heappop(self._heap)
+            self._nrCancelled -= 1
+
+    def _compactIfNeeded(self):
+        if len(self._heap) < self._MINIMUM_HEAP_SIZE_FOR_COMPACTION:
+            return
+        if self._nrCancelled * 2 < len(self._heap):
+            return
+        self._heap = [entry for entry in self._heap if entry[-1] is not _CANCELLED]
+        heapq.heapify(self._heap)
+        self._nrCancelled = 0
@@ -0,0 +1,23 @@
+import Queue
+import logging
+import threading
+
+
+class WorkerPool:
+    def __init__(self, nrWorkers, name):
+        self._queue = Queue.Queue()
+        for workerIndex in xrange(nrWorkers):
+            worker = threading.Thread(target=self._work, name="%s-%d" % (name, workerIndex))
+            worker.daemon = True
+            worker.start()
+
+    def enqueue(self, job):
+        self._queue.put(job)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job()
+            except:
+                logging.exception("Job '%(job)s' raised", dict(job=job))
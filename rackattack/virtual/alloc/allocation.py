@@ -1,7 +1,9 @@
 from rackattack.virtual.kvm import config
-from rackattack.common import timer
 from rackattack.virtual.kvm import vm
+from rackattack.virtual.kvm import network
+from rackattack.virtual.kvm import domainprofiles
 from rackattack.common import globallock
+import functools
 import time
 import logging
 import tempfile
@@ -11,7 +13,8 @@ class Allocation:
     _LIMBO_AFTER_DEATH_DURATION = 60
     _HEARTBEAT_TIMEOUT = 15
 
-    def __init__(self, index, requirements, dnsmasq, broadcaster, buildImageThread, imageStore, allVMs):
+    def __init__(self, index, requirements, dnsmasq, broadcaster, buildImageThread, imageStore, allVMs,
+                 heartbeatMonitor, deathCallback, vmIndices, vmCreationPool, warmPool):
         self._index = index
         self._requirements = requirements
         self._dnsmasq = dnsmasq
@@ -19,13 +22,27 @@ class Allocation:
         self._buildImageThread = buildImageThread
         self._imageStore = imageStore
         self._allVMs = allVMs
+        self._heartbeatMonitor = heartbeatMonitor
+        self._deathCallback = deathCallback
+        self._vmIndices = vmIndices
+        self._vmCreationPool = vmCreationPool
+        self._warmPool = warmPool
         self._vms = None
+        self._createdVMs = dict()
+        self._imagesBeingBuilt = set()
         self._death = None
         if len(self._requirements) > config.MAXIMUM_VMS:
             self._die(
                 "Configured to disallow such a large allocation. Maximum is %d" % config.MAXIMUM_VMS)
             return
-        self.heartbeat()
+        for requirement in self._requirements.values():
+            try:
+                domainprofiles.fromRequirement(requirement)
+            except ValueError as e:
+                self._die(str(e))
+                return
+        self._heartbeatMonitor.register(
+            self._index, timeout=self._HEARTBEAT_TIMEOUT, timeoutCallback=self._heartbeatTimeout)
         logging.info("allocation created. requirements:\n%(requirements)s", dict(requirements=requirements))
         self._waitingForImages = 0
         self._enqueueBuildImages()
@@ -45,12 +62,6 @@ class Allocation:
     def free(self):
         self._die("freed")
 
-    def heartbeat(self):
-        if self.dead():
-            return
-        timer.cancelAllByTag(tag=self)
-        timer.scheduleIn(timeout=self._HEARTBEAT_TIMEOUT, callback=self._heartbeatTimeout, tag=self)
-
     def dead(self):
         assert self._death is None or self._vms is None
         if self._death is None:
@@ -75,19 +86,26 @@ class Allocation:
         return filename
 
     def _heartbeatTimeout(self):
+        if self.dead():
+            return
         self._die("heartbeat timeout")
 
     def _die(self, reason):
         assert not self.dead()
         logging.info("Allocation dies of '%(reason)s'", dict(reason=reason))
-        if self._vms is not None:
-            for name, vmInstance in self._vms.iteritems():
-                if vmInstance.index() in self._allVMs:
-                    del self._allVMs[vmInstance.index()]
-                vmInstance.destroy()
-            self._vms = None
+        for name, vmInstance in self._createdVMs.iteritems():
+            if vmInstance.index() in self._allVMs:
+                del self._allVMs[vmInstance.index()]
+            vmInstance.destroy()
+        self._createdVMs = dict()
+        self._vms = None
+        for imageLabel, sizeGB in self._imagesBeingBuilt:
+            self._buildImageThread.detach(
+                label=imageLabel, sizeGB=sizeGB, callback=self._buildImageThreadCallback)
+        self._imagesBeingBuilt = set()
         self._death = dict(when=time.time(), reason=reason)
-        timer.cancelAllByTag(tag=self)
+        self._heartbeatMonitor.unregister(self._index)
+        self._deathCallback(self)
         self._broadcaster.allocationDied(self._index, reason=reason)
 
     def _enqueueBuildImages(self):
@@ -95,15 +113,13 @@ class Allocation:
         for requirement in self._requirements.values():
             imageLabel = requirement['imageLabel']
             sizeGB = requirement['hardwareConstraints']['minimumDisk1SizeGB']
-            try:
-                self._imageStore.get(imageLabel, sizeGB)
+            if self._imageStore.contains(imageLabel, sizeGB):
                 logging.info('Image already exists in image store: %(label)s %(sizeGB)sGB', dict(
                     label=imageLabel, sizeGB=sizeGB))
-            except Exception as e:
+            else:
                 logging.info(
-                    "Image '%(image)s'/%(sizeGB)sGB does not exist in image store, "
-                    "will build (error: %(error)s)", dict(
-                        error=str(e), image=imageLabel, sizeGB=sizeGB))
+                    "Image '%(image)s'/%(sizeGB)sGB does not exist in image store, will build", dict(
+                        image=imageLabel, sizeGB=sizeGB))
                 toEnqeue.add((imageLabel, sizeGB))
         for imageLabel, sizeGB in toEnqeue:
             self._broadcaster.allocationProviderMessage(
@@ -111,6 +127,7 @@ class Allocation:
                 "minutes per label and is requires once for each new label" % imageLabel)
             self._buildImageThread.enqueue(
                 label=imageLabel, sizeGB=sizeGB, callback=self._buildImageThreadCallback)
+            self._imagesBeingBuilt.add((imageLabel, sizeGB))
             self._waitingForImages += 1
 
     def _buildImageThreadCallback(self, complete, message):
@@ -134,18 +151,44 @@ class Allocation:
             self._die("unable to build image")
 
     def _createVMs(self):
-        self._vms = dict()
         for name, requirement in self._requirements.iteritems():
-            instance = vm.VM.createFromImageStore(
-                index=self._availableIndex(), requirement=requirement, imageStore=self._imageStore)
-            self._dnsmasq.addIfNotAlready(instance.primaryMACAddress(), instance.ipAddress())
-            self._vms[name] = instance
+            instance = self._warmPool.take(requirement)
+            if instance is None:
+                reference = self._imageStore.get(
+                    sizeGB=requirement['hardwareConstraints']['minimumDisk1SizeGB'],
+                    imageLabel=requirement['imageLabel'])
+                index = self._vmIndices.reserve()
+                create = functools.partial(
+                    vm.VM.createFromFrozenImage, index=index, requirement=requirement, reference=reference)
+            else:
+                index = instance.index()
+                create = functools.partial(vm.VM.startDefined, instance)
+            self._dnsmasq.addIfNotAlready(
+                network.primaryMACAddressFromVMIndex(index), network.ipAddressFromVMIndex(index))
+            self._vmCreationPool.enqueue(functools.partial(
+                self._createVM, name=name, index=index, create=create))
+        self._warmPool.refill()
+
+    def _createVM(self, name, index, create):
+        try:
+            instance = create()
+        except Exception as e:
+            logging.exception("Unable to create VM %(index)s for allocation %(allocation)s", dict(
+                index=index, allocation=self._index))
+            with globallock.lock():
+                self._vmIndices.release(index)
+                if not self.dead():
+                    self._die("unable to create VM: %s" % str(e))
+            return
+        with globallock.lock():
+            self._vmIndices.release(index)
+            if self.dead():
+                logging.info("VM %(index)s was created for an allocation that has already died", dict(
+                    index=index))
+                instance.destroy()
+                return
+            self._createdVMs[name] = instance
             self._allVMs[instance.index()] = instance
-        self._broadcaster.allocationDone(self._index)
-
-    def _availableIndex(self):
-        indices = set(xrange(1, len(self._allVMs) + 2))
-        for index, vmInstance in self._allVMs.iteritems():
-            assert vmInstance.index() == index
-            indices.discard(vmInstance.index())
-        return min(indices)
+            if len(self._createdVMs) == len(self._requirements):
+                self._vms = self._createdVMs
+                self._broadcaster.allocationDone(self._index)
@@ -1,15 +1,22 @@
+import collections
 from rackattack.virtual.alloc import allocation
 from rackattack.common import globallock
 
 
 class Allocations:
-    def __init__(self, dnsmasq, broadcaster, buildImageThread, imageStore, allVMs):
+    def __init__(self, dnsmasq, broadcaster, buildImageThread, imageStore, allVMs, heartbeatMonitor,
+                 vmIndices, vmCreationPool, warmPool):
         self._dnsmasq = dnsmasq
         self._broadcaster = broadcaster
         self._buildImageThread = buildImageThread
         self._imageStore = imageStore
         self._allVMs = allVMs
-        self._allocations = []
+        self._heartbeatMonitor = heartbeatMonitor
+        self._vmIndices = vmIndices
+        self._vmCreationPool = vmCreationPool
+        self._warmPool = warmPool
+        self._allocations = collections.OrderedDict()
+        self._deaths = collections.deque()
         self._index = 1
 
     def create(self, requirements):
@@ -18,23 +25,29 @@ class Allocations:
         alloc = allocation.Allocation(
             index=self._index, requirements=requirements, dnsmasq=self._dnsmasq,
             broadcaster=self._broadcaster, buildImageThread=self._buildImageThread,
-            imageStore=self._imageStore, allVMs=self._allVMs)
-        self._allocations.append(alloc)
+            imageStore=self._imageStore, allVMs=self._allVMs, heartbeatMonitor=self._heartbeatMonitor,
+            deathCallback=self._deaths.append, vmIndices=self._vmIndices,
+            vmCreationPool=self._vmCreationPool, warmPool=self._warmPool)
+        self._allocations[alloc.index()] = alloc
         self._index += 1
         return alloc
 
     def byIndex(self, index):
         assert globallock.assertLocked()
-        self._cleanup()
-        for alloc in self._allocations:
-            if alloc.index() == index:
-                return alloc
-        raise IndexError("No such allocation")
+        # Does not evict, as it is also called by read only commands, under the shared global lock
+        alloc = self._allocations.get(index)
+        if alloc is None or alloc.deadForAWhile():
+            raise IndexError("No such allocation")
+        return alloc
 
     def all(self):
         assert globallock.assertLocked()
         self._cleanup()
-        return self._allocations
+        return self._allocations.values()
 
     def _cleanup(self):
-        self._allocations = [a for a in self._allocations if not a.deadForAWhile()]
+        # Allocations are appended to _deaths as they die, so it is ordered by time of death, and only
+        # its head needs to be examined.
+        while self._deaths and self._deaths[0].deadForAWhile():
+            alloc = self._deaths.popleft()
+            del self._allocations[alloc.index()]
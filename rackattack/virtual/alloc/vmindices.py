@@ -0,0 +1,23 @@
+from rackattack.common import globallock
+from rackattack.virtual.kvm import reaper
+
+
+class VMIndices:
+    def __init__(self, allVMs, excluded=()):
+        self._allVMs = allVMs
+        self._reserved = set()
+        self._excluded = set(excluded)
+
+    def reserve(self):
+        assert globallock.assertLocked()
+        reaping = reaper.it().reaping()
+        index = 1
+        while index in self._allVMs or index in self._reserved or index in self._excluded or \
+                index in reaping:
+            index += 1
+        self._reserved.add(index)
+        return index
+
+    def release(self, index):
+        assert globallock.assertLocked()
+        self._reserved.remove(index)
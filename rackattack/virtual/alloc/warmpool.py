@@ -0,0 +1,134 @@
+import collections
+import functools
+import logging
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import vm
+from rackattack.virtual.kvm import domainprofiles
+from rackattack.common import globallock
+
+
+def vmClass(requirement):
+    hardwareConstraints = requirement['hardwareConstraints']
+    return (requirement['imageLabel'], hardwareConstraints['minimumDisk1SizeGB'],
+            hardwareConstraints['minimumDisk2SizeGB'], hardwareConstraints['minimumRAMGB'],
+            hardwareConstraints['minimumCPUs'], domainprofiles.fromRequirement(requirement).name)
+
+
+class WarmPool:
+    # Keeps defined but not started VMs, with their overlay disks already derived, for the most demanded
+    # VM classes among the last DEMAND_WINDOW requested VMs. A warm VM keeps its index reserved in
+    # vmIndices, and the reservation is handed over together with the VM. Refilling neither marks images as
+    # used nor references them, so warm VMs do not keep images from being evicted. A warm VM takes its image
+    # reference when handed over, and is discarded instead if its image was evicted or rebuilt meanwhile.
+    # take() never refills by itself: the allocation calls refill() once its own VM creation jobs are
+    # enqueued, so that a cold allocation does not wait behind refills in the shared VM creation pool.
+    DEMAND_WINDOW = 100
+
+    def __init__(self, imageStore, vmIndices, vmCreationPool):
+        self._imageStore = imageStore
+        self._vmIndices = vmIndices
+        self._vmCreationPool = vmCreationPool
+        self._warm = dict()
+        self._pending = collections.Counter()
+        self._recentDemand = collections.deque()
+        self._demand = collections.Counter()
+        self._requirements = dict()
+        self._hits = 0
+        self._misses = 0
+
+    def take(self, requirement):
+        assert globallock.assertLocked()
+        key = vmClass(requirement)
+        self._recordDemand(key, requirement)
+        instance = self._takeWarm(key, requirement)
+        if instance is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return instance
+
+    def refill(self):
+        assert globallock.assertLocked()
+        hotClasses = self._hotClasses()
+        for key in [key for key in self._warm if key not in hotClasses]:
+            for instance, frozenImage, generation in self._warm.pop(key):
+                self._discard(instance)
+        for key in hotClasses:
+            missing = config.WARM_POOL_VMS_PER_CLASS - len(self._warm.get(key, ())) - self._pending[key]
+            if missing <= 0:
+                continue
+            requirement = self._requirements[key]
+            imageLabel, sizeGB = self._image(requirement)
+            image = self._imageStore.peek(imageLabel=imageLabel, sizeGB=sizeGB)
+            if image is None:
+                continue
+            frozenImage, generation = image
+            for _ in xrange(missing):
+                self._pending[key] += 1
+                self._vmCreationPool.enqueue(functools.partial(
+                    self._define, key=key, index=self._vmIndices.reserve(), requirement=requirement,
+                    frozenImage=frozenImage, generation=generation))
+
+    def stats(self):
+        assert globallock.assertLocked()
+        total = self._hits + self._misses
+        classes = dict(("%s/%dGB/%dGB/%sGB/%dCPUs/%s" % key, dict(
+            warm=len(self._warm.get(key, ())), pending=self._pending[key], demand=self._demand[key]))
+            for key in set(self._warm) | set(self._demand))
+        return dict(hits=self._hits, misses=self._misses,
+                    hitRate=float(self._hits) / total if total else 0.0, classes=classes)
+
+    def _takeWarm(self, key, requirement):
+        warm = self._warm.get(key)
+        while warm:
+            instance, frozenImage, generation = warm.popleft()
+            imageLabel, sizeGB = self._image(requirement)
+            if self._imageStore.peek(imageLabel=imageLabel, sizeGB=sizeGB) != (frozenImage, generation):
+                logging.info("The image of warm VM %(index)s is gone", dict(index=instance.index()))
+                self._discard(instance)
+                continue
+            instance.adoptBackingFile(self._imageStore.get(imageLabel=imageLabel, sizeGB=sizeGB))
+            return instance
+        return None
+
+    def _image(self, requirement):
+        return requirement['imageLabel'], requirement['hardwareConstraints']['minimumDisk1SizeGB']
+
+    def _recordDemand(self, key, requirement):
+        self._requirements[key] = requirement
+        self._recentDemand.append(key)
+        self._demand[key] += 1
+        if len(self._recentDemand) > self.DEMAND_WINDOW:
+            forgotten = self._recentDemand.popleft()
+            self._demand[forgotten] -= 1
+            if self._demand[forgotten] == 0:
+                del self._demand[forgotten]
+                del self._requirements[forgotten]
+
+    def _hotClasses(self):
+        return set(key for key, count in self._demand.most_common(config.WARM_POOL_CLASSES))
+
+    def _define(self, key, index, requirement, frozenImage, generation):
+        try:
+            instance = vm.VM.defineFromFrozenImage(
+                index=index, requirement=requirement, frozenImage=frozenImage)
+        except:
+            logging.exception("Unable to define a warm VM %(index)s", dict(index=index))
+            with globallock.lock():
+                self._pending[key] -= 1
+                self._vmIndices.release(index)
+            return
+        with globallock.lock():
+            self._pending[key] -= 1
+            if key in self._hotClasses():
+                self._warm.setdefault(key, collections.deque()).append((instance, frozenImage, generation))
+            else:
+                self._discard(instance)
+
+    def _discard(self, instance):
+        logging.info("Discarding warm VM %(index)s", dict(index=instance.index()))
+        self._vmIndices.release(instance.index())
+        try:
+            instance.destroy()
+        except:
+            logging.exception("Unable to destroy warm VM %(index)s", dict(index=instance.index()))
@@ -7,29 +7,91 @@ from rackattack.tcp import suicide
 from rackattack import api
 from rackattack.virtual.kvm import config
 from rackattack.virtual.kvm import vm
+from rackattack.virtual.kvm import reaper
 from rackattack.common import hoststatemachine
 
 
+class _BuildJob:
+    def __init__(self, label, sizeGB, callback):
+        self.label = label
+        self.sizeGB = sizeGB
+        self.callbacks = [callback]
+        self.lastMessage = None
+        self.cancelled = False
+        self.cancelCallback = None
+
+    def report(self, complete, message):
+        assert globallock.assertLocked()
+        if complete is None:
+            self.lastMessage = message
+        for callback in list(self.callbacks):
+            try:
+                callback(complete, message)
+            except:
+                logging.exception("Build image callback raised (label %(label)s)", dict(label=self.label))
+
+    def cancel(self):
+        assert globallock.assertLocked()
+        self.cancelled = True
+        if self.cancelCallback is not None:
+            self.cancelCallback()
+
+
 class BuildImageThread(threading.Thread):
+    # This thread localizes labels one after the other, and hands them over to IMAGE_BUILDERS builder
+    # threads, each with its own VM index, which build the images using inaugurator. Localizing the
+    # next label overlaps with building the images of the previous ones. Requests for a (label, size)
+    # already being built are attached to the existing job, and the job is cancelled once all of its
+    # requesters detached.
     def __init__(self, inaugurate, tftpboot, dnsmasq, imageStore, reclaimHost):
         self._inaugurate = inaugurate
         self._tftpboot = tftpboot
         self._dnsmasq = dnsmasq
         self._imageStore = imageStore
-        self._reclaimhost = reclaimHost
-        self._busy = True
-        self._queue = Queue.Queue()
-        self._event = threading.Event()
+        self._reclaimHost = reclaimHost
+        self._jobs = dict()
+        self._localizeQueue = Queue.Queue()
+        self._buildQueue = Queue.Queue()
+        self._builders = [_Builder(
+            index=config.IMAGE_BUILDING_VM_INDEX + i, buildQueue=self._buildQueue,
+            finishedCallback=self._jobFinished, inaugurate=inaugurate, tftpboot=tftpboot,
+            dnsmasq=dnsmasq, imageStore=imageStore, reclaimHost=reclaimHost)
+            for i in xrange(config.IMAGE_BUILDERS)]
         threading.Thread.__init__(self)
         self.daemon = True
-        self._reclaimHost = reclaimHost
         threading.Thread.start(self)
 
+    def vmIndices(self):
+        return [builder.index() for builder in self._builders]
+
     def enqueue(self, label, sizeGB, callback):
         assert globallock.assertLocked()
-        if self._busy:
+        job = self._jobs.get((label, sizeGB))
+        if job is not None:
+            job.callbacks.append(callback)
+            if job.lastMessage is None:
+                callback(None, "Image of label %s is already being built, waiting for it" % label)
+            else:
+                callback(None, job.lastMessage)
+            return
+        if len(self._jobs) >= len(self._builders):
             callback(None, "Image builder still busy with previous tasks, waiting in queue")
-        self._queue.put((label, sizeGB, callback))
+        job = _BuildJob(label=label, sizeGB=sizeGB, callback=callback)
+        self._jobs[(label, sizeGB)] = job
+        self._localizeQueue.put(job)
+
+    def detach(self, label, sizeGB, callback):
+        assert globallock.assertLocked()
+        job = self._jobs.get((label, sizeGB))
+        if job is None or callback not in job.callbacks:
+            return
+        job.callbacks.remove(callback)
+        if job.callbacks:
+            return
+        logging.info("Nobody waits for the image of label '%(label)s' anymore, cancelling its build", dict(
+            label=label))
+        del self._jobs[(label, sizeGB)]
+        job.cancel()
 
     def run(self):
         try:
@@ -40,38 +102,109 @@ class BuildImageThread(threading.Thread):
             suicide.killSelf()
 
     def _work(self):
-        self._busy = False
-        label, sizeGB, callback = self._queue.get()
-        self._busy = True
+        job = self._localizeQueue.get()
         with globallock.lock():
-            callback(None, "Localizing label %s" % label)
-        logging.info("Localizing label '%(label)s'", dict(label=label))
+            if job.cancelled:
+                return
+            job.report(None, "Localizing label %s" % job.label)
+        logging.info("Localizing label '%(label)s'", dict(label=job.label))
         try:
-            sh.run(["solvent", "localize", "--label", label])
+            sh.run(["solvent", "localize", "--label", job.label])
         except Exception as e:
-            logging.exception("Unable to localize label '%(label)s'", dict(label=label))
+            logging.exception("Unable to localize label '%(label)s'", dict(label=job.label))
             with globallock.lock():
-                callback(False, "Unable to localize label '%s': '%s'" % (label, str(e)))
+                self._jobFinished(job, False, "Unable to localize label '%s': '%s'" % (job.label, str(e)))
             return
         with globallock.lock():
-            callback(None, "Done localizing label %s, Building image using inaugurator" % label)
+            if job.cancelled:
+                logging.info("Build of label '%(label)s' was cancelled while localizing", dict(
+                    label=job.label))
+                return
+            job.report(None, "Done localizing label %s, Building image using inaugurator" % job.label)
         logging.info("Done localizing label '%(label)s', building image using inaugurator", dict(
-            label=label))
-        vmInstance, stateMachine = self._startInauguratorVM(label, sizeGB)
+            label=job.label))
+        self._buildQueue.put(job)
+
+    def _jobFinished(self, job, complete, message):
+        assert globallock.assertLocked()
+        if self._jobs.get((job.label, job.sizeGB)) is job:
+            del self._jobs[(job.label, job.sizeGB)]
+        job.report(complete, message)
+
+
+class _Builder(threading.Thread):
+    def __init__(self, index, buildQueue, finishedCallback, inaugurate, tftpboot, dnsmasq, imageStore,
+                 reclaimHost):
+        self._index = index
+        self._buildQueue = buildQueue
+        self._finishedCallback = finishedCallback
+        self._inaugurate = inaugurate
+        self._tftpboot = tftpboot
+        self._dnsmasq = dnsmasq
+        self._imageStore = imageStore
+        self._reclaimHost = reclaimHost
+        self._event = threading.Event()
+        threading.Thread.__init__(self, name="imageBuilder%d" % index)
+        self.daemon = True
+        threading.Thread.start(self)
+
+    def index(self):
+        return self._index
+
+    def run(self):
+        try:
+            while True:
+                self._work()
+        except:
+            logging.exception("Image builder %(index)d terminates, commiting suicide", dict(
+                index=self._index))
+            suicide.killSelf()
+
+    def _work(self):
+        job = self._buildQueue.get()
+        isReaped = reaper.it().waitUntilReaped(self._index, timeout=config.REAPER_WAIT_TIMEOUT)
+        with globallock.lock():
+            if job.cancelled:
+                return
+            if not isReaped:
+                logging.error("The previous VM of image builder %(index)d is still being torn down", dict(
+                    index=self._index))
+                self._finishedCallback(
+                    job, False, "Unable to build image: the image builder VM could not be torn down. Review "
+                    "rackattack provider logs")
+                return
+            self._event.clear()
+            job.cancelCallback = self._event.set
+            vmInstance, stateMachine = self._startInauguratorVM(job.label, job.sizeGB)
+        while not self._inaugurationEnded(job, vmInstance, stateMachine):
+            pass
+
+    def _inaugurationEnded(self, job, vmInstance, stateMachine):
         self._event.wait()
-        self._event.clear()
         with globallock.lock():
-            assert stateMachine.state() in [
-                hoststatemachine.STATE_INAUGURATION_DONE, hoststatemachine.STATE_DESTROYED]
+            self._event.clear()
             if stateMachine.state() == hoststatemachine.STATE_DESTROYED:
                 logging.error("Unable to build image using inaugurator")
-                callback(False, "Unable to build image using inaugurator. Review rackattack provider logs")
-                return
-            self._imageStore.put(filename=vmInstance.disk1Image(), imageLabel=label, sizeGB=sizeGB)
-            stateMachine.unassign()
-            stateMachine.destroy()
-            callback(True, "Done building image using inaugurator (label %s)" % label)
-        logging.info("Done building image using inaugurator (label %(label)s)", dict(label=label))
+                self._finishedCallback(
+                    job, False, "Unable to build image using inaugurator. Review rackattack provider logs")
+                return True
+            if stateMachine.state() == hoststatemachine.STATE_INAUGURATION_DONE:
+                self._imageStore.put(
+                    filename=vmInstance.disk1Image(), imageLabel=job.label, sizeGB=job.sizeGB)
+                stateMachine.unassign()
+                stateMachine.destroy()
+                self._finishedCallback(
+                    job, True, "Done building image using inaugurator (label %s)" % job.label)
+                logging.info("Done building image using inaugurator (label %(label)s)", dict(
+                    label=job.label))
+                return True
+            if job.cancelled:
+                logging.info("Build of label '%(label)s' was cancelled while inaugurating", dict(
+                    label=job.label))
+                stateMachine.unassign()
+                stateMachine.destroy()
+                return True
+            return False
 
     def _vmCommitedSuicide(self, stateMachine):
         pass
@@ -82,13 +215,13 @@ class BuildImageThread(threading.Thread):
             self._event.set()
 
     def _startInauguratorVM(self, label, sizeGB):
-        with globallock.lock():
-            requirement = api.Requirement(
-                imageLabel=label, imageHint="build", hardwareConstraints=dict(
-                    minimumDisk1SizeGB=sizeGB, minimumDisk2SizeGB=1)).__dict__
-            vmInstance = vm.VM.createFromNewImage(config.IMAGE_BUILDING_VM_INDEX, requirement)
-            stateMachine = hoststatemachine.HostStateMachine(
-                vmInstance, self._inaugurate, self._tftpboot, self._dnsmasq, self._reclaimHost)
-            stateMachine.assign(self._vmChangedState, imageLabel=label, imageHint="build")
-            stateMachine.setDestroyCallback(self._vmCommitedSuicide)
-            return vmInstance, stateMachine
+        assert globallock.assertLocked()
+        requirement = api.Requirement(
+            imageLabel=label, imageHint="build", hardwareConstraints=dict(
+                minimumDisk1SizeGB=sizeGB, minimumDisk2SizeGB=1)).__dict__
+        vmInstance = vm.VM.createFromNewImage(self._index, requirement)
+        stateMachine = hoststatemachine.HostStateMachine(
+            vmInstance, self._inaugurate, self._tftpboot, self._dnsmasq, self._reclaimHost)
+        stateMachine.assign(self._vmChangedState, imageLabel=label, imageHint="build")
+        stateMachine.setDestroyCallback(self._vmCommitedSuicide)
+        return vmInstance, stateMachine
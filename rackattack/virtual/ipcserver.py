@@ -1,12 +1,23 @@
 from rackattack.tcp import heartbeat
 from rackattack.common import baseipcserver
 from rackattack.virtual.kvm import network
+from rackattack.virtual.kvm import libvirtsingleton
+from rackattack.virtual.kvm import reaper
 
 
 class IPCServer(baseipcserver.BaseIPCServer):
-    def __init__(self, dnsmasq, allocations):
+    LOCK_FREE_COMMANDS = set(['heartbeat'])
+    READ_ONLY_COMMANDS = baseipcserver.BaseIPCServer.READ_ONLY_COMMANDS | set([
+        'allocation__nodes', 'allocation__inauguratorsIDs', 'allocation__done', 'allocation__dead',
+        'node__rootSSHCredentials'])
+
+    def __init__(self, dnsmasq, allocations, heartbeatMonitor, warmPool, imageStore, reclamationServer):
         self._dnsmasq = dnsmasq
         self._allocations = allocations
+        self._heartbeatMonitor = heartbeatMonitor
+        self._warmPool = warmPool
+        self._imageStore = imageStore
+        self._reclamationServer = reclamationServer
         baseipcserver.BaseIPCServer.__init__(self)
 
     def cmd_allocate(self, requirements, allocationInfo, peer):
@@ -49,9 +60,7 @@ class IPCServer(baseipcserver.BaseIPCServer):
         return allocation.dead()
 
     def cmd_heartbeat(self, ids, peer):
-        for id in ids:
-            allocation = self._allocations.byIndex(id)
-            allocation.heartbeat()
+        self._heartbeatMonitor.beat(ids)
         return heartbeat.HEARTBEAT_OK
 
     def cmd_node__rootSSHCredentials(self, allocationID, nodeID, peer):
@@ -64,6 +73,15 @@ class IPCServer(baseipcserver.BaseIPCServer):
         else:
             self._dnsmasq.remove(vm.primaryMACAddress())
 
+    def _statistics(self):
+        result = baseipcserver.BaseIPCServer._statistics(self)
+        result['warmPool'] = self._warmPool.stats()
+        result['imageStore'] = self._imageStore.stats()
+        result['libvirt'] = libvirtsingleton.it().stats()
+        result['reaper'] = reaper.it().stats()
+        result['reclamation'] = self._reclamationServer.stats()
+        return result
+
     def _findVM(self, allocationID, nodeID):
         allocation = self._allocations.byIndex(allocationID)
         for vm in allocation.vms().values():
@@ -0,0 +1,57 @@
+import os
+import logging
+import threading
+
+_it = None
+
+
+def it():
+    global _it
+    if _it is None:
+        _it = BackingFiles()
+    return _it
+
+
+class Reference(object):
+    __slots__ = ('filename',)
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+class BackingFiles:
+    # Counts the overlays backed by each image store file. A reference is acquired when the image is
+    # handed out for deriving an overlay, and released when the overlay is unlinked. Referenced files are
+    # never evicted, so a condemned file is unlinked right away. Overlays do not outlive a restart (cleanup
+    # unlinks them on startup), so the references start empty.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._references = dict()
+
+    def acquire(self, filename):
+        "Returns the Reference to release once the overlay is gone"
+        with self._lock:
+            reference = Reference(filename)
+            self._references.setdefault(filename, set()).add(reference)
+        return reference
+
+    def release(self, reference):
+        with self._lock:
+            references = self._references[reference.filename]
+            references.remove(reference)
+            if not references:
+                del self._references[reference.filename]
+
+    def isReferenced(self, filename):
+        with self._lock:
+            return bool(self._references.get(filename))
+
+    def condemn(self, filename):
+        assert not self.isReferenced(filename), "'%s' still backs overlays" % filename
+        logging.info("Unlinking unreferenced image '%(filename)s'", dict(filename=filename))
+        os.unlink(filename)
+
+    def stats(self):
+        with self._lock:
+            return dict(referenced=len(self._references),
+                        references=sum(len(references) for references in self._references.values()))
@@ -5,20 +5,23 @@ import os
 import glob
 
 
-def _cleanupDomains():
-    logging.info("Cleaning up previous rackattack nodes")
+def _cleanupDomainsOfConnection(libvirt):
     cleaned = 0
     ignored = 0
-    with libvirtsingleton.it().lock():
-        libvirt = libvirtsingleton.it().libvirt()
-        for domain in libvirt.listAllDomains(0xFF):
-            if not domain.name().startswith(config.DOMAIN_PREFIX):
-                ignored += 1
-                continue
-            if domain.isActive():
-                domain.destroy()
-            domain.undefine()
-            cleaned += 1
+    for domain in libvirt.listAllDomains(0xFF):
+        if not domain.name().startswith(config.DOMAIN_PREFIX):
+            ignored += 1
+            continue
+        if domain.isActive():
+            domain.destroy()
+        domain.undefine()
+        cleaned += 1
+    return cleaned, ignored
+
+
+def _cleanupDomains():
+    logging.info("Cleaning up previous rackattack nodes")
+    cleaned, ignored = libvirtsingleton.it().call("cleanupDomains", _cleanupDomainsOfConnection)
     logging.info(
         "Done cleaning up previous rackattack nodes. %(cleaned)d cleaned, "
         "%(ignored)d ignored", dict(cleaned=cleaned, ignored=ignored))
@@ -3,16 +3,33 @@ VAR_DIRPATH = os.path.join("/var", "lib", "rackattack-virtual")
 NETWORK_NAME = "rackattacknet"
 DOMAIN_PREFIX = "rackattack-"
 MAXIMUM_VMS = 4
+VM_CREATION_WORKERS = 4
+LIBVIRT_CONNECTIONS = 4
+TIMERS_MAX_PER_BATCH = 100
+TIMERS_LATE_THRESHOLD = 1
+REAPER_TRUNCATE_STEP_MB = 0
+REAPER_TRUNCATE_STEP_INTERVAL = 0.05
+REAPER_WAIT_TIMEOUT = 5 * 60
+DEFAULT_DOMAIN_PROFILE = "default"
+WARM_POOL_CLASSES = 2
+WARM_POOL_VMS_PER_CLASS = 0
 MAXIMUM_DISK_IMAGES = 6
+IMAGE_STORE_LOW_FREE_SPACE_RATIO = 0.1
+IMAGE_STORE_HIGH_FREE_SPACE_RATIO = 0.2
+NATIVE_QCOW2 = True
 DISK_IMAGES_DIRECTORY = os.path.join(VAR_DIRPATH, "diskimages")
 IMAGE_STORE_DIRECTORY = os.path.join(VAR_DIRPATH, "imagestore")
 IMAGE_STORE_LAST_USED = os.path.join(VAR_DIRPATH, "imagestore/lastused.json")
+IMAGE_STORE_LAST_USED_JOURNAL = os.path.join(VAR_DIRPATH, "imagestore/lastused.journal")
+IMAGE_STORE_INDEX = os.path.join(VAR_DIRPATH, "imagestore/index.json")
+IMAGE_STORE_QUARANTINE_DIRECTORY = os.path.join(VAR_DIRPATH, "imagestore/quarantine")
 SERIAL_LOGS_DIRECTORY = os.path.join(VAR_DIRPATH, "seriallogs")
 MANAGED_POST_MORTEM_PACKS_DIRECTORY = os.path.join(VAR_DIRPATH, "postMortemPacks")
 RABBIT_MQ_DIRECTORY = os.path.join(VAR_DIRPATH, "mq")
 ROOT_PASSWORD = "rackattack"
 ERASE_IF_IMAGE_UNUSED_FOR = 14 * 24 * 60 * 60
 IMAGE_BUILDING_VM_INDEX = 50
+IMAGE_BUILDERS = 2
 RECLAMATION_REQUESTS_FIFO_PATH = os.path.join(VAR_DIRPATH, "reclamation_requests_fifo")
 SOFT_RECLAMATION_FAILURE_MSG_FIFO_PATH = os.path.join(VAR_DIRPATH, "/soft_reclamations_failure_msg_fifo")
 PID_FILEPATH = os.path.join(VAR_DIRPATH, "pid")
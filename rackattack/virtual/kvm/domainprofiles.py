@@ -0,0 +1,84 @@
+import os
+import glob
+import logging
+from rackattack.virtual.kvm import config
+
+DEFAULT = "default"
+_NODES_GLOB = "/sys/devices/system/node/node[0-9]*"
+_numaNodes = None
+
+
+class DomainProfile(object):
+    __slots__ = ('name', 'machine', 'diskCache', 'diskIO', 'iothreads', 'multiqueue', 'graphics',
+                 'memballoon', 'hugepages', 'numaPinning')
+
+    def __init__(self, name, machine='pc', diskCache='writeback', diskIO='threads', iothreads=0,
+                 multiqueue=False, graphics=True, memballoon=True, hugepages=False, numaPinning=False):
+        self.name = name
+        self.machine = machine
+        self.diskCache = diskCache
+        self.diskIO = diskIO
+        self.iothreads = iothreads
+        self.multiqueue = multiqueue
+        self.graphics = graphics
+        self.memballoon = memballoon
+        self.hugepages = hugepages
+        self.numaPinning = numaPinning
+
+
+_PROFILES = dict((profile.name, profile) for profile in [
+    DomainProfile(DEFAULT),
+    DomainProfile(
+        "io", diskCache='none', diskIO='native', iothreads=1, multiqueue=True, graphics=False,
+        memballoon=False),
+    DomainProfile(
+        "q35", machine='q35', diskCache='none', diskIO='native', iothreads=1, multiqueue=True,
+        graphics=False, memballoon=False),
+    DomainProfile(
+        "pinned", machine='q35', diskCache='none', diskIO='native', iothreads=1, multiqueue=True,
+        graphics=False, memballoon=False, hugepages=True, numaPinning=True)])
+
+
+def names():
+    return sorted(_PROFILES.keys())
+
+
+def get(name):
+    if name not in _PROFILES:
+        raise ValueError("Unknown domain profile '%s', known profiles are %s" % (name, names()))
+    return _PROFILES[name]
+
+
+def fromRequirement(requirement):
+    return get(requirement['hardwareConstraints'].get('domainProfile', config.DEFAULT_DOMAIN_PROFILE))
+
+
+def numaNodes():
+    "Returns the host NUMA nodes as (node number, cpulist) pairs, read from sysfs once per process"
+    global _numaNodes
+    if _numaNodes is None:
+        _numaNodes = _readNUMANodes()
+    return _numaNodes
+
+
+def numaPlacement(hint):
+    "Spreads VMs across NUMA nodes by hint. Returns a (node number, cpulist) pair, or None"
+    nodes = numaNodes()
+    if not nodes:
+        return None
+    return nodes[hint % len(nodes)]
+
+
+def _readNUMANodes():
+    nodes = []
+    for directory in glob.glob(_NODES_GLOB):
+        try:
+            with open(os.path.join(directory, "cpulist")) as f:
+                cpulist = f.read().strip()
+        except IOError:
+            continue
+        if cpulist:
+            nodes.append((int(os.path.basename(directory)[len("node"):]), cpulist))
+    if not nodes:
+        logging.warning("No NUMA topology found in sysfs, VMs will not be pinned")
+    return sorted(nodes)
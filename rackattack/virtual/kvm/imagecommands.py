@@ -1,15 +1,34 @@
 import os
 from rackattack.virtual import sh
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import qcow2
+
+_GB = 1024 ** 3
 
 
 def create(image, sizeGB):
     dirname = os.path.dirname(image)
     if not os.path.isdir(dirname):
         os.makedirs(dirname, 0777)
-    sh.run(['qemu-img', 'create', '-f', 'qcow2', image, '%dG' % sizeGB])
+    if config.NATIVE_QCOW2:
+        qcow2.create(image, sizeGB * _GB)
+    else:
+        sh.run(['qemu-img', 'create', '-f', 'qcow2', image, '%dG' % sizeGB])
     os.chmod(image, 0666)
 
 
 def deriveCopyOnWrite(original, newImage, originalFormat='qcow2'):
-    sh.run(['qemu-img', 'create', '-F', originalFormat, '-f', 'qcow2', '-b', original, newImage])
+    if config.NATIVE_QCOW2:
+        qcow2.create(newImage, _virtualSize(original, originalFormat),
+                     backingFile=original, backingFormat=originalFormat)
+    else:
+        sh.run(['qemu-img', 'create', '-F', originalFormat, '-f', 'qcow2', '-b', original, newImage])
     os.chmod(newImage, 0666)
+
+
+def _virtualSize(image, imageFormat):
+    if imageFormat == 'qcow2':
+        return qcow2.readHeader(image).size
+    if imageFormat == 'raw':
+        return os.path.getsize(image)
+    raise Exception("Unable to derive a copy on write image of a '%s' image" % imageFormat)
@@ -0,0 +1,59 @@
+import os
+import time
+import logging
+import threading
+from rackattack.tcp import suicide
+from rackattack.common import globallock
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import backingfiles
+
+
+def freeSpaceRatio(directory):
+    stat = os.statvfs(directory)
+    return float(stat.f_bavail) / stat.f_blocks
+
+
+class ImageEviction(threading.Thread):
+    # Evicts images from the image store, least recently used first: images unused for
+    # ERASE_IF_IMAGE_UNUSED_FOR, images above MAXIMUM_DISK_IMAGES, and once the free space ratio of the
+    # image store drops below the low watermark, images until it is back above the high watermark.
+    # Images which still back overlays are never evicted.
+    _INTERVAL = 30
+
+    def __init__(self, imageStore):
+        self._imageStore = imageStore
+        threading.Thread.__init__(self)
+        self.daemon = True
+        threading.Thread.start(self)
+
+    def run(self):
+        try:
+            while True:
+                self._evict()
+                time.sleep(self._INTERVAL)
+        except:
+            logging.exception("Image eviction thread died")
+            suicide.killSelf()
+            raise
+
+    def _evict(self):
+        now = time.time()
+        with globallock.lock():
+            lowOnSpace = self._freeSpaceRatio() < config.IMAGE_STORE_LOW_FREE_SPACE_RATIO
+            for lastUsed, label, sizeGB, filename in self._imageStore.leastRecentlyUsed():
+                if backingfiles.it().isReferenced(filename):
+                    continue
+                if lastUsed < now - config.ERASE_IF_IMAGE_UNUSED_FOR:
+                    reason = "unused for too long"
+                elif self._imageStore.nrImages() > config.MAXIMUM_DISK_IMAGES:
+                    reason = "too many images"
+                elif lowOnSpace and self._freeSpaceRatio() < config.IMAGE_STORE_HIGH_FREE_SPACE_RATIO:
+                    reason = "low on disk space"
+                else:
+                    break
+                self._imageStore.evict(imageLabel=label, sizeGB=sizeGB, reason=reason)
+
+    def _freeSpaceRatio(self):
+        if not os.path.isdir(config.IMAGE_STORE_DIRECTORY):
+            return 1.0
+        return freeSpaceRatio(config.IMAGE_STORE_DIRECTORY)
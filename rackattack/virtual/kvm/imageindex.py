@@ -0,0 +1,94 @@
+import os
+import glob
+import json
+import logging
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import qcow2
+
+_GB = 1024 ** 3
+
+
+class _Invalid(Exception):
+    pass
+
+
+def scan():
+    # Returns the valid images of the image store, as a dict of (label, sizeGB) to filename, and
+    # quarantines the rest. Validation reads only the qcow2 header, and is skipped for files whose
+    # inode, modification time and size match the ones recorded in the index on a previous scan.
+    cached = _readIndex()
+    index = dict()
+    images = dict()
+    for filename in glob.glob(os.path.join(config.IMAGE_STORE_DIRECTORY, "*.qcow2")):
+        basename = os.path.basename(filename)
+        try:
+            key = _parseFilename(basename)
+            stat = os.stat(filename)
+            signature = [stat.st_ino, stat.st_mtime, stat.st_size]
+            if cached.get(basename) != signature:
+                _validate(filename, sizeGB=key[1], fileSize=stat.st_size)
+        except _Invalid as e:
+            _quarantine(filename, reason=str(e))
+            continue
+        except OSError:
+            logging.exception("Unable to examine '%(filename)s', skipping it", dict(filename=filename))
+            continue
+        index[basename] = signature
+        images[key] = filename
+    _writeIndex(index)
+    return images
+
+
+def _parseFilename(basename):
+    fields = os.path.splitext(basename)[0].split("____")
+    if len(fields) != 2 or not fields[1].endswith("GB"):
+        raise _Invalid("filename does not name a label and size")
+    try:
+        sizeGB = int(fields[1][:-len("GB")])
+    except ValueError:
+        raise _Invalid("filename does not name a label and size")
+    return fields[0], sizeGB
+
+
+def _validate(filename, sizeGB, fileSize):
+    try:
+        header = qcow2.readHeader(filename)
+    except Exception as e:
+        raise _Invalid("unreadable qcow2 header: %s" % e)
+    if header.size != sizeGB * _GB:
+        raise _Invalid("virtual size is %d bytes, not %dGB" % (header.size, sizeGB))
+    if header.incompatibleFeatures & (qcow2.INCOMPATIBLE_DIRTY | qcow2.INCOMPATIBLE_CORRUPT):
+        raise _Invalid("marked dirty or corrupt (incompatible features 0x%x)" % header.incompatibleFeatures)
+    clusterSize = 1 << header.clusterBits
+    if header.refcountTableOffset + clusterSize > fileSize or \
+            header.l1TableOffset + header.l1Size * 8 > fileSize:
+        raise _Invalid("truncated to %d bytes" % fileSize)
+    if header.backingFile is not None and not os.path.exists(header.backingFile):
+        raise _Invalid("backing file '%s' does not exist" % header.backingFile)
+
+
+def _quarantine(filename, reason):
+    logging.error("Quarantining image '%(filename)s': %(reason)s", dict(filename=filename, reason=reason))
+    if not os.path.isdir(config.IMAGE_STORE_QUARANTINE_DIRECTORY):
+        os.makedirs(config.IMAGE_STORE_QUARANTINE_DIRECTORY)
+    os.rename(filename, os.path.join(config.IMAGE_STORE_QUARANTINE_DIRECTORY, os.path.basename(filename)))
+
+
+def _readIndex():
+    if not os.path.exists(config.IMAGE_STORE_INDEX):
+        return dict()
+    try:
+        with open(config.IMAGE_STORE_INDEX) as f:
+            return json.load(f)
+    except ValueError:
+        logging.exception("Unable to parse the image store index, validating all images")
+        return dict()
+
+
+def _writeIndex(index):
+    if not os.path.isdir(os.path.dirname(config.IMAGE_STORE_INDEX)):
+        return
+    temporary = config.IMAGE_STORE_INDEX + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(index, f)
+    os.rename(temporary, config.IMAGE_STORE_INDEX)
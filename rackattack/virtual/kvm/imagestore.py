@@ -1,60 +1,102 @@
 import os
 from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import lastused
+from rackattack.virtual.kvm import backingfiles
+from rackattack.virtual.kvm import imageindex
 from rackattack.common import globallock
-import glob
 import logging
-import json
-import time
+import itertools
+import collections
 
 
 class ImageStore:
     def __init__(self):
         self._images = dict()
+        self._generations = dict()
+        self._nextGeneration = itertools.count()
+        self._lastUsed = lastused.LastUsed(
+            snapshotFilename=config.IMAGE_STORE_LAST_USED,
+            journalFilename=config.IMAGE_STORE_LAST_USED_JOURNAL)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = collections.Counter()
+        self._evictedBytes = 0
         self._findExistingImages()
-        self._deleteExcessiveImages()
 
     def put(self, filename, imageLabel, sizeGB):
-        assert (imageLabel, sizeGB) not in self._images
+        if (imageLabel, sizeGB) in self._images:
+            logging.warning("Image '%(label)s'/%(sizeGB)sGB was built while already in store, discarding "
+                            "the new one", dict(label=imageLabel, sizeGB=sizeGB))
+            os.unlink(filename)
+            return
         newFilename = self._filename(imageLabel, sizeGB)
         if not os.path.isdir(os.path.dirname(newFilename)):
             os.makedirs(os.path.dirname(newFilename))
         os.rename(filename, newFilename)
         self._images[(imageLabel, sizeGB)] = newFilename
+        self._generations[(imageLabel, sizeGB)] = next(self._nextGeneration)
+        self._lastUsed.touch(self._lastUsedKey(imageLabel, sizeGB))
 
     def _filename(self, imageLabel, sizeGB):
         assert globallock.assertLocked()
         return os.path.join(config.IMAGE_STORE_DIRECTORY, "%s____%dGB.qcow2" % (imageLabel, sizeGB))
 
     def get(self, imageLabel, sizeGB):
-        if (imageLabel, sizeGB) not in self._images:
+        "Returns a reference to the image, which the overlay derived from it must release"
+        filename = self._images.get((imageLabel, sizeGB))
+        if filename is None:
             raise Exception("No such built image: '%s'/%dGB" % (imageLabel, sizeGB))
-        lastUsed = self._lastUsed()
-        lastUsed["%s____%d" % (imageLabel, sizeGB)] = time.time()
-        with open(config.IMAGE_STORE_LAST_USED, "w") as f:
-            json.dump(lastUsed, f)
-        return self._images[(imageLabel, sizeGB)]
-
-    def _deleteExcessiveImages(self):
-        lastUsed = self._lastUsed()
-        timeout = time.time() - config.ERASE_IF_IMAGE_UNUSED_FOR
-        for label, sizeGB in dict(self._images):
-            if lastUsed.get("%s____%d" % (label, sizeGB), time.time()) < timeout:
-                logging.info("Label '%(label)s' %(sizeGB)GB unused for too long. Erasing", dict(
-                    label=label, sizeGB=sizeGB))
-                os.unlink(self._images[(label, sizeGB)])
-                del self._images[(label, sizeGB)]
+        self._lastUsed.touch(self._lastUsedKey(imageLabel, sizeGB))
+        return backingfiles.it().acquire(filename)
+
+    def peek(self, imageLabel, sizeGB):
+        "Returns the image filename and generation, or None, without marking it used or referencing it"
+        if (imageLabel, sizeGB) not in self._images:
+            return None
+        return self._images[(imageLabel, sizeGB)], self._generations[(imageLabel, sizeGB)]
+
+    def contains(self, imageLabel, sizeGB):
+        if (imageLabel, sizeGB) in self._images:
+            self._hits += 1
+            return True
+        self._misses += 1
+        return False
+
+    def leastRecentlyUsed(self):
+        assert globallock.assertLocked()
+        images = [(self._lastUsed.get(self._lastUsedKey(label, sizeGB), 0), label, sizeGB, filename)
+                  for (label, sizeGB), filename in self._images.iteritems()]
+        images.sort()
+        return images
+
+    def nrImages(self):
+        return len(self._images)
+
+    def evict(self, imageLabel, sizeGB, reason):
+        assert globallock.assertLocked()
+        filename = self._images.pop((imageLabel, sizeGB))
+        del self._generations[(imageLabel, sizeGB)]
+        self._lastUsed.remove(self._lastUsedKey(imageLabel, sizeGB))
+        logging.info("Evicting image '%(label)s'/%(sizeGB)sGB: %(reason)s", dict(
+            label=imageLabel, sizeGB=sizeGB, reason=reason))
+        size = os.path.getsize(filename)
+        backingfiles.it().condemn(filename)
+        self._evictions[reason] += 1
+        self._evictedBytes += size
+
+    def stats(self):
+        assert globallock.assertLocked()
+        return dict(images=len(self._images), hits=self._hits, misses=self._misses,
+                    evictions=dict(self._evictions), evictedBytes=self._evictedBytes,
+                    backingFiles=backingfiles.it().stats())
+
+    def _lastUsedKey(self, imageLabel, sizeGB):
+        return "%s____%d" % (imageLabel, sizeGB)
 
     def _findExistingImages(self):
-        for filename in glob.glob(config.IMAGE_STORE_DIRECTORY + "/*.qcow2"):
-            fields = os.path.splitext(os.path.basename(filename))[0].split("____")
-            imageLabel = fields[0]
-            sizeGB = int(fields[1][:-len("GB")])
+        for (imageLabel, sizeGB), filename in imageindex.scan().iteritems():
             logging.info("Using '%(filename)s' as an existing image", dict(filename=filename))
             self._images[(imageLabel, sizeGB)] = filename
-
-    def _lastUsed(self):
-        if os.path.exists(config.IMAGE_STORE_LAST_USED):
-            with open(config.IMAGE_STORE_LAST_USED) as f:
-                return json.load(f)
-        else:
-            return dict()
+            self._generations[(imageLabel, sizeGB)] = next(self._nextGeneration)
+            if self._lastUsed.get(self._lastUsedKey(imageLabel, sizeGB)) is None:
+                self._lastUsed.touch(self._lastUsedKey(imageLabel, sizeGB))
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import logging
+import threading
+from rackattack.tcp import suicide
+
+_REMOVED = "-"
+
+
+class LastUsed(threading.Thread):
+    # Last used times are kept in memory. Changes are appended by this thread to a journal, which is
+    # folded into the snapshot file once it grows long enough: the snapshot is replaced by an atomic
+    # rename, and only then the journal is truncated. Replaying the journal over a newer snapshot is
+    # harmless. A torn last record of the journal is dropped, by compacting right away.
+    _FLUSH_INTERVAL = 1
+    _COMPACT_AFTER_RECORDS = 1000
+
+    def __init__(self, snapshotFilename, journalFilename):
+        self._snapshotFilename = snapshotFilename
+        self._journalFilename = journalFilename
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._times = dict()
+        self._pending = []
+        self._nrJournalRecords = 0
+        self._load()
+        threading.Thread.__init__(self)
+        self.daemon = True
+        threading.Thread.start(self)
+
+    def touch(self, key):
+        now = time.time()
+        with self._lock:
+            self._times[key] = now
+            self._pending.append((key, repr(now)))
+
+    def remove(self, key):
+        with self._lock:
+            if self._times.pop(key, None) is not None:
+                self._pending.append((key, _REMOVED))
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._times.get(key, default)
+
+    def run(self):
+        try:
+            while True:
+                time.sleep(self._FLUSH_INTERVAL)
+                self.flush()
+        except:
+            logging.exception("Last used journal thread died")
+            suicide.killSelf()
+            raise
+
+    def flush(self):
+        with self._flushLock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                self._append(pending)
+            if self._nrJournalRecords >= self._COMPACT_AFTER_RECORDS:
+                self._compact()
+
+    def _append(self, records):
+        self._ensureDirectory()
+        with open(self._journalFilename, "a") as f:
+            for key, when in records:
+                f.write("%s\t%s\n" % (key, when))
+            f.flush()
+            os.fsync(f.fileno())
+        self._nrJournalRecords += len(records)
+
+    def _compact(self):
+        with self._lock:
+            snapshot = json.dumps(self._times)
+        temporary = self._snapshotFilename + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temporary, self._snapshotFilename)
+        with open(temporary, "w"):
+            pass
+        os.rename(temporary, self._journalFilename)
+        self._nrJournalRecords = 0
+
+    def _load(self):
+        if os.path.exists(self._snapshotFilename):
+            try:
+                with open(self._snapshotFilename) as f:
+                    self._times = json.load(f)
+            except ValueError:
+                logging.exception("Unable to parse '%(filename)s', ignoring it", dict(
+                    filename=self._snapshotFilename))
+        if not os.path.exists(self._journalFilename):
+            return
+        intact = True
+        with open(self._journalFilename) as f:
+            for line in f:
+                self._nrJournalRecords += 1
+                intact = self._replay(line) and intact
+        if not intact:
+            self._compact()
+
+    def _replay(self, line):
+        fields = line.rstrip("\n").split("\t")
+        if not line.endswith("\n") or len(fields) != 2:
+            logging.warning("Ignoring a torn last used journal record: '%(line)s'", dict(line=line))
+            return False
+        key, when = fields
+        if when == _REMOVED:
+            self._times.pop(key, None)
+            return True
+        try:
+            self._times[key] = float(when)
+        except ValueError:
+            logging.warning("Ignoring a corrupt last used journal record: '%(line)s'", dict(line=line))
+            return False
+        return True
+
+    def _ensureDirectory(self):
+        dirname = os.path.dirname(self._journalFilename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
@@ -1,5 +1,10 @@
 import libvirt
+import time
+import Queue
+import logging
 import threading
+from rackattack.common import statistics
+from rackattack.virtual.kvm import config
 
 _it = None
 
@@ -12,13 +17,73 @@ def it():
 
 
 class LibvirtSingleton:
+    # A pool of LIBVIRT_CONNECTIONS connections, opened on first use. A connection is borrowed only for
+    # the duration of a single call, and one found dead is closed and reopened on its next use. Domain
+    # objects are bound to the connection that looked them up, so calls look up domains by name.
+    _URI = "qemu:///system"
+
     def __init__(self):
-        self._libvirt = libvirt.open("qemu:///system")
-        self._lock = threading.Lock()
+        self._idle = Queue.Queue()
+        for _ in xrange(config.LIBVIRT_CONNECTIONS):
+            self._idle.put(None)
+        self._statisticsLock = threading.Lock()
+        self._latency = dict()
+        self._nrConnectionsOpened = 0
+
+    def call(self, name, operation):
+        connection = self._borrow()
+        before = time.time()
+        try:
+            return operation(connection)
+        except libvirt.libvirtError:
+            if not self._isAlive(connection):
+                logging.exception("Libvirt connection died during '%(name)s'", dict(name=name))
+                self._close(connection)
+                connection = None
+            raise
+        finally:
+            self._recordLatency(name, time.time() - before)
+            self._idle.put(connection)
+
+    def domainCall(self, domainName, methodName):
+        return self.call(
+            methodName, lambda connection: getattr(connection.lookupByName(domainName), methodName)())
+
+    def stats(self):
+        with self._statisticsLock:
+            return dict(connectionsOpened=self._nrConnectionsOpened,
+                        calls=dict((name, latency.report()) for name, latency in self._latency.iteritems()))
+
+    def _borrow(self):
+        connection = self._idle.get()
+        try:
+            if connection is not None and not self._isAlive(connection):
+                logging.warning("Libvirt connection found dead, reconnecting")
+                self._close(connection)
+                connection = None
+            if connection is None:
+                connection = libvirt.open(self._URI)
+                with self._statisticsLock:
+                    self._nrConnectionsOpened += 1
+        except:
+            self._idle.put(None)
+            raise
+        return connection
+
+    def _isAlive(self, connection):
+        try:
+            return connection.isAlive() == 1
+        except libvirt.libvirtError:
+            return False
 
-    def lock(self):
-        return self._lock
+    def _close(self, connection):
+        try:
+            connection.close()
+        except libvirt.libvirtError:
+            pass
 
-    def libvirt(self):
-        assert not self._lock.acquire(False)
-        return self._libvirt
+    def _recordLatency(self, name, seconds):
+        with self._statisticsLock:
+            if name not in self._latency:
+                self._latency[name] = statistics.Latency()
+        self._latency[name].record(seconds)
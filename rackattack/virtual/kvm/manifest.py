@@ -1,44 +1,138 @@
 import os.path
 import xmltodict
 from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import domainprofiles
 
+_emulatorPath = None
 
-class Manifest:
-    def __init__(self, xml):
-        self._dict = xmltodict.parse(xml)
+
+class Manifest(object):
+    # Manifests of new domains are rendered straight from their fields. Manifests loaded from an existing
+    # XML are only parsed once one of their fields is asked for.
+    __slots__ = ('_name', '_memoryMB', '_vcpus', '_disk1Image', '_disk2Image', '_primaryMACAddress',
+                 '_secondaryMACAddress', '_networkName', '_serialOutputFilename', '_bootFromNetwork',
+                 '_emulatorPath', '_profile', '_numaPlacement', '_source')
+
+    def __init__(self, name, memoryMB, vcpus, disk1Image, disk2Image, primaryMACAddress,
+                 secondaryMACAddress, networkName, serialOutputFilename, bootFromNetwork, emulatorPath,
+                 profile=None, numaPlacement=None, source=None):
+        self._name = name
+        self._memoryMB = memoryMB
+        self._vcpus = vcpus
+        self._disk1Image = disk1Image
+        self._disk2Image = disk2Image
+        self._primaryMACAddress = primaryMACAddress
+        self._secondaryMACAddress = secondaryMACAddress
+        self._networkName = networkName
+        self._serialOutputFilename = serialOutputFilename
+        self._bootFromNetwork = bootFromNetwork
+        self._emulatorPath = emulatorPath
+        self._profile = profile
+        self._numaPlacement = numaPlacement
+        self._source = source
 
     def xml(self):
-        return xmltodict.unparse(self._dict)
+        if self._source is not None:
+            return self._source
+        profile = self._profile
+        pc = profile.machine == 'pc'
+        return _TEMPLATE % dict(
+            name=self._name,
+            memoryKB=self._memoryMB * 1024,
+            memoryBacking=_MEMORY_BACKING if profile.hugepages else "",
+            vcpus=self._vcpus,
+            cpuset="" if self._numaPlacement is None else " cpuset='%s'" % self._numaPlacement[1],
+            iothreads=_IOTHREADS % profile.iothreads if profile.iothreads else "",
+            numatune="" if self._numaPlacement is None else _NUMATUNE % self._numaPlacement[0],
+            machine=profile.machine,
+            disk1Image=self._disk1Image,
+            disk2Image=self._disk2Image,
+            diskDriver=_diskDriver(profile),
+            disk1Address=_ADDRESS % (0x04, 0) if pc else "",
+            disk2Address=_ADDRESS % (0x06, 0) if pc else "",
+            usbAddress=_ADDRESS % (0x01, 2) if pc else "",
+            pciRoot='pci-root' if pc else 'pcie-root',
+            primaryMACAddress=self._primaryMACAddress,
+            secondaryMACAddress=self._secondaryMACAddress,
+            networkName=self._networkName,
+            nicDriver=_NIC_DRIVER % self._vcpus if profile.multiqueue and self._vcpus > 1 else "",
+            primaryNICAddress=_ADDRESS % (0x03, 0) if pc else "",
+            secondaryNICAddress=_ADDRESS % (0x07, 0) if pc else "",
+            serialOutputFilename=self._serialOutputFilename,
+            bootDevice='network' if self._bootFromNetwork else 'hd',
+            emulatorPath=self._emulatorPath,
+            graphics=(_GRAPHICS % dict(videoAddress=_ADDRESS % (0x02, 0) if pc else "")
+                      if profile.graphics else ""),
+            memballoon=(_MEMBALLOON % dict(memballoonAddress=_ADDRESS % (0x05, 0) if pc else "")
+                        if profile.memballoon else _NO_MEMBALLOON))
 
     def name(self):
-        return self._dict['domain']['name']
+        self._parse()
+        return self._name
 
     def vcpus(self):
-        return int(self._dict['domain']['vcpu']['#text'])
+        self._parse()
+        return self._vcpus
 
     def memoryMB(self):
-        assert self._dict['domain']['currentMemory']['@unit'] == "KiB"
-        return int(self._dict['domain']['currentMemory']['#text']) / 1024
+        self._parse()
+        return self._memoryMB
 
     def primaryMACAddress(self):
-        return self._dict['domain']['devices']['interface'][0]['mac']['@address']
+        self._parse()
+        return self._primaryMACAddress
 
     def secondaryMACAddress(self):
-        return self._dict['domain']['devices']['interface'][1]['mac']['@address']
+        self._parse()
+        return self._secondaryMACAddress
 
     def disk1Image(self):
-        return self._dict['domain']['devices']['disk'][0]['source']['@file']
+        self._parse()
+        return self._disk1Image
 
     def disk2Image(self):
-        return self._dict['domain']['devices']['disk'][1]['source']['@file']
+        self._parse()
+        return self._disk2Image
+
+    def profile(self):
+        "The name of the domain profile, or None for manifests loaded from XML"
+        return None if self._profile is None else self._profile.name
+
+    def _parse(self):
+        if self._name is not None:
+            return
+        domain = xmltodict.parse(self._source)['domain']
+        assert domain['currentMemory']['@unit'] == "KiB"
+        devices = domain['devices']
+        self._memoryMB = int(domain['currentMemory']['#text']) / 1024
+        self._vcpus = int(domain['vcpu']['#text'])
+        self._disk1Image = devices['disk'][0]['source']['@file']
+        self._disk2Image = devices['disk'][1]['source']['@file']
+        self._primaryMACAddress = devices['interface'][0]['mac']['@address']
+        self._secondaryMACAddress = devices['interface'][1]['mac']['@address']
+        self._networkName = devices['interface'][0]['source']['@network']
+        self._serialOutputFilename = devices['serial']['source']['@path']
+        self._bootFromNetwork = domain['os']['boot']['@dev'] == 'network'
+        self._emulatorPath = devices['emulator']
+        self._name = domain['name']
+
+    @classmethod
+    def fromXML(cls, xml):
+        return cls(name=None, memoryMB=None, vcpus=None, disk1Image=None, disk2Image=None,
+                   primaryMACAddress=None, secondaryMACAddress=None, networkName=None,
+                   serialOutputFilename=None, bootFromNetwork=None, emulatorPath=None, source=xml)
 
     @classmethod
     def _findEmulatorPath(cls):
+        global _emulatorPath
+        if _emulatorPath is not None:
+            return _emulatorPath
         possiblePaths = ("/usr/bin/qemu-kvm", "/usr/libexec/qemu-kvm", "/usr/bin/qemu-system-x86_64")
         for _path in possiblePaths:
             if os.path.exists(_path):
+                _emulatorPath = _path
                 return _path
-        return Exception("No QEMU-KVM emulator found")
+        raise Exception("No QEMU-KVM emulator found")
 
     @classmethod
     def create(cls,
@@ -51,32 +145,66 @@ class Manifest:
                secondaryMACAddress,
                networkName,
                serialOutputFilename,
-               bootFromNetwork):
+               bootFromNetwork,
+               profile=None,
+               placementHint=0):
         assert name.startswith(config.DOMAIN_PREFIX)
         assert memoryMB > 0
         assert vcpus >= 1
-        emulatorPath = cls._findEmulatorPath()
-        return cls(_TEMPLATE % dict(
+        if profile is None:
+            profile = domainprofiles.get(config.DEFAULT_DOMAIN_PROFILE)
+        numaPlacement = domainprofiles.numaPlacement(placementHint) if profile.numaPinning else None
+        return cls(
             name=name,
-            memoryKB=memoryMB * 1024,
+            memoryMB=memoryMB,
             vcpus=vcpus,
             disk1Image=disk1Image,
             disk2Image=disk2Image,
             primaryMACAddress=primaryMACAddress,
             secondaryMACAddress=secondaryMACAddress,
-            networkName=config.NETWORK_NAME,
+            networkName=networkName,
             serialOutputFilename=serialOutputFilename,
-            bootDevice='network' if bootFromNetwork else 'hd',
-            emulatorPath=emulatorPath))
+            bootFromNetwork=bootFromNetwork,
+            emulatorPath=cls._findEmulatorPath(),
+            profile=profile,
+            numaPlacement=numaPlacement)
+
 
+def _diskDriver(profile):
+    driver = "cache='%s' io='%s'" % (profile.diskCache, profile.diskIO)
+    if profile.iothreads:
+        driver += " iothread='1'"
+    return driver
+
+_ADDRESS = "      <address type='pci' domain='0x0000' bus='0x00' slot='0x%02x' function='0x%x'/>\n"
+_MEMORY_BACKING = """  <memoryBacking>
+    <hugepages/>
+  </memoryBacking>
+"""
+_IOTHREADS = "  <iothreads>%d</iothreads>\n"
+_NUMATUNE = """  <numatune>
+    <memory mode='strict' nodeset='%d'/>
+  </numatune>
+"""
+_NIC_DRIVER = "      <driver name='vhost' queues='%d'/>\n"
+_GRAPHICS = """    <input type='mouse' bus='ps2'/>
+    <graphics type='vnc' port='-1' autoport='yes'/>
+    <video>
+      <model type='cirrus' vram='9216' heads='1'/>
+%(videoAddress)s    </video>
+"""
+_MEMBALLOON = """    <memballoon model='virtio'>
+%(memballoonAddress)s    </memballoon>
+"""
+_NO_MEMBALLOON = "    <memballoon model='none'/>\n"
 _TEMPLATE = """
 <domain type='kvm'>
   <name>%(name)s</name>
   <memory unit='KiB'>%(memoryKB)d</memory>
   <currentMemory unit='KiB'>%(memoryKB)d</currentMemory>
-  <vcpu placement='static'>%(vcpus)d</vcpu>
-  <os>
-    <type arch='x86_64' machine='pc'>hvm</type>
+%(memoryBacking)s  <vcpu placement='static'%(cpuset)s>%(vcpus)d</vcpu>
+%(iothreads)s%(numatune)s  <os>
+    <type arch='x86_64' machine='%(machine)s'>hvm</type>
     <boot dev='%(bootDevice)s'/>
   </os>
   <features>
@@ -94,33 +222,28 @@ _TEMPLATE = """
   <devices>
     <emulator>%(emulatorPath)s</emulator>
     <disk type='file' device='disk'>
-      <driver name='qemu' type='qcow2' cache='writeback' io='threads'/>
+      <driver name='qemu' type='qcow2' %(diskDriver)s/>
       <source file='%(disk1Image)s'/>
       <target dev='vda' bus='virtio'/>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x04' function='0x0'/>
-    </disk>
+%(disk1Address)s    </disk>
     <disk type='file' device='disk'>
-      <driver name='qemu' type='qcow2' cache='writeback' io='threads'/>
+      <driver name='qemu' type='qcow2' %(diskDriver)s/>
       <source file='%(disk2Image)s'/>
       <target dev='vdb' bus='virtio'/>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x06' function='0x0'/>
-    </disk>
+%(disk2Address)s    </disk>
     <controller type='usb' index='0'>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x01' function='0x2'/>
-    </controller>
-    <controller type='pci' index='0' model='pci-root'/>
+%(usbAddress)s    </controller>
+    <controller type='pci' index='0' model='%(pciRoot)s'/>
     <interface type='network'>
       <mac address='%(primaryMACAddress)s'/>
       <source network='%(networkName)s'/>
       <model type='virtio'/>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x03' function='0x0'/>
-    </interface>
+%(nicDriver)s%(primaryNICAddress)s    </interface>
     <interface type='network'>
       <mac address='%(secondaryMACAddress)s'/>
       <source network='%(networkName)s'/>
       <model type='virtio'/>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x07' function='0x0'/>
-    </interface>
+%(nicDriver)s%(secondaryNICAddress)s    </interface>
     <serial type='file'>
       <source path='%(serialOutputFilename)s'/>
       <target port='0'/>
@@ -129,15 +252,6 @@ _TEMPLATE = """
       <source path='%(serialOutputFilename)s'/>
       <target type='serial' port='0'/>
     </console>
-    <input type='mouse' bus='ps2'/>
-    <graphics type='vnc' port='-1' autoport='yes'/>
-    <video>
-      <model type='cirrus' vram='9216' heads='1'/>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x02' function='0x0'/>
-    </video>
-    <memballoon model='virtio'>
-      <address type='pci' domain='0x0000' bus='0x00' slot='0x05' function='0x0'/>
-    </memballoon>
-  </devices>
+%(graphics)s%(memballoon)s  </devices>
 </domain>
 """
@@ -32,17 +32,19 @@ def allNodesMACIPPairs():
 
 
 def setUp():
-    with libvirtsingleton.it().lock():
-        libvirt = libvirtsingleton.it().libvirt()
-        try:
-            libvirt.networkLookupByName(NAME)
-            logging.info("Libvirt network is already set up")
-        except:
-            _create(libvirt)
-            logging.info("Libvirt network created")
+    libvirtsingleton.it().call("setUpNetwork", _setUpNetwork)
     _openFirewall()
 
 
+def _setUpNetwork(libvirt):
+    try:
+        libvirt.networkLookupByName(NAME)
+        logging.info("Libvirt network is already set up")
+    except:
+        _create(libvirt)
+        logging.info("Libvirt network created")
+
+
 def _openFirewall():
     if not _firewallOpen():
         subprocess.check_call(["iptables", "-I", "INPUT", "-i", _BRIDGE_NAME, "-j", "ACCEPT"])
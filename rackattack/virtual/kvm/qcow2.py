@@ -0,0 +1,162 @@
+import struct
+
+# Writes qcow2 version 3 (compat=1.1) images with the same layout qemu-img 2.x creates them: the header
+# (and backing file name) at cluster 0, the refcount table at cluster 1, a single refcount block at
+# cluster 2, and the L1 table from cluster 3 on, which is not padded to a whole cluster.
+MAGIC = 'QFI\xfb'
+VERSION = 3
+CLUSTER_BITS = 16
+CLUSTER_SIZE = 1 << CLUSTER_BITS
+REFCOUNT_ORDER = 4
+_HEADER = struct.Struct(">4sIQIIQIIQQIIQQQQII")
+_EXTENSION = struct.Struct(">II")
+_EXTENSION_END = 0
+_EXTENSION_BACKING_FORMAT = 0xE2792ACA
+_EXTENSION_FEATURE_NAME_TABLE = 0x6803F857
+_FEATURE_NAME = struct.Struct(">BB46s")
+_FEATURE_INCOMPATIBLE = 0
+_FEATURE_COMPATIBLE = 1
+_FEATURE_NAMES = [
+    (_FEATURE_INCOMPATIBLE, 0, "dirty bit"),
+    (_FEATURE_INCOMPATIBLE, 1, "corrupt bit"),
+    (_FEATURE_COMPATIBLE, 0, "lazy refcounts")]
+_REFCOUNT_TABLE_OFFSET = CLUSTER_SIZE
+_REFCOUNT_BLOCK_OFFSET = 2 * CLUSTER_SIZE
+_L1_TABLE_OFFSET = 3 * CLUSTER_SIZE
+_ENTRIES_PER_L2_TABLE = CLUSTER_SIZE / 8
+_HEADER_READ_SIZE = 4096
+INCOMPATIBLE_DIRTY = 1 << 0
+INCOMPATIBLE_CORRUPT = 1 << 1
+
+
+class Header:
+    def __init__(self, version, size, clusterBits, l1Size, l1TableOffset, refcountTableOffset,
+                 incompatibleFeatures, backingFile, backingFormat):
+        self.version = version
+        self.size = size
+        self.clusterBits = clusterBits
+        self.l1Size = l1Size
+        self.l1TableOffset = l1TableOffset
+        self.refcountTableOffset = refcountTableOffset
+        self.incompatibleFeatures = incompatibleFeatures
+        self.backingFile = backingFile
+        self.backingFormat = backingFormat
+
+
+def create(filename, size, backingFile=None, backingFormat=None):
+    l1Size = _l1Size(size)
+    nrL1Clusters = (l1Size * 8 + CLUSTER_SIZE - 1) / CLUSTER_SIZE
+    with open(filename, "wb") as f:
+        f.write(_headerCluster(size, l1Size, backingFile, backingFormat))
+        f.write(_refcountTableCluster())
+        f.write(_refcountBlockCluster(nrClusters=3 + nrL1Clusters))
+        f.write('\0' * (l1Size * 8))
+
+
+def readHeader(filename):
+    with open(filename, "rb") as f:
+        data = f.read(_HEADER_READ_SIZE)
+        try:
+            return _parseHeader(data, filename)
+        except _Truncated:
+            if len(data) < _HEADER_READ_SIZE:
+                raise
+        data += f.read(CLUSTER_SIZE - len(data))
+    return _parseHeader(data, filename)
+
+
+class _Truncated(Exception):
+    pass
+
+
+def _parseHeader(data, filename):
+    if len(data) < _HEADER.size:
+        raise _Truncated("'%s' is too short to be a qcow2 image" % filename)
+    fields = _HEADER.unpack_from(data)
+    magic, version, backingFileOffset, backingFileSize, clusterBits, size = fields[:6]
+    l1Size, l1TableOffset, refcountTableOffset = fields[7:10]
+    if magic != MAGIC:
+        raise Exception("'%s' is not a qcow2 image" % filename)
+    if version not in (2, 3):
+        raise Exception("'%s' is of unsupported qcow2 version %d" % (filename, version))
+    backingFile = None
+    if backingFileOffset != 0:
+        if backingFileOffset + backingFileSize > len(data):
+            raise _Truncated("Backing file name of '%s' is out of its header" % filename)
+        backingFile = data[backingFileOffset: backingFileOffset + backingFileSize]
+    backingFormat = None
+    incompatibleFeatures = 0
+    if version == 3:
+        incompatibleFeatures = fields[13]
+        headerLength = fields[-1]
+        for extensionType, extensionData in _extensions(data, headerLength, filename):
+            if extensionType == _EXTENSION_BACKING_FORMAT:
+                backingFormat = extensionData
+    return Header(version=version, size=size, clusterBits=clusterBits, l1Size=l1Size,
+                  l1TableOffset=l1TableOffset, refcountTableOffset=refcountTableOffset,
+                  incompatibleFeatures=incompatibleFeatures, backingFile=backingFile,
+                  backingFormat=backingFormat)
+
+
+def _extensions(data, offset, filename):
+    while True:
+        if offset + _EXTENSION.size > len(data):
+            raise _Truncated("Header extensions of '%s' are out of its header" % filename)
+        extensionType, length = _EXTENSION.unpack_from(data, offset)
+        if extensionType == _EXTENSION_END:
+            return
+        offset += _EXTENSION.size
+        if offset + length > len(data):
+            raise _Truncated("Header extension of '%s' is out of its header" % filename)
+        yield extensionType, data[offset: offset + length]
+        offset += _alignedTo8(length)
+
+
+def _l1Size(size):
+    bytesPerL2Table = _ENTRIES_PER_L2_TABLE * CLUSTER_SIZE
+    return (size + bytesPerL2Table - 1) / bytesPerL2Table
+
+
+def _alignedTo8(length):
+    return (length + 7) & ~7
+
+
+def _extension(extensionType, data):
+    return _EXTENSION.pack(extensionType, len(data)) + data + '\0' * (_alignedTo8(len(data)) - len(data))
+
+
+def _headerCluster(size, l1Size, backingFile, backingFormat):
+    extensions = []
+    if backingFormat is not None:
+        extensions.append(_extension(_EXTENSION_BACKING_FORMAT, backingFormat))
+    featureNames = "".join(_FEATURE_NAME.pack(*feature) for feature in _FEATURE_NAMES)
+    extensions.append(_extension(_EXTENSION_FEATURE_NAME_TABLE, featureNames))
+    extensions.append(_EXTENSION.pack(_EXTENSION_END, 0))
+    extensions = "".join(extensions)
+    if backingFile is None:
+        backingFileOffset = 0
+        backingFileSize = 0
+        backingFile = ""
+    else:
+        backingFileOffset = _HEADER.size + len(extensions)
+        backingFileSize = len(backingFile)
+    header = _HEADER.pack(
+        MAGIC, VERSION, backingFileOffset, backingFileSize, CLUSTER_BITS, size, 0, l1Size,
+        _L1_TABLE_OFFSET if l1Size > 0 else 0, _REFCOUNT_TABLE_OFFSET, 1, 0, 0, 0, 0, 0, REFCOUNT_ORDER,
+        _HEADER.size)
+    cluster = header + extensions + backingFile
+    if len(cluster) > CLUSTER_SIZE:
+        raise Exception("Backing file name is too long: '%s'" % backingFile)
+    return cluster + '\0' * (CLUSTER_SIZE - len(cluster))
+
+
+def _refcountTableCluster():
+    entry = struct.pack(">Q", _REFCOUNT_BLOCK_OFFSET)
+    return entry + '\0' * (CLUSTER_SIZE - len(entry))
+
+
+def _refcountBlockCluster(nrClusters):
+    if nrClusters > CLUSTER_SIZE / 2:
+        raise Exception("Image is too large for a single refcount block")
+    refcounts = struct.pack(">%dH" % nrClusters, *([1] * nrClusters))
+    return refcounts + '\0' * (CLUSTER_SIZE - len(refcounts))
@@ -0,0 +1,166 @@
+import os
+import time
+import Queue
+import logging
+import libvirt
+import functools
+import itertools
+import threading
+import collections
+from rackattack.tcp import suicide
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import libvirtsingleton
+from rackattack.virtual.kvm import backingfiles
+
+_it = None
+
+
+def it():
+    global _it
+    if _it is None:
+        _it = Reaper()
+    return _it
+
+
+_Corpse = collections.namedtuple('_Corpse', ['index', 'domainName', 'filenames', 'backingFile', 'moved'])
+
+
+class Reaper(threading.Thread):
+    # Tears down destroyed VMs off the global lock. The index of a VM stays quarantined until its domain
+    # is undefined and its disk images are renamed aside, as the next VM at that index reuses both
+    # names. The renamed images are unlinked after the whole batch is torn down, optionally truncated
+    # gradually first, so the filesystem frees their extents in small steps, pausing between steps so
+    # that reaping does not saturate the disk. Only then the references to their backing files are
+    # released. A VM that failed to tear down keeps its index quarantined, and its teardown is retried
+    # with the next batch, at most every _RETRY_INTERVAL seconds. The images it already renamed aside are
+    # kept on the corpse, so that they are unlinked once the retry succeeds.
+    _MAX_BATCH = 16
+    _RETRY_INTERVAL = 5
+
+    def __init__(self):
+        self._queue = Queue.Queue()
+        self._condition = threading.Condition()
+        self._reaping = collections.Counter()
+        self._sequence = itertools.count()
+        self._nrReaped = 0
+        self._nrFailed = 0
+        self._failed = []
+        threading.Thread.__init__(self)
+        self.daemon = True
+        threading.Thread.start(self)
+
+    def reap(self, index, domainName, filenames, backingFile=None):
+        with self._condition:
+            self._reaping[index] += 1
+        self._queue.put(_Corpse(
+            index=index, domainName=domainName, filenames=filenames, backingFile=backingFile, moved=[]))
+
+    def reaping(self):
+        with self._condition:
+            return set(self._reaping)
+
+    def waitUntilReaped(self, index, timeout=None):
+        "Returns False if the index is still being reaped once timeout seconds elapsed"
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while index in self._reaping:
+                if deadline is None:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._condition:
+            return dict(reaping=len(self._reaping), queued=self._queue.qsize(), reaped=self._nrReaped,
+                        failed=self._nrFailed, retrying=len(self._failed))
+
+    def run(self):
+        try:
+            while True:
+                self._reapBatch(self._nextBatch())
+        except:
+            logging.exception("Reaper thread died")
+            suicide.killSelf()
+            raise
+
+    def _nextBatch(self):
+        batch, self._failed = self._failed, []
+        try:
+            batch.append(self._queue.get(timeout=self._RETRY_INTERVAL if batch else None))
+        except Queue.Empty:
+            pass
+        while len(batch) < self._MAX_BATCH:
+            try:
+                batch.append(self._queue.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    def _reapBatch(self, batch):
+        toUnlink = []
+        for corpse in batch:
+            try:
+                libvirtsingleton.it().call("destroyAndUndefine", functools.partial(
+                    _destroyAndUndefine, domainName=corpse.domainName))
+                for filename in corpse.filenames:
+                    if os.path.exists(filename):
+                        corpse.moved.append(self._moveAside(filename))
+            except:
+                logging.exception(
+                    "Unable to tear down '%(domain)s', index %(index)d stays quarantined until a retry "
+                    "succeeds", dict(domain=corpse.domainName, index=corpse.index))
+                with self._condition:
+                    self._nrFailed += 1
+                self._failed.append(corpse)
+                continue
+            toUnlink.append((corpse.moved, corpse.backingFile))
+            self._reaped(corpse.index)
+        for moved, backingFile in toUnlink:
+            for filename in moved:
+                self._unlink(filename)
+            if backingFile is not None:
+                backingfiles.it().release(backingFile)
+
+    def _reaped(self, index):
+        with self._condition:
+            self._reaping[index] -= 1
+            if self._reaping[index] == 0:
+                del self._reaping[index]
+            self._nrReaped += 1
+            self._condition.notifyAll()
+
+    def _moveAside(self, filename):
+        moved = "%s.reaped%d" % (filename, next(self._sequence))
+        os.rename(filename, moved)
+        return moved
+
+    def _unlink(self, filename):
+        step = config.REAPER_TRUNCATE_STEP_MB * 1024 * 1024
+        try:
+            if step > 0:
+                with open(filename, "r+b") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    while size > 0:
+                        size = max(0, size - step)
+                        f.truncate(size)
+                        time.sleep(config.REAPER_TRUNCATE_STEP_INTERVAL)
+            os.unlink(filename)
+        except:
+            logging.exception("Unable to unlink '%(filename)s'", dict(filename=filename))
+
+
+def _destroyAndUndefine(connection, domainName):
+    try:
+        domain = connection.lookupByName(domainName)
+    except libvirt.libvirtError as e:
+        if e.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+            raise
+        logging.warning("Domain '%(domain)s' is already gone", dict(domain=domainName))
+        return
+    if domain.isActive():
+        domain.destroy()
+    domain.undefine()
@@ -3,6 +3,9 @@ from rackattack.virtual.kvm import libvirtsingleton
 from rackattack.virtual.kvm import config
 from rackattack.virtual.kvm import network
 from rackattack.virtual.kvm import imagecommands
+from rackattack.virtual.kvm import backingfiles
+from rackattack.virtual.kvm import reaper
+from rackattack.virtual.kvm import domainprofiles
 import os
 import logging
 
@@ -11,15 +14,15 @@ class VM:
     _MAX_INDEX = 100
 
     def __init__(
-            self, index, requirement, domain,
-            manifest, disk1SizeGB, disk2SizeGB):
+            self, index, requirement,
+            manifest, disk1SizeGB, disk2SizeGB, backingFile=None):
         assert index < self._MAX_INDEX
         self._index = index
         self._requirement = requirement
-        self._domain = domain
         self._manifest = manifest
         self._disk1SizeGB = disk1SizeGB
         self._disk2SizeGB = disk2SizeGB
+        self._backingFile = backingFile
 
     def index(self):
         return self._index
@@ -40,20 +43,25 @@ class VM:
         return dict(hostname=self.ipAddress(), username="root", password=config.ROOT_PASSWORD, port=22)
 
     def coldRestart(self):
-        with libvirtsingleton.it().lock():
-            self._domain.destroy()
-            self._domain.create()
+        libvirtsingleton.it().domainCall(self.id(), "destroy")
+        libvirtsingleton.it().domainCall(self.id(), "create")
 
     def reconfigureBIOS(self):
         logging.warning("Should not be called for VM")
 
+    def start(self):
+        libvirtsingleton.it().domainCall(self.id(), "create")
+
     def destroy(self):
-        with libvirtsingleton.it().lock():
-            self._domain.destroy()
-            self._domain.undefine()
-        if os.path.exists(self._manifest.disk1Image()):
-            os.unlink(self._manifest.disk1Image())
-        os.unlink(self._manifest.disk2Image())
+        backingFile, self._backingFile = self._backingFile, None
+        reaper.it().reap(
+            index=self._index, domainName=self.id(),
+            filenames=[self._manifest.disk1Image(), self._manifest.disk2Image()], backingFile=backingFile)
+
+    def adoptBackingFile(self, reference):
+        "Takes over a reference to the image store file this VM's overlay was derived from"
+        assert self._backingFile is None
+        self._backingFile = reference
 
     def disk1Image(self):
         return self._manifest.disk1Image()
@@ -63,16 +71,28 @@ class VM:
         return os.path.join(config.SERIAL_LOGS_DIRECTORY, name + ".serial.txt")
 
     @classmethod
-    def createFromImageStore(cls, index, requirement, imageStore):
+    def createFromFrozenImage(cls, index, requirement, reference):
+        "Takes over reference, as returned by the image store"
+        return cls.startDefined(cls.defineFromFrozenImage(
+            index, requirement, frozenImage=reference.filename, reference=reference))
+
+    @classmethod
+    def defineFromFrozenImage(cls, index, requirement, frozenImage, reference=None):
+        "Takes over reference, the image store reference to frozenImage, if given"
         name = cls._nameFromIndex(index)
         image1 = os.path.join(config.DISK_IMAGES_DIRECTORY, name + "_disk1.qcow2")
-        frozenImage = imageStore.get(
-            sizeGB=requirement['hardwareConstraints']['minimumDisk1SizeGB'],
-            imageLabel=requirement['imageLabel'])
-        if not os.path.isdir(os.path.dirname(image1)):
-            os.makedirs(os.path.dirname(image1))
-        imagecommands.deriveCopyOnWrite(original=frozenImage, newImage=image1)
-        return cls._createFromGivenImage(index, requirement, image1, False)
+        try:
+            if not os.path.isdir(os.path.dirname(image1)):
+                os.makedirs(os.path.dirname(image1))
+            imagecommands.deriveCopyOnWrite(original=frozenImage, newImage=image1)
+            return cls._defineFromGivenImage(
+                index, requirement, image1, False, backingFile=reference)
+        except:
+            if os.path.exists(image1):
+                os.unlink(image1)
+            if reference is not None:
+                backingfiles.it().release(reference)
+            raise
 
     @classmethod
     def createFromNewImage(cls, index, requirement):
@@ -82,10 +102,19 @@ class VM:
             os.makedirs(os.path.dirname(image1))
         imagecommands.create(
             image=image1, sizeGB=requirement['hardwareConstraints']['minimumDisk1SizeGB'])
-        return cls._createFromGivenImage(index, requirement, image1, True)
+        return cls.startDefined(cls._defineFromGivenImage(index, requirement, image1, True))
+
+    @classmethod
+    def startDefined(cls, instance):
+        try:
+            instance.start()
+        except:
+            instance.destroy()
+            raise
+        return instance
 
     @classmethod
-    def _createFromGivenImage(cls, index, requirement, image1, bootFromNetwork):
+    def _defineFromGivenImage(cls, index, requirement, image1, bootFromNetwork, backingFile=None):
         name = cls._nameFromIndex(index)
         image2 = os.path.join(config.DISK_IMAGES_DIRECTORY, name + "_disk2.qcow2")
         serialLog = os.path.join(config.SERIAL_LOGS_DIRECTORY, name + ".serial.txt")
@@ -104,14 +133,15 @@ class VM:
             secondaryMACAddress=network.secondMACAddressFromVMIndex(index),
             networkName=network.NAME,
             serialOutputFilename=serialLog,
-            bootFromNetwork=bootFromNetwork)
-        with libvirtsingleton.it().lock():
-            domain = libvirtsingleton.it().libvirt().defineXML(mani.xml())
-            domain.create()
+            bootFromNetwork=bootFromNetwork,
+            profile=domainprofiles.fromRequirement(requirement),
+            placementHint=index)
+        xml = mani.xml()
+        libvirtsingleton.it().call("defineXML", lambda connection: connection.defineXML(xml))
         return cls(
-            index=index, domain=domain, requirement=requirement, manifest=mani,
+            index=index, requirement=requirement, manifest=mani,
             disk1SizeGB=hardwareConstraints['minimumDisk1SizeGB'],
-            disk2SizeGB=hardwareConstraints['minimumDisk2SizeGB'])
+            disk2SizeGB=hardwareConstraints['minimumDisk2SizeGB'], backingFile=backingFile)
 
     @classmethod
     def _nameFromIndex(cls, index):
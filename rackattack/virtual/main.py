@@ -10,12 +10,18 @@ from rackattack.virtual.kvm import config
 from rackattack.virtual.kvm import network
 from rackattack.virtual.kvm import vm
 from rackattack.virtual.kvm import imagestore
+from rackattack.virtual.kvm import imageeviction
+from rackattack.virtual.kvm import domainprofiles
 from rackattack.common import dnsmasq
 from rackattack.common import globallock
 from rackattack.common import tftpboot
 from rackattack.common import inaugurate
 from rackattack.common import timer
+from rackattack.common import heartbeatmonitor
+from rackattack.common import workerpool
 from rackattack.virtual.alloc import allocations
+from rackattack.virtual.alloc import vmindices
+from rackattack.virtual.alloc import warmpool
 from rackattack.tcp import publish
 from rackattack.tcp import transportserver
 from twisted.internet import reactor
@@ -30,6 +36,10 @@ parser.add_argument("--requestPort", default=config.DEFAULT_REQUEST_PORT, type=i
 parser.add_argument("--subscribePort", default=1015, type=int)
 parser.add_argument("--httpPort", default=1016, type=int)
 parser.add_argument("--maximumVMs", type=int)
+parser.add_argument("--warmPoolVMsPerClass", type=int)
+parser.add_argument("--warmPoolClasses", type=int)
+parser.add_argument("--imageBuilders", type=int)
+parser.add_argument("--defaultDomainProfile")
 parser.add_argument("--diskImagesDirectory")
 parser.add_argument("--serialLogsDirectory")
 parser.add_argument("--managedPostMortemPacksDirectory")
@@ -38,6 +48,14 @@ args = parser.parse_args()
 
 if args.maximumVMs:
     config.MAXIMUM_VMS = args.maximumVMs
+if args.warmPoolVMsPerClass is not None:
+    config.WARM_POOL_VMS_PER_CLASS = args.warmPoolVMsPerClass
+if args.warmPoolClasses is not None:
+    config.WARM_POOL_CLASSES = args.warmPoolClasses
+if args.imageBuilders:
+    config.IMAGE_BUILDERS = args.imageBuilders
+if args.defaultDomainProfile:
+    config.DEFAULT_DOMAIN_PROFILE = domainprofiles.get(args.defaultDomainProfile).name
 if args.diskImagesDirectory:
     config.DISK_IMAGES_DIRECTORY = args.diskImagesDirectory
 if args.serialLogsDirectory:
@@ -49,7 +67,8 @@ if args.rabbitMQDirectory:
 
 cleanup.cleanup()
 atexit.register(cleanup.cleanup)
-timer.TimersThread()
+timer.TimersThread(maxTimersPerBatch=config.TIMERS_MAX_PER_BATCH,
+                   lateThreshold=config.TIMERS_LATE_THRESHOLD)
 network.setUp()
 tftpbootInstance = tftpboot.TFTPBoot(
     netmask=network.NETMASK,
@@ -73,19 +92,26 @@ reclamationServer = reclaimhost.VirtualReclamationServer()
 reclaimHost = reclaimhost.ReclaimHost(None,
                                       config.RECLAMATION_REQUESTS_FIFO_PATH,
                                       config.SOFT_RECLAMATION_FAILURE_MSG_FIFO_PATH)
-for mac, ip in network.allNodesMACIPPairs():
-    dnsmasqInstance.add(mac, ip)
+dnsmasqInstance.addMany(network.allNodesMACIPPairs())
 inaugurateInstance = inaugurate.Inaugurate(config.RABBIT_MQ_DIRECTORY)
 imageStore = imagestore.ImageStore()
+imageeviction.ImageEviction(imageStore=imageStore)
 buildImageThread = buildimagethread.BuildImageThread(
     inaugurate=inaugurateInstance, tftpboot=tftpbootInstance, dnsmasq=dnsmasqInstance,
     imageStore=imageStore, reclaimHost=reclaimHost)
 publishInstance = publish.Publish("ampq://localhost:%d/%%2F" % inaugurator.server.config.PORT)
 allVMs = dict()
+vmIndices = vmindices.VMIndices(allVMs, excluded=buildImageThread.vmIndices())
+heartbeatMonitor = heartbeatmonitor.HeartbeatMonitor()
+vmCreationPool = workerpool.WorkerPool(nrWorkers=config.VM_CREATION_WORKERS, name="vmCreation")
+warmPool = warmpool.WarmPool(imageStore=imageStore, vmIndices=vmIndices, vmCreationPool=vmCreationPool)
 allocationsInstance = allocations.Allocations(
     dnsmasq=dnsmasqInstance, broadcaster=publishInstance, buildImageThread=buildImageThread,
-    imageStore=imageStore, allVMs=allVMs)
-ipcServer = ipcserver.IPCServer(dnsmasq=dnsmasqInstance, allocations=allocationsInstance)
+    imageStore=imageStore, allVMs=allVMs, heartbeatMonitor=heartbeatMonitor, vmIndices=vmIndices,
+    vmCreationPool=vmCreationPool, warmPool=warmPool)
+ipcServer = ipcserver.IPCServer(
+    dnsmasq=dnsmasqInstance, allocations=allocationsInstance, heartbeatMonitor=heartbeatMonitor,
+    warmPool=warmPool, imageStore=imageStore, reclamationServer=reclamationServer)
 
 
 def serialLogFilename(vmID):
@@ -24,6 +24,9 @@ class VirtualReclamationServer(threading.Thread):
     def run(self):
         self._reclamationserver.run()
 
+    def stats(self):
+        return self._reclamationserver.stats()
+
 
 class ReclaimHost(reclaimhostspooler.ReclaimHostSpooler):
     def __init__(self, *args, **kwargs):
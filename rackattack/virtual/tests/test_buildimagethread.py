@@ -0,0 +1,111 @@
+import mock
+import unittest
+import threading
+from rackattack.common import globallock
+from rackattack.virtual import buildimagethread
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(threading.Thread, "start"):
+            self.tested = buildimagethread.BuildImageThread(
+                inaugurate=None, tftpboot=None, dnsmasq=None, imageStore=None, reclaimHost=None)
+        self.reports = []
+        self.origRun = buildimagethread.sh.run
+
+    def tearDown(self):
+        buildimagethread.sh.run = self.origRun
+
+    def callback(self, name):
+        return lambda complete, message: self.reports.append((name, complete))
+
+    def enqueue(self, name, label="label", sizeGB=16):
+        with globallock.lock():
+            self.tested.enqueue(label=label, sizeGB=sizeGB, callback=self.callback(name))
+
+    def test_BuildersHaveDistinctVMIndices(self):
+        indices = self.tested.vmIndices()
+        self.assertEquals(len(indices), buildimagethread.config.IMAGE_BUILDERS)
+        self.assertEquals(len(set(indices)), len(indices))
+
+    def test_DuplicateRequestsShareOneBuild(self):
+        self.enqueue("first")
+        self.enqueue("second")
+        self.enqueue("other size", sizeGB=32)
+        self.assertEquals(self.tested._localizeQueue.qsize(), 2)
+        buildimagethread.sh.run = lambda args: None
+        self.tested._work()
+        job = self.tested._buildQueue.get_nowait()
+        del self.reports[:]
+        with globallock.lock():
+            self.tested._jobFinished(job, True, "done")
+        self.assertEquals(self.reports, [("first", True), ("second", True)])
+        self.enqueue("third")
+        self.assertEquals(self.tested._localizeQueue.qsize(), 2)
+
+    def test_LocalizationFailureIsReportedToAllWaiters(self):
+        self.enqueue("first")
+        self.enqueue("second")
+
+        def fail(args):
+            raise Exception("ignore me")
+        buildimagethread.sh.run = fail
+        self.tested._work()
+        self.assertEquals([report for report in self.reports if report[1] is not None],
+                          [("first", False), ("second", False)])
+        self.assertEquals(self.tested._buildQueue.qsize(), 0)
+
+    def test_LateRequesterGetsTheLastProgressMessage(self):
+        self.enqueue("first")
+        buildimagethread.sh.run = lambda args: None
+        self.tested._work()
+        messages = []
+        with globallock.lock():
+            self.tested.enqueue(label="label", sizeGB=16,
+                                callback=lambda complete, message: messages.append(message))
+        self.assertEquals(messages, ["Done localizing label label, Building image using inaugurator"])
+
+    def test_BuildIsCancelledOnlyWhenAllRequestersDetached(self):
+        first = self.callback("first")
+        second = self.callback("second")
+        with globallock.lock():
+            self.tested.enqueue(label="label", sizeGB=16, callback=first)
+            self.tested.enqueue(label="label", sizeGB=16, callback=second)
+            self.tested.detach(label="label", sizeGB=16, callback=first)
+        self.assertFalse(self.tested._localizeQueue.queue[0].cancelled)
+        with globallock.lock():
+            self.tested.detach(label="label", sizeGB=16, callback=second)
+        self.assertTrue(self.tested._localizeQueue.queue[0].cancelled)
+        buildimagethread.sh.run = mock.Mock()
+        self.tested._work()
+        self.assertFalse(buildimagethread.sh.run.called)
+        self.enqueue("third")
+        self.assertEquals(self.tested._localizeQueue.qsize(), 1)
+
+    def test_BuildFailsWhenTheBuilderVMIsNotTornDownInTime(self):
+        self.enqueue("first")
+        job = self.tested._localizeQueue.get_nowait()
+        builder = self.tested._builders[0]
+        builder._buildQueue.put(job)
+        fakeReaper = mock.Mock()
+        fakeReaper.waitUntilReaped.return_value = False
+        with mock.patch.object(buildimagethread.reaper, "it", lambda: fakeReaper):
+            builder._work()
+        fakeReaper.waitUntilReaped.assert_called_once_with(
+            builder.index(), timeout=buildimagethread.config.REAPER_WAIT_TIMEOUT)
+        self.assertEquals([report for report in self.reports if report[1] is not None], [("first", False)])
+
+    def test_CancellationWakesUpTheBuilder(self):
+        self.enqueue("first")
+        job = self.tested._localizeQueue.get_nowait()
+        woken = []
+        job.cancelCallback = lambda: woken.append(True)
+        with globallock.lock():
+            self.tested.detach(label="label", sizeGB=16, callback=self.callback("unknown"))
+            self.assertEquals(woken, [])
+            self.tested.detach(label="label", sizeGB=16, callback=job.callbacks[0])
+        self.assertEquals(woken, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
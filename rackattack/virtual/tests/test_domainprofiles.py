@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import domainprofiles
+
+
+def requirement(**hardwareConstraints):
+    return dict(imageLabel="label", hardwareConstraints=hardwareConstraints)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.origNodesGlob = domainprofiles._NODES_GLOB
+        self.origDefault = config.DEFAULT_DOMAIN_PROFILE
+        domainprofiles._NODES_GLOB = os.path.join(self.tempDir, "node[0-9]*")
+        domainprofiles._numaNodes = None
+
+    def tearDown(self):
+        domainprofiles._NODES_GLOB = self.origNodesGlob
+        domainprofiles._numaNodes = None
+        config.DEFAULT_DOMAIN_PROFILE = self.origDefault
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def addNode(self, number, cpulist):
+        os.makedirs(os.path.join(self.tempDir, "node%d" % number))
+        with open(os.path.join(self.tempDir, "node%d" % number, "cpulist"), "w") as f:
+            f.write(cpulist + "\n")
+
+    def test_ProfileSelectedByRequirement(self):
+        self.assertEquals(domainprofiles.fromRequirement(requirement(domainProfile="q35")).machine, "q35")
+        self.assertEquals(domainprofiles.fromRequirement(requirement()).name, "default")
+        config.DEFAULT_DOMAIN_PROFILE = "io"
+        self.assertEquals(domainprofiles.fromRequirement(requirement()).name, "io")
+
+    def test_UnknownProfile(self):
+        self.assertRaises(ValueError, domainprofiles.fromRequirement, requirement(domainProfile="fast"))
+
+    def test_VMsSpreadAcrossNUMANodes(self):
+        self.addNode(1, "8-15")
+        self.addNode(0, "0-7")
+        self.assertEquals(domainprofiles.numaPlacement(0), (0, "0-7"))
+        self.assertEquals(domainprofiles.numaPlacement(1), (1, "8-15"))
+        self.assertEquals(domainprofiles.numaPlacement(2), (0, "0-7"))
+
+    def test_NoNUMATopology(self):
+        self.assertIsNone(domainprofiles.numaPlacement(0))
+
+    def test_TopologyReadOncePerProcess(self):
+        self.addNode(0, "0-7")
+        domainprofiles.numaNodes()
+        self.addNode(1, "8-15")
+        self.assertEquals(domainprofiles.numaNodes(), [(0, "0-7")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import mock
+import shutil
+import tempfile
+import unittest
+import threading
+from rackattack.common import globallock
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import qcow2
+from rackattack.virtual.kvm import imagestore
+from rackattack.virtual.kvm import backingfiles
+from rackattack.virtual.kvm import imageeviction
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.origConfig = dict((name, getattr(config, name)) for name in [
+            'IMAGE_STORE_DIRECTORY', 'IMAGE_STORE_LAST_USED', 'IMAGE_STORE_LAST_USED_JOURNAL',
+            'IMAGE_STORE_INDEX', 'IMAGE_STORE_QUARANTINE_DIRECTORY', 'DISK_IMAGES_DIRECTORY',
+            'MAXIMUM_DISK_IMAGES'])
+        config.IMAGE_STORE_DIRECTORY = os.path.join(self.tempDir, "imagestore")
+        config.IMAGE_STORE_LAST_USED = os.path.join(config.IMAGE_STORE_DIRECTORY, "lastused.json")
+        config.IMAGE_STORE_LAST_USED_JOURNAL = os.path.join(config.IMAGE_STORE_DIRECTORY, "lastused.journal")
+        config.IMAGE_STORE_INDEX = os.path.join(config.IMAGE_STORE_DIRECTORY, "index.json")
+        config.IMAGE_STORE_QUARANTINE_DIRECTORY = os.path.join(config.IMAGE_STORE_DIRECTORY, "quarantine")
+        config.DISK_IMAGES_DIRECTORY = os.path.join(self.tempDir, "diskimages")
+        config.MAXIMUM_DISK_IMAGES = 10
+        os.makedirs(config.IMAGE_STORE_DIRECTORY)
+        os.makedirs(config.DISK_IMAGES_DIRECTORY)
+        self.now = 100000
+        self.origTimes = (imageeviction.time.time, imagestore.lastused.time.time)
+        imageeviction.time.time = imagestore.lastused.time.time = lambda: self.now
+        backingfiles._it = None
+        with mock.patch.object(threading.Thread, "start"):
+            self.imageStore = imagestore.ImageStore()
+            self.tested = imageeviction.ImageEviction(imageStore=self.imageStore)
+        self.freeSpaceRatios = []
+        self.tested._freeSpaceRatio = lambda: self.freeSpaceRatios.pop(0) if self.freeSpaceRatios else 0.5
+
+    def tearDown(self):
+        imageeviction.time.time, imagestore.lastused.time.time = self.origTimes
+        for name, value in self.origConfig.iteritems():
+            setattr(config, name, value)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+        backingfiles._it = None
+
+    def put(self, label, usedSecondsAgo):
+        filename = os.path.join(self.tempDir, "new.qcow2")
+        qcow2.create(filename, 1024 ** 3)
+        now = self.now
+        self.now -= usedSecondsAgo
+        with globallock.lock():
+            self.imageStore.put(filename=filename, imageLabel=label, sizeGB=1)
+        self.now = now
+
+    def labels(self):
+        with globallock.lock():
+            return [label for _, label, _, _ in self.imageStore.leastRecentlyUsed()]
+
+    def test_EvictsImagesUnusedForTooLong(self):
+        self.put("old", usedSecondsAgo=config.ERASE_IF_IMAGE_UNUSED_FOR + 1)
+        self.put("new", usedSecondsAgo=1000)
+        self.tested._evict()
+        self.assertEquals(self.labels(), ["new"])
+        self.assertEquals(os.listdir(config.IMAGE_STORE_DIRECTORY).count("old____1GB.qcow2"), 0)
+
+    def test_EnforcesMaximumNumberOfImagesLeastRecentlyUsedFirst(self):
+        config.MAXIMUM_DISK_IMAGES = 2
+        self.put("b", usedSecondsAgo=2000)
+        self.put("a", usedSecondsAgo=3000)
+        self.put("c", usedSecondsAgo=1000)
+        self.tested._evict()
+        self.assertEquals(self.labels(), ["b", "c"])
+        with globallock.lock():
+            self.assertEquals(self.imageStore.stats()['evictions'], {"too many images": 1})
+
+    def test_EvictsUntilHighWatermarkOnceBelowLowWatermark(self):
+        for label, ago in [("a", 4000), ("b", 3000), ("c", 2000), ("d", 1000)]:
+            self.put(label, usedSecondsAgo=ago)
+        self.freeSpaceRatios = [0.05, 0.1, 0.15, 0.25]
+        self.tested._evict()
+        self.assertEquals(self.labels(), ["c", "d"])
+
+    def test_DoesNotEvictAboveLowWatermark(self):
+        self.put("a", usedSecondsAgo=4000)
+        self.freeSpaceRatios = [0.15]
+        self.tested._evict()
+        self.assertEquals(self.labels(), ["a"])
+
+    def test_ReferencedImagesAreNotEvictedForDiskSpace(self):
+        self.put("referenced", usedSecondsAgo=4000)
+        self.put("unreferenced", usedSecondsAgo=3000)
+        with globallock.lock():
+            self.imageStore.get("referenced", 1)
+        self.now += 5000
+        self.freeSpaceRatios = [0.05, 0.1, 0.1]
+        self.tested._evict()
+        self.assertEquals(self.labels(), ["referenced"])
+
+    def test_ReferencedImagesAreNotEvictedByAgeOrCount(self):
+        config.MAXIMUM_DISK_IMAGES = 1
+        self.put("referenced", usedSecondsAgo=0)
+        self.put("unreferenced", usedSecondsAgo=0)
+        with globallock.lock():
+            reference = self.imageStore.get("referenced", 1)
+        self.now += config.ERASE_IF_IMAGE_UNUSED_FOR + 1
+        self.tested._evict()
+        self.assertEquals(self.labels(), ["referenced"])
+        backingfiles.it().release(reference)
+        self.tested._evict()
+        self.assertEquals(self.labels(), [])
+
+    def test_CondemningAReferencedImageIsRefused(self):
+        self.put("referenced", usedSecondsAgo=0)
+        with globallock.lock():
+            reference = self.imageStore.get("referenced", 1)
+        self.assertRaises(AssertionError, backingfiles.it().condemn, reference.filename)
+        self.assertTrue(os.path.exists(reference.filename))
+        backingfiles.it().release(reference)
+        backingfiles.it().condemn(reference.filename)
+        self.assertFalse(os.path.exists(reference.filename))
+        self.assertEquals(backingfiles.it().stats(), dict(referenced=0, references=0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import qcow2
+from rackattack.virtual.kvm import imageindex
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.origConfig = dict((name, getattr(config, name)) for name in [
+            'IMAGE_STORE_DIRECTORY', 'IMAGE_STORE_INDEX', 'IMAGE_STORE_QUARANTINE_DIRECTORY'])
+        config.IMAGE_STORE_DIRECTORY = self.tempDir
+        config.IMAGE_STORE_INDEX = os.path.join(self.tempDir, "index.json")
+        config.IMAGE_STORE_QUARANTINE_DIRECTORY = os.path.join(self.tempDir, "quarantine")
+        self.validated = []
+        self.origValidate = imageindex._validate
+
+        def validate(filename, ** kwargs):
+            self.validated.append(os.path.basename(filename))
+            return self.origValidate(filename, ** kwargs)
+        imageindex._validate = validate
+
+    def tearDown(self):
+        imageindex._validate = self.origValidate
+        for name, value in self.origConfig.iteritems():
+            setattr(config, name, value)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def create(self, basename, sizeGB=1):
+        filename = os.path.join(self.tempDir, basename)
+        qcow2.create(filename, sizeGB * 1024 ** 3)
+        return filename
+
+    def quarantined(self):
+        if not os.path.isdir(config.IMAGE_STORE_QUARANTINE_DIRECTORY):
+            return []
+        return sorted(os.listdir(config.IMAGE_STORE_QUARANTINE_DIRECTORY))
+
+    def test_ValidImagesAreFound(self):
+        filename = self.create("label____1GB.qcow2")
+        self.assertEquals(imageindex.scan(), {("label", 1): filename})
+        self.assertEquals(self.quarantined(), [])
+
+    def test_InvalidImagesAreQuarantined(self):
+        self.create("wrongsize____2GB.qcow2", sizeGB=1)
+        truncated = self.create("truncated____1GB.qcow2")
+        with open(truncated, "r+b") as f:
+            f.truncate(qcow2.CLUSTER_SIZE)
+        dirty = self.create("dirty____1GB.qcow2")
+        with open(dirty, "r+b") as f:
+            f.seek(72)
+            f.write(struct.pack(">Q", qcow2.INCOMPATIBLE_DIRTY))
+        with open(os.path.join(self.tempDir, "notqcow2____1GB.qcow2"), "wb") as f:
+            f.write("\0" * 4096)
+        self.create("halfrenamed.qcow2")
+        self.create("label____1GB.qcow2")
+        self.assertEquals(imageindex.scan().keys(), [("label", 1)])
+        self.assertEquals(self.quarantined(), [
+            "dirty____1GB.qcow2", "halfrenamed.qcow2", "notqcow2____1GB.qcow2", "truncated____1GB.qcow2",
+            "wrongsize____2GB.qcow2"])
+
+    def test_UnchangedImagesAreNotRevalidated(self):
+        self.create("a____1GB.qcow2")
+        self.create("b____1GB.qcow2")
+        imageindex.scan()
+        self.assertEquals(sorted(self.validated), ["a____1GB.qcow2", "b____1GB.qcow2"])
+        del self.validated[:]
+        os.unlink(os.path.join(self.tempDir, "b____1GB.qcow2"))
+        self.create("b____1GB.qcow2", sizeGB=2)
+        os.utime(os.path.join(self.tempDir, "b____1GB.qcow2"), (0, 0))
+        self.assertEquals(imageindex.scan().keys(), [("a", 1)])
+        self.assertEquals(self.validated, ["b____1GB.qcow2"])
+        self.assertEquals(self.quarantined(), ["b____1GB.qcow2"])
+
+    def test_CorruptIndexIsIgnored(self):
+        self.create("a____1GB.qcow2")
+        with open(config.IMAGE_STORE_INDEX, "w") as f:
+            f.write("{")
+        self.assertEquals(imageindex.scan().keys(), [("a", 1)])
+        self.assertEquals(self.validated, ["a____1GB.qcow2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
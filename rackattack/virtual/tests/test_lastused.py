@@ -0,0 +1,87 @@
+import os
+import mock
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+from rackattack.virtual.kvm import lastused
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.tempDir, "lastused.json")
+        self.journal = os.path.join(self.tempDir, "lastused.journal")
+        self.now = 1000.5
+        self.origTime = lastused.time.time
+        lastused.time.time = lambda: self.now
+
+    def tearDown(self):
+        lastused.time.time = self.origTime
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def create(self):
+        with mock.patch.object(threading.Thread, "start"):
+            return lastused.LastUsed(snapshotFilename=self.snapshot, journalFilename=self.journal)
+
+    def test_TouchedTimesSurviveRestart(self):
+        tested = self.create()
+        tested.touch("a")
+        self.now = 2000.25
+        tested.touch("b")
+        self.assertEquals(tested.get("a"), 1000.5)
+        tested.flush()
+        self.assertFalse(os.path.exists(self.snapshot))
+        tested = self.create()
+        self.assertEquals(tested.get("a"), 1000.5)
+        self.assertEquals(tested.get("b"), 2000.25)
+        self.assertEquals(tested.get("c", 7), 7)
+
+    def test_RemovedKeysStayRemovedAfterRestart(self):
+        tested = self.create()
+        tested.touch("a")
+        tested.remove("a")
+        tested.remove("never touched")
+        tested.flush()
+        self.assertIsNone(self.create().get("a"))
+
+    def test_CompactionFoldsTheJournalIntoTheSnapshot(self):
+        tested = self.create()
+        for i in xrange(lastused.LastUsed._COMPACT_AFTER_RECORDS):
+            tested.touch("key%d" % (i % 3))
+        tested.flush()
+        with open(self.snapshot) as f:
+            self.assertEquals(sorted(json.load(f)), ["key0", "key1", "key2"])
+        self.assertEquals(os.path.getsize(self.journal), 0)
+        self.assertFalse(os.path.exists(self.snapshot + ".tmp"))
+        self.now = 3000
+        tested.touch("key0")
+        tested.flush()
+        tested = self.create()
+        self.assertEquals(tested.get("key0"), 3000)
+        self.assertEquals(tested.get("key1"), 1000.5)
+
+    def test_LegacySnapshotIsLoaded(self):
+        with open(self.snapshot, "w") as f:
+            json.dump({"label____16": 500}, f)
+        self.assertEquals(self.create().get("label____16"), 500)
+
+    def test_TornJournalRecordIsDropped(self):
+        tested = self.create()
+        tested.touch("a")
+        tested.flush()
+        with open(self.journal, "a") as f:
+            f.write("b\t10")
+        tested = self.create()
+        self.assertEquals(tested.get("a"), 1000.5)
+        self.assertIsNone(tested.get("b"))
+        tested.touch("c")
+        tested.flush()
+        tested = self.create()
+        self.assertEquals(tested.get("a"), 1000.5)
+        self.assertEquals(tested.get("c"), 1000.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
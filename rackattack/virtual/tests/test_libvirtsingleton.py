@@ -0,0 +1,108 @@
+import unittest
+import mock
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import libvirtsingleton
+
+
+class FakeDomain:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        self.connection.calls.append("create")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.calls = []
+
+    def isAlive(self):
+        return 1 if self.alive else 0
+
+    def close(self):
+        self.closed = True
+
+    def lookupByName(self, name):
+        self.calls.append("lookupByName:" + name)
+        return FakeDomain(self)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.origConnections = config.LIBVIRT_CONNECTIONS
+        config.LIBVIRT_CONNECTIONS = 1
+        self.opened = []
+        self.openPatch = mock.patch.object(libvirtsingleton.libvirt, "open", self.open, create=True)
+        self.openPatch.start()
+        libvirtsingleton._it = None
+        self.tested = libvirtsingleton.it()
+
+    def tearDown(self):
+        self.openPatch.stop()
+        libvirtsingleton._it = None
+        config.LIBVIRT_CONNECTIONS = self.origConnections
+
+    def open(self, uri):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_ConnectionsOpenedOnFirstUseAndReused(self):
+        self.assertEquals(len(self.opened), 0)
+        self.tested.domainCall("rackattack-vm1", "create")
+        self.tested.domainCall("rackattack-vm2", "create")
+        self.assertEquals(len(self.opened), 1)
+        self.assertEquals(self.opened[0].calls, [
+            "lookupByName:rackattack-vm1", "create", "lookupByName:rackattack-vm2", "create"])
+        self.assertEquals(self.tested.stats()['connectionsOpened'], 1)
+
+    def test_ReconnectsIfConnectionFoundDead(self):
+        self.tested.call("first", lambda connection: None)
+        self.opened[0].alive = False
+        self.tested.call("second", lambda connection: None)
+        self.assertEquals(len(self.opened), 2)
+        self.assertTrue(self.opened[0].closed)
+        self.assertEquals(self.tested.stats()['connectionsOpened'], 2)
+
+    def test_ConnectionThatDiedDuringCallIsReplaced(self):
+        def fail(connection):
+            connection.alive = False
+            raise libvirtsingleton.libvirt.libvirtError("connection lost")
+        with self.assertRaises(libvirtsingleton.libvirt.libvirtError):
+            self.tested.call("failing", fail)
+        self.assertTrue(self.opened[0].closed)
+        self.tested.call("next", lambda connection: None)
+        self.assertEquals(len(self.opened), 2)
+
+    def test_ErrorOnAliveConnectionKeepsIt(self):
+        def fail(connection):
+            raise libvirtsingleton.libvirt.libvirtError("no such domain")
+        with self.assertRaises(libvirtsingleton.libvirt.libvirtError):
+            self.tested.call("failing", fail)
+        self.tested.call("next", lambda connection: None)
+        self.assertEquals(len(self.opened), 1)
+        self.assertFalse(self.opened[0].closed)
+
+    def test_FailureToConnectDoesNotLeakPoolSlot(self):
+        def refuse(uri):
+            raise libvirtsingleton.libvirt.libvirtError("refused")
+        with mock.patch.object(libvirtsingleton.libvirt, "open", refuse):
+            with self.assertRaises(libvirtsingleton.libvirt.libvirtError):
+                self.tested.call("refused", lambda connection: None)
+        self.tested.call("next", lambda connection: None)
+        self.assertEquals(len(self.opened), 1)
+
+    def test_LatencyRecordedPerCall(self):
+        self.tested.domainCall("rackattack-vm1", "create")
+        self.tested.domainCall("rackattack-vm1", "create")
+        self.tested.call("defineXML", lambda connection: None)
+        calls = self.tested.stats()['calls']
+        self.assertEquals(set(calls.keys()), set(["create", "defineXML"]))
+        self.assertEquals(calls['create']['count'], 2)
+        self.assertEquals(calls['defineXML']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
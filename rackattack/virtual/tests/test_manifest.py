@@ -0,0 +1,97 @@
+import mock
+import unittest
+from rackattack.virtual.kvm import manifest
+from rackattack.virtual.kvm import domainprofiles
+
+
+def create(bootFromNetwork=False, profile=None):
+    return manifest.Manifest.create(
+        name="rackattack-vm3", memoryMB=2048, vcpus=2, disk1Image="/images/disk1.qcow2",
+        disk2Image="/images/disk2.qcow2", primaryMACAddress="52:54:00:00:00:03",
+        secondaryMACAddress="52:54:00:00:01:03", networkName="rackattacknet",
+        serialOutputFilename="/logs/rackattack-vm3.serial.txt", bootFromNetwork=bootFromNetwork,
+        profile=profile if profile is None else domainprofiles.get(profile), placementHint=3)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.origEmulatorPath = manifest._emulatorPath
+        manifest._emulatorPath = "/usr/bin/qemu-kvm"
+        domainprofiles._numaNodes = [(0, "0-7"), (1, "8-15")]
+
+    def tearDown(self):
+        manifest._emulatorPath = self.origEmulatorPath
+        domainprofiles._numaNodes = None
+
+    def test_LoadedManifestMatchesCreatedOne(self):
+        created = create()
+        loaded = manifest.Manifest.fromXML(created.xml())
+        for accessor in ['name', 'vcpus', 'memoryMB', 'primaryMACAddress', 'secondaryMACAddress',
+                         'disk1Image', 'disk2Image']:
+            self.assertEquals(getattr(loaded, accessor)(), getattr(created, accessor)())
+        self.assertEquals(loaded.name(), "rackattack-vm3")
+        self.assertEquals(loaded.memoryMB(), 2048)
+        self.assertEquals(loaded.xml(), created.xml())
+
+    def test_BootDevice(self):
+        self.assertIn("<boot dev='hd'/>", create().xml())
+        self.assertIn("<boot dev='network'/>", create(bootFromNetwork=True).xml())
+
+    def test_LoadingDoesNotParseUntilAFieldIsRead(self):
+        with mock.patch.object(manifest.xmltodict, "parse") as parse:
+            loaded = manifest.Manifest.fromXML(create().xml())
+            loaded.xml()
+            self.assertFalse(parse.called)
+
+    def test_EmulatorPathLookedUpOncePerProcess(self):
+        manifest._emulatorPath = None
+        with mock.patch.object(manifest.os.path, "exists", lambda path: path == "/usr/libexec/qemu-kvm"):
+            self.assertIn("<emulator>/usr/libexec/qemu-kvm</emulator>", create().xml())
+        with mock.patch.object(manifest.os.path, "exists", lambda path: False):
+            self.assertIn("<emulator>/usr/libexec/qemu-kvm</emulator>", create().xml())
+
+    def test_NoEmulator(self):
+        manifest._emulatorPath = None
+        with mock.patch.object(manifest.os.path, "exists", lambda path: False):
+            self.assertRaises(Exception, create)
+
+    def test_DefaultProfile(self):
+        xml = create().xml()
+        self.assertIn("cache='writeback' io='threads'", xml)
+        self.assertIn("machine='pc'", xml)
+        self.assertIn("<graphics type='vnc'", xml)
+        self.assertIn("<memballoon model='virtio'>", xml)
+        self.assertIn("slot='0x04'", xml)
+        self.assertNotIn("cpuset", xml)
+        self.assertEquals(create().profile(), "default")
+
+    def test_IOProfile(self):
+        xml = create(profile="io").xml()
+        self.assertIn("cache='none' io='native' iothread='1'", xml)
+        self.assertIn("<iothreads>1</iothreads>", xml)
+        self.assertIn("<driver name='vhost' queues='2'/>", xml)
+        self.assertIn("<memballoon model='none'/>", xml)
+        self.assertNotIn("<graphics", xml)
+        self.assertIn("slot='0x04'", xml)
+
+    def test_Q35ProfileLeavesPCIAddressesToLibvirt(self):
+        xml = create(profile="q35").xml()
+        self.assertIn("machine='q35'", xml)
+        self.assertIn("model='pcie-root'", xml)
+        self.assertNotIn("<address", xml)
+
+    def test_PinnedProfile(self):
+        xml = create(profile="pinned").xml()
+        self.assertIn("<hugepages/>", xml)
+        self.assertIn("<vcpu placement='static' cpuset='8-15'>2</vcpu>", xml)
+        self.assertIn("<memory mode='strict' nodeset='1'/>", xml)
+
+    def test_AllProfilesRenderWellFormedXML(self):
+        for profile in domainprofiles.names():
+            loaded = manifest.Manifest.fromXML(create(profile=profile).xml())
+            self.assertEquals(loaded.disk1Image(), "/images/disk1.qcow2")
+            self.assertEquals(loaded.secondaryMACAddress(), "52:54:00:00:01:03")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+import subprocess
+from rackattack.virtual.kvm import qcow2
+
+
+def _qemuImgExists():
+    try:
+        subprocess.check_output(['qemu-img', '--version'], stderr=subprocess.STDOUT)
+    except OSError:
+        return False
+    return True
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.tempDir, name)
+
+    def read(self, name):
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def test_EmptyImageLayout(self):
+        qcow2.create(self.path("a.qcow2"), 16 * 1024 ** 3)
+        data = self.read("a.qcow2")
+        self.assertEquals(len(data), 3 * qcow2.CLUSTER_SIZE + 32 * 8)
+        self.assertEquals(data[:4], qcow2.MAGIC)
+        fields = struct.unpack_from(">4sIQIIQIIQQIIQQQQII", data)
+        self.assertEquals(fields[1:], (
+            3, 0, 0, 16, 16 * 1024 ** 3, 0, 32, 3 * qcow2.CLUSTER_SIZE, qcow2.CLUSTER_SIZE, 1, 0, 0, 0, 0,
+            0, 4, 104))
+        self.assertEquals(struct.unpack_from(">Q", data, qcow2.CLUSTER_SIZE)[0], 2 * qcow2.CLUSTER_SIZE)
+        self.assertEquals(struct.unpack_from(">5H", data, 2 * qcow2.CLUSTER_SIZE), (1, 1, 1, 1, 0))
+        self.assertEquals(data[3 * qcow2.CLUSTER_SIZE:], '\0' * 32 * 8)
+
+    def test_ReadHeaderOfEmptyImage(self):
+        qcow2.create(self.path("a.qcow2"), 1024 ** 3)
+        header = qcow2.readHeader(self.path("a.qcow2"))
+        self.assertEquals(header.version, 3)
+        self.assertEquals(header.size, 1024 ** 3)
+        self.assertEquals(header.clusterBits, 16)
+        self.assertEquals(header.l1Size, 2)
+        self.assertIsNone(header.backingFile)
+        self.assertIsNone(header.backingFormat)
+
+    def test_OverlayHeader(self):
+        backingFile = "/var/lib/rackattack-virtual/imagestore/label____16GB.qcow2"
+        qcow2.create(self.path("a.qcow2"), 16 * 1024 ** 3, backingFile=backingFile, backingFormat="qcow2")
+        header = qcow2.readHeader(self.path("a.qcow2"))
+        self.assertEquals(header.size, 16 * 1024 ** 3)
+        self.assertEquals(header.backingFile, backingFile)
+        self.assertEquals(header.backingFormat, "qcow2")
+
+    def test_ZeroSizedImageHasNoL1Table(self):
+        qcow2.create(self.path("a.qcow2"), 0)
+        data = self.read("a.qcow2")
+        self.assertEquals(len(data), 3 * qcow2.CLUSTER_SIZE)
+        self.assertEquals(struct.unpack_from(">4H", data, 2 * qcow2.CLUSTER_SIZE), (1, 1, 1, 0))
+        self.assertEquals(qcow2.readHeader(self.path("a.qcow2")).l1Size, 0)
+
+    def test_LargeImageL1TableSpansSeveralClusters(self):
+        size = 8 * 1024 ** 4
+        qcow2.create(self.path("a.qcow2"), size)
+        data = self.read("a.qcow2")
+        self.assertEquals(len(data), 3 * qcow2.CLUSTER_SIZE + 16384 * 8)
+        self.assertEquals(struct.unpack_from(">6H", data, 2 * qcow2.CLUSTER_SIZE), (1, 1, 1, 1, 1, 0))
+
+    def test_ReadHeaderRejectsOtherFiles(self):
+        with open(self.path("raw"), "wb") as f:
+            f.write('\0' * 1024)
+        self.assertRaises(Exception, qcow2.readHeader, self.path("raw"))
+        with open(self.path("short"), "wb") as f:
+            f.write(qcow2.MAGIC)
+        self.assertRaises(Exception, qcow2.readHeader, self.path("short"))
+
+    @unittest.skipUnless(_qemuImgExists(), "qemu-img is not installed")
+    def test_EmptyImageMatchesQemuImg(self):
+        subprocess.check_output(['qemu-img', 'create', '-f', 'qcow2', self.path("expected.qcow2"), '16G'])
+        qcow2.create(self.path("actual.qcow2"), 16 * 1024 ** 3)
+        self._compareWithQemuImg("expected.qcow2", "actual.qcow2")
+
+    @unittest.skipUnless(_qemuImgExists(), "qemu-img is not installed")
+    def test_OverlayMatchesQemuImg(self):
+        qcow2.create(self.path("backing.qcow2"), 16 * 1024 ** 3)
+        subprocess.check_output([
+            'qemu-img', 'create', '-F', 'qcow2', '-f', 'qcow2', '-b', self.path("backing.qcow2"),
+            self.path("expected.qcow2")])
+        qcow2.create(self.path("actual.qcow2"), 16 * 1024 ** 3, backingFile=self.path("backing.qcow2"),
+                     backingFormat="qcow2")
+        self._compareWithQemuImg("expected.qcow2", "actual.qcow2")
+
+    def _compareWithQemuImg(self, expectedName, actualName):
+        subprocess.check_output(['qemu-img', 'check', self.path(actualName)])
+        expectedInfo = self._info(expectedName)
+        actualInfo = self._info(actualName)
+        for key in ['virtual-size', 'cluster-size', 'backing-filename', 'backing-filename-format']:
+            self.assertEquals(actualInfo.get(key), expectedInfo.get(key))
+        expected = self.read(expectedName)
+        actual = self.read(actualName)
+        self.assertEquals(len(actual), len(expected))
+        self.assertEquals(actual[qcow2.CLUSTER_SIZE:], expected[qcow2.CLUSTER_SIZE:])
+
+    def _info(self, name):
+        return json.loads(subprocess.check_output(['qemu-img', 'info', '--output=json', self.path(name)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
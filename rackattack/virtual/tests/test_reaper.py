@@ -0,0 +1,178 @@
+import os
+import mock
+import shutil
+import tempfile
+import threading
+import unittest
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import reaper
+from rackattack.virtual.kvm import backingfiles
+from rackattack.virtual.kvm import libvirtsingleton
+
+
+class FakeLibvirt:
+    def __init__(self):
+        self.tornDown = []
+        self.failing = set()
+        self.gone = set()
+
+    def call(self, name, operation):
+        domain = mock.Mock()
+        domain.isActive.return_value = True
+        connection = mock.Mock()
+        connection.lookupByName.side_effect = lambda domainName: self._lookupByName(domainName, domain)
+        operation(connection)
+        domainName = connection.lookupByName.call_args[0][0]
+        if domainName in self.failing:
+            raise Exception("unable to undefine")
+        self.tornDown.append(domainName)
+
+    def _lookupByName(self, domainName, domain):
+        if domainName in self.gone:
+            error = reaper.libvirt.libvirtError("Domain not found")
+            error.get_error_code = lambda: reaper.libvirt.VIR_ERR_NO_DOMAIN
+            raise error
+        return domain
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.origTruncateStep = config.REAPER_TRUNCATE_STEP_MB
+        self.origTruncateStepInterval = config.REAPER_TRUNCATE_STEP_INTERVAL
+        config.REAPER_TRUNCATE_STEP_INTERVAL = 0
+        self.libvirt = FakeLibvirt()
+        libvirtsingleton._it = self.libvirt
+        backingfiles._it = backingfiles.BackingFiles()
+        with mock.patch.object(threading.Thread, "start"):
+            self.tested = reaper.Reaper()
+
+    def tearDown(self):
+        config.REAPER_TRUNCATE_STEP_MB = self.origTruncateStep
+        config.REAPER_TRUNCATE_STEP_INTERVAL = self.origTruncateStepInterval
+        libvirtsingleton._it = None
+        backingfiles._it = None
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def create(self, basename, size=1024):
+        filename = os.path.join(self.tempDir, basename)
+        with open(filename, "wb") as f:
+            f.write("x" * size)
+        return filename
+
+    def reapAll(self):
+        self.tested._reapBatch(self.tested._nextBatch())
+
+    def test_IndexQuarantinedUntilReaped(self):
+        disk1 = self.create("vm1_disk1.qcow2")
+        disk2 = self.create("vm1_disk2.qcow2")
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[disk1, disk2])
+        self.assertEquals(self.tested.reaping(), set([1]))
+        self.assertTrue(os.path.exists(disk1))
+        self.reapAll()
+        self.assertEquals(self.tested.reaping(), set())
+        self.assertEquals(self.libvirt.tornDown, ["rackattack-vm1"])
+        self.assertEquals(os.listdir(self.tempDir), [])
+        self.assertEquals(self.tested.stats()['reaped'], 1)
+
+    def test_CorpsesAreReapedInBatches(self):
+        for index in xrange(1, 4):
+            self.tested.reap(index=index, domainName="rackattack-vm%d" % index,
+                             filenames=[self.create("vm%d_disk2.qcow2" % index)])
+        self.reapAll()
+        self.assertEquals(len(self.libvirt.tornDown), 3)
+        self.assertEquals(self.tested.reaping(), set())
+        self.assertEquals(os.listdir(self.tempDir), [])
+
+    def test_MissingDiskImageIsIgnored(self):
+        disk2 = self.create("vm1_disk2.qcow2")
+        self.tested.reap(index=1, domainName="rackattack-vm1",
+                         filenames=[os.path.join(self.tempDir, "vm1_disk1.qcow2"), disk2])
+        self.reapAll()
+        self.assertEquals(self.tested.reaping(), set())
+        self.assertEquals(os.listdir(self.tempDir), [])
+
+    def test_BackingFileReleasedAfterOverlayUnlinked(self):
+        backingFile = self.create("image.qcow2")
+        reference = backingfiles.it().acquire(backingFile)
+        self.tested.reap(index=1, domainName="rackattack-vm1",
+                         filenames=[self.create("vm1_disk1.qcow2")], backingFile=reference)
+        self.assertTrue(backingfiles.it().isReferenced(backingFile))
+        self.reapAll()
+        self.assertEquals(os.listdir(self.tempDir), ["image.qcow2"])
+        self.assertFalse(backingfiles.it().isReferenced(backingFile))
+
+    def test_FailedTeardownKeepsIndexQuarantined(self):
+        disk2 = self.create("vm1_disk2.qcow2")
+        self.libvirt.failing.add("rackattack-vm1")
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[disk2])
+        self.tested.reap(index=2, domainName="rackattack-vm2", filenames=[])
+        self.reapAll()
+        self.assertEquals(self.tested.reaping(), set([1]))
+        self.assertTrue(os.path.exists(disk2))
+        self.assertEquals(self.tested.stats()['failed'], 1)
+
+    def test_FailedTeardownIsRetriedWithTheNextBatch(self):
+        disk2 = self.create("vm1_disk2.qcow2")
+        self.libvirt.failing.add("rackattack-vm1")
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[disk2])
+        self.reapAll()
+        self.assertEquals(self.tested.stats()['retrying'], 1)
+        self.libvirt.failing.clear()
+        self.tested._RETRY_INTERVAL = 0
+        self.reapAll()
+        self.assertEquals(self.tested.reaping(), set())
+        self.assertEquals(os.listdir(self.tempDir), [])
+        self.assertEquals(self.tested.stats()['retrying'], 0)
+
+    def test_DomainAlreadyGoneIsTornDown(self):
+        disk2 = self.create("vm1_disk2.qcow2")
+        self.libvirt.gone.add("rackattack-vm1")
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[disk2])
+        self.reapAll()
+        self.assertEquals(self.tested.reaping(), set())
+        self.assertEquals(os.listdir(self.tempDir), [])
+        self.assertEquals(self.tested.stats()['failed'], 0)
+
+    def test_ImagesMovedAsideBeforeAFailureAreUnlinkedOnRetry(self):
+        disk1 = self.create("vm1_disk1.qcow2")
+        disk2 = self.create("vm1_disk2.qcow2")
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[disk1, disk2])
+        rename = os.rename
+
+        def renameOnlyDisk1(source, destination):
+            if source == disk2:
+                raise OSError("rename failed")
+            rename(source, destination)
+        with mock.patch.object(reaper.os, "rename", renameOnlyDisk1):
+            self.reapAll()
+        self.assertEquals(self.tested.reaping(), set([1]))
+        self.assertFalse(os.path.exists(disk1))
+        self.tested._RETRY_INTERVAL = 0
+        self.reapAll()
+        self.assertEquals(self.tested.reaping(), set())
+        self.assertEquals(os.listdir(self.tempDir), [])
+
+    def test_GradualTruncation(self):
+        config.REAPER_TRUNCATE_STEP_MB = 1
+        config.REAPER_TRUNCATE_STEP_INTERVAL = 0.01
+        disk1 = self.create("vm1_disk1.qcow2", size=3 * 1024 * 1024 + 5)
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[disk1])
+        with mock.patch.object(reaper.time, "sleep") as sleep:
+            self.reapAll()
+        self.assertEquals(os.listdir(self.tempDir), [])
+        self.assertEquals(sleep.call_args_list, [mock.call(0.01)] * 4)
+
+    def test_WaitUntilReaped(self):
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[])
+        self.reapAll()
+        self.assertTrue(self.tested.waitUntilReaped(1))
+        self.assertTrue(self.tested.waitUntilReaped(2))
+
+    def test_WaitUntilReapedTimesOut(self):
+        self.tested.reap(index=1, domainName="rackattack-vm1", filenames=[])
+        self.assertFalse(self.tested.waitUntilReaped(1, timeout=0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import mock
+import threading
+import unittest
+from rackattack.common import globallock
+from rackattack.virtual.kvm import reaper
+from rackattack.virtual.alloc import vmindices
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        globallock._lock.acquire()
+        with mock.patch.object(threading.Thread, "start"):
+            reaper._it = reaper.Reaper()
+        self.allVMs = dict()
+        self.tested = vmindices.VMIndices(self.allVMs)
+
+    def tearDown(self):
+        globallock._lock.release()
+        reaper._it = None
+
+    def test_ReservedIndicesAreNotReusedUntilReleased(self):
+        self.assertEquals(self.tested.reserve(), 1)
+        self.assertEquals(self.tested.reserve(), 2)
+        self.tested.release(1)
+        self.assertEquals(self.tested.reserve(), 1)
+        self.assertEquals(self.tested.reserve(), 3)
+
+    def test_IndicesOfExistingVMsAreSkipped(self):
+        self.allVMs[1] = "vm"
+        self.allVMs[3] = "vm"
+        self.assertEquals(self.tested.reserve(), 2)
+        self.assertEquals(self.tested.reserve(), 4)
+        self.tested.release(2)
+        self.allVMs[2] = "vm"
+        self.assertEquals(self.tested.reserve(), 5)
+
+    def test_ExcludedIndicesAreSkipped(self):
+        self.tested = vmindices.VMIndices(self.allVMs, excluded=[1, 2])
+        self.assertEquals(self.tested.reserve(), 3)
+
+    def test_IndicesBeingReapedAreSkipped(self):
+        reaper.it().reap(index=1, domainName="rackattack-vm1", filenames=[])
+        self.assertEquals(self.tested.reserve(), 2)
+        reaper.it()._reaped(1)
+        self.assertEquals(self.tested.reserve(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import mock
+import unittest
+import threading
+from rackattack.common import globallock
+from rackattack.virtual.kvm import config
+from rackattack.virtual.kvm import vm
+from rackattack.virtual.kvm import reaper
+from rackattack.virtual.alloc import vmindices
+from rackattack.virtual.alloc import warmpool
+
+
+class FakeVM:
+    def __init__(self, index):
+        self._index = index
+        self.destroyed = False
+        self.backingFile = None
+
+    def index(self):
+        return self._index
+
+    def destroy(self):
+        self.destroyed = True
+
+    def adoptBackingFile(self, backingFile):
+        self.backingFile = backingFile
+
+
+class FakePool:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, job):
+        self.jobs.append(job)
+
+    def runAll(self):
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job()
+
+
+def requirement(imageLabel="label", sizeGB=16):
+    return dict(imageLabel=imageLabel, hardwareConstraints=dict(
+        minimumDisk1SizeGB=sizeGB, minimumDisk2SizeGB=1, minimumRAMGB=1, minimumCPUs=1))
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.origVMsPerClass = config.WARM_POOL_VMS_PER_CLASS
+        self.origClasses = config.WARM_POOL_CLASSES
+        config.WARM_POOL_VMS_PER_CLASS = 2
+        config.WARM_POOL_CLASSES = 1
+        self.origDefine = vm.VM.defineFromFrozenImage
+        vm.VM.defineFromFrozenImage = classmethod(
+            lambda cls, index, requirement, frozenImage: FakeVM(index))
+        with mock.patch.object(threading.Thread, "start"):
+            reaper._it = reaper.Reaper()
+        self.imageStore = mock.Mock()
+        self.imageStore.get.return_value = "frozen.qcow2"
+        self.imageStore.peek.return_value = ("frozen.qcow2", 0)
+        self.allVMs = dict()
+        self.vmIndices = vmindices.VMIndices(self.allVMs)
+        self.pool = FakePool()
+        self.tested = warmpool.WarmPool(
+            imageStore=self.imageStore, vmIndices=self.vmIndices, vmCreationPool=self.pool)
+
+    def tearDown(self):
+        config.WARM_POOL_VMS_PER_CLASS = self.origVMsPerClass
+        config.WARM_POOL_CLASSES = self.origClasses
+        vm.VM.defineFromFrozenImage = self.origDefine
+        reaper._it = None
+
+    def take(self, requirement):
+        with globallock.lock():
+            instance = self.tested.take(requirement)
+            self.tested.refill()
+            return instance
+
+    def stats(self):
+        with globallock.lock():
+            return self.tested.stats()
+
+    def test_MissRefillsAndNextTakeHits(self):
+        self.assertIsNone(self.take(requirement()))
+        self.assertEquals(len(self.pool.jobs), 2)
+        self.pool.runAll()
+        instance = self.take(requirement())
+        self.assertEquals(instance.index(), 1)
+        self.assertEquals(len(self.pool.jobs), 1)
+        stats = self.stats()
+        self.assertEquals(stats['hits'], 1)
+        self.assertEquals(stats['misses'], 1)
+        self.assertEquals(stats['hitRate'], 0.5)
+
+    def test_TakeDoesNotRefillByItself(self):
+        with globallock.lock():
+            self.assertIsNone(self.tested.take(requirement()))
+            self.assertEquals(self.pool.jobs, [])
+            self.pool.enqueue("allocation's job")
+            self.tested.refill()
+        self.assertEquals(len(self.pool.jobs), 3)
+        self.assertEquals(self.pool.jobs[0], "allocation's job")
+
+    def test_WarmVMsKeepTheirIndicesReserved(self):
+        self.take(requirement())
+        self.pool.runAll()
+        with globallock.lock():
+            self.assertEquals(self.vmIndices.reserve(), 3)
+
+    def test_ColdClassWarmVMsAreDiscarded(self):
+        self.take(requirement())
+        self.pool.runAll()
+        instance = self.take(requirement())
+        self.pool.runAll()
+        self.assertIsNone(self.take(requirement("other")))
+        self.assertIsNone(self.take(requirement("other")))
+        self.assertIsNone(self.take(requirement("other")))
+        self.assertEquals(self.stats()['classes']['label/16GB/1GB/1GB/1CPUs/default']['warm'], 0)
+        self.assertFalse(instance.destroyed)
+        with globallock.lock():
+            self.vmIndices.release(instance.index())
+            self.assertEquals(self.vmIndices.reserve(), 1)
+
+    def test_DisabledPoolDoesNotTouchTheImageStore(self):
+        config.WARM_POOL_VMS_PER_CLASS = 0
+        self.assertIsNone(self.take(requirement()))
+        self.assertEquals(self.pool.jobs, [])
+        self.assertFalse(self.imageStore.peek.called)
+        self.assertFalse(self.imageStore.get.called)
+
+    def test_RefillNeitherMarksImageUsedNorReferencesIt(self):
+        self.take(requirement())
+        self.pool.runAll()
+        self.assertFalse(self.imageStore.get.called)
+        instance = self.take(requirement())
+        self.imageStore.get.assert_called_once_with(imageLabel="label", sizeGB=16)
+        self.assertEquals(instance.backingFile, "frozen.qcow2")
+
+    def test_WarmVMOfAnEvictedOrRebuiltImageIsDiscarded(self):
+        self.take(requirement())
+        self.pool.runAll()
+        self.imageStore.peek.return_value = ("frozen.qcow2", 1)
+        self.assertIsNone(self.take(requirement()))
+        self.assertFalse(self.imageStore.get.called)
+        self.assertEquals(self.stats()['misses'], 2)
+
+    def test_FailureToDefineReleasesIndex(self):
+        def fail(cls, index, requirement, frozenImage):
+            raise Exception("ignore me")
+        vm.VM.defineFromFrozenImage = classmethod(fail)
+        self.take(requirement())
+        self.pool.runAll()
+        with globallock.lock():
+            self.assertEquals(self.vmIndices.reserve(), 1)
+        self.assertEquals(self.stats()['classes']['label/16GB/1GB/1GB/1CPUs/default']['pending'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()